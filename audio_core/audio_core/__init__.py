@@ -0,0 +1,7 @@
+"""
+Audio decoding, analysis frames and pitch engines shared by ``fastapi_backend``
+and ``python_backend``.
+
+Both services install this package (``pip install ../audio_core``, via their
+``requirements.txt``) rather than importing each other's source trees.
+"""
@@ -0,0 +1,118 @@
+"""
+Per-request cache of the analysis frames of one recording.
+
+Pitch engines, VAD and quality checks each used to prepare the signal on
+their own: piptrack padded and framed it for its STFT, yin padded and framed
+it again when piptrack came up short, and VAD and the engine quality check
+summed frame energies separately. ``AnalysisFrames`` computes each of these
+once, at the pitch frame length and hop, and hands the same arrays to every
+consumer:
+
+- ``padded``: the signal zero-padded by half a frame at each end, as librosa
+  centres its frames; the STFT and yin frame this same buffer
+- ``magnitude``: the STFT magnitude piptrack peak-picks from (``piptrack(S=...)``)
+- ``power_sum``: a cumulative sum of squares over the whole recording, from
+  which VAD and ``active_seconds`` read any frame's energy with one subtraction
+- ``frame_energy``: energies of the uncentred pitch frames
+
+Regions (``region``) share their recording's energy sums and transform
+counts. ``transforms`` counts every spectral transform the request ran, by
+kind, so a change that adds one shows up in ``debug_info`` and ``/metrics``.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import librosa
+    LIBROSA_AVAILABLE = True
+except ImportError:
+    LIBROSA_AVAILABLE = False
+
+
+def cumulative_power(audio_data: np.ndarray) -> np.ndarray:
+    """Cumulative sum of squares with a leading 0, so ``sums[b] - sums[a]`` is the energy of ``[a, b)``."""
+    samples = np.asarray(audio_data, dtype=np.float64)
+    return np.concatenate(([0.0], np.cumsum(samples * samples)))
+
+
+class AnalysisFrames:
+    """Lazily computed, cached frames, spectra and energies of a signal for one request."""
+
+    def __init__(
+        self,
+        audio_data: np.ndarray,
+        sr: int,
+        frame_length: int,
+        hop_length: int,
+        transforms: Optional[Dict[str, int]] = None,
+        power_sum: Optional[np.ndarray] = None,
+        offset: int = 0
+    ):
+        self.audio_data = np.asarray(audio_data, dtype=np.float32)
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.transforms = transforms if transforms is not None else {}
+        self._power_sum = power_sum
+        self._offset = offset
+        self._padded: Optional[np.ndarray] = None
+        self._magnitude: Optional[np.ndarray] = None
+        self._frame_energy: Optional[np.ndarray] = None
+
+    def count(self, kind: str, amount: int = 1) -> None:
+        """Record spectral transforms run over this signal."""
+        self.transforms[kind] = self.transforms.get(kind, 0) + amount
+
+    def region(self, start: int, end: int) -> "AnalysisFrames":
+        """Frames of ``audio_data[start:end]`` sharing this recording's energy sums and transform counts."""
+        return AnalysisFrames(
+            self.audio_data[start:end], self.sr, self.frame_length, self.hop_length,
+            self.transforms, self.power_sum, self._offset + start
+        )
+
+    @property
+    def power_sum(self) -> np.ndarray:
+        """``cumulative_power`` of the whole recording (``region`` offsets into it)."""
+        if self._power_sum is None:
+            self._power_sum = cumulative_power(self.audio_data)
+        return self._power_sum
+
+    @property
+    def padded(self) -> np.ndarray:
+        """The signal with ``frame_length // 2`` zeros at each end; frame ``i`` starts at ``i * hop_length``."""
+        if self._padded is None:
+            self._padded = np.pad(self.audio_data, self.frame_length // 2)
+        return self._padded
+
+    @property
+    def num_frames(self) -> int:
+        """Number of centred frames, as librosa's STFT, piptrack and yin produce."""
+        return 1 + len(self.audio_data) // self.hop_length
+
+    @property
+    def magnitude(self) -> np.ndarray:
+        """``|STFT|`` with librosa's defaults (Hann window, centred frames), ``(1 + frame_length // 2, num_frames)``."""
+        if self._magnitude is None:
+            self.count("stft")
+            self._magnitude = np.abs(librosa.stft(
+                self.padded, n_fft=self.frame_length, hop_length=self.hop_length, center=False
+            ))
+        return self._magnitude
+
+    @property
+    def frame_energy(self) -> np.ndarray:
+        """Sum of squares of the uncentred frames starting at ``range(0, len - frame_length, hop_length)``."""
+        if self._frame_energy is None:
+            starts = self._offset + np.arange(0, len(self.audio_data) - self.frame_length, self.hop_length)
+            sums = self.power_sum
+            self._frame_energy = sums[starts + self.frame_length] - sums[starts]
+        return self._frame_energy
+
+
+def as_analysis_frames(signal, sr: int, frame_length: int, hop_length: int) -> AnalysisFrames:
+    """``signal`` itself if it is already ``AnalysisFrames``, otherwise fresh frames over it."""
+    if isinstance(signal, AnalysisFrames):
+        return signal
+    return AnalysisFrames(signal, sr, frame_length, hop_length)
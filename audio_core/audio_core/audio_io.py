@@ -0,0 +1,335 @@
+"""
+In-memory audio decoding.
+
+Uploads are decoded straight from the request bytes instead of being written to
+a temporary file first. Each decode reports which path handled it:
+
+- ``soundfile``: libsndfile reading an in-memory buffer (WAV, FLAC, OGG and,
+  with libsndfile >= 1.1, MP3). No disk I/O and no subprocess.
+- ``pyav``: in-process FFmpeg codecs via PyAV for container formats libsndfile
+  cannot read (browser .webm/opus, .m4a/aac). No subprocess is spawned.
+- ``audioread``: last-resort ``librosa.load`` through a temporary file, which
+  may spawn an external decoder. Only used when the paths above are unavailable.
+
+``stream_audio`` decodes the same formats block by block for analysis whose
+memory must not grow with the recording's length, and ``BlockResampler``
+resamples such a stream without edge effects between blocks.
+"""
+
+import io
+import os
+import tempfile
+from math import gcd
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+try:
+    import soxr
+    SOXR_AVAILABLE = True
+except ImportError:
+    SOXR_AVAILABLE = False
+
+# Resampler qualities: soxr presets, plus scipy's polyphase filter
+RESAMPLE_QUALITIES = {"vhq": "VHQ", "hq": "HQ", "mq": "MQ", "lq": "LQ", "qq": "QQ", "polyphase": None}
+
+# Formats libsndfile can read from memory without any external decoder
+SOUNDFILE_SUFFIXES = {".wav", ".flac", ".ogg", ".mp3"}
+
+# Container formats that need an FFmpeg-backed decoder
+PYAV_SUFFIXES = {".webm", ".m4a", ".mp4", ".aac", ".opus", ".mp3"}
+
+# Frames per block when downmixing multichannel audio
+DECODE_BLOCK_FRAMES = 1 << 16
+
+
+def _to_mono_float32(samples: np.ndarray) -> np.ndarray:
+    """Downmix a (frames, channels) array to a contiguous mono float32 vector."""
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def _max_frames(sample_rate: int, max_seconds: Optional[float]) -> Optional[int]:
+    return int(max_seconds * sample_rate) if max_seconds else None
+
+
+class _MonoBuffer:
+    """
+    Growable mono float32 sample buffer.
+
+    With a known capacity the buffer is allocated once and decoded chunks are
+    copied straight in, so peak memory is the analysis window plus one chunk
+    rather than a list of chunks plus their concatenation.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, initial_size: int = 1 << 18):
+        self.capacity = capacity
+        self.samples = np.empty(capacity if capacity is not None else initial_size, dtype=np.float32)
+        self.length = 0
+
+    @property
+    def full(self) -> bool:
+        return self.capacity is not None and self.length >= self.capacity
+
+    def append(self, chunk: np.ndarray) -> None:
+        if self.capacity is not None:
+            chunk = chunk[:self.capacity - self.length]
+        elif self.length + len(chunk) > len(self.samples):
+            grown = np.empty(max(2 * len(self.samples), self.length + len(chunk)), dtype=np.float32)
+            grown[:self.length] = self.samples[:self.length]
+            self.samples = grown
+        self.samples[self.length:self.length + len(chunk)] = chunk
+        self.length += len(chunk)
+
+    def result(self) -> np.ndarray:
+        return self.samples[:self.length]
+
+
+def decode_with_soundfile(audio_content: bytes, max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """Decode a libsndfile-supported format from an in-memory buffer."""
+    with sf.SoundFile(io.BytesIO(audio_content)) as sound_file:
+        sample_rate = sound_file.samplerate
+        max_frames = _max_frames(sample_rate, max_seconds)
+        frames = sound_file.frames if max_frames is None else min(sound_file.frames, max_frames)
+        if sound_file.channels == 1:
+            return _to_mono_float32(sound_file.read(frames, dtype="float32")), sample_rate
+
+        # Downmix block by block so only one block of multichannel samples is held at a time
+        buffer = _MonoBuffer(frames)
+        for block in sound_file.blocks(DECODE_BLOCK_FRAMES, dtype="float32", always_2d=True, frames=frames):
+            buffer.append(block.mean(axis=1))
+    return buffer.result(), sample_rate
+
+
+def decode_with_pyav(audio_content: bytes, max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """Decode a compressed container in-process with PyAV, resampling to mono float32."""
+    with av.open(io.BytesIO(audio_content), mode="r") as container:
+        stream = container.streams.audio[0]
+        sample_rate = stream.codec_context.sample_rate or stream.rate
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        buffer = _MonoBuffer(_max_frames(sample_rate, max_seconds))
+
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                buffer.append(resampled.to_ndarray().reshape(-1))
+            # Stop decoding once the analysis window is full
+            if buffer.full:
+                break
+        else:
+            # Flush any samples buffered inside the resampler
+            for resampled in resampler.resample(None):
+                buffer.append(resampled.to_ndarray().reshape(-1))
+
+    return buffer.result(), sample_rate
+
+
+def decode_with_audioread(audio_content: bytes, file_suffix: str, max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """Fallback decode through a temporary file and librosa/audioread."""
+    import librosa
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=file_suffix) as temp_file:
+        temp_file.write(audio_content)
+        temp_file_path = temp_file.name
+
+    try:
+        audio_data, sample_rate = librosa.load(temp_file_path, sr=None, mono=True, duration=max_seconds)
+    finally:
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+
+    return _to_mono_float32(audio_data), sample_rate
+
+
+def probe_duration(audio_content: bytes, file_suffix: str) -> Optional[float]:
+    """
+    Recording length in seconds read from the container/stream headers, without decoding.
+
+    Returns None when the headers do not record a length, as in .webm files
+    written incrementally by browsers.
+    """
+    suffix = file_suffix.lower()
+
+    if suffix in SOUNDFILE_SUFFIXES:
+        try:
+            info = sf.info(io.BytesIO(audio_content))
+            if info.frames > 0 and info.samplerate:
+                return info.frames / info.samplerate
+        except (sf.LibsndfileError, RuntimeError):
+            pass
+
+    if PYAV_AVAILABLE and suffix in PYAV_SUFFIXES:
+        try:
+            with av.open(io.BytesIO(audio_content), mode="r") as container:
+                if container.duration:
+                    return container.duration / av.time_base
+                stream = container.streams.audio[0]
+                if stream.duration and stream.time_base:
+                    return float(stream.duration * stream.time_base)
+        except (av.error.FFmpegError, IndexError, ValueError):
+            pass
+
+    return None
+
+
+def decode_audio(audio_content: bytes, file_suffix: str, max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int, str]:
+    """
+    Decode uploaded audio bytes to a mono float32 signal at the native sample rate.
+
+    Decoding stops after ``max_seconds`` of audio when given. Returns
+    ``(audio_data, sample_rate, decode_path)`` where ``decode_path`` names the
+    decoder that handled the upload.
+    """
+    suffix = file_suffix.lower()
+
+    if suffix in SOUNDFILE_SUFFIXES:
+        try:
+            audio_data, sample_rate = decode_with_soundfile(audio_content, max_seconds)
+            return audio_data, sample_rate, "soundfile"
+        except (sf.LibsndfileError, RuntimeError) as e:
+            print(f"In-memory soundfile decode failed for {suffix}: {e}")
+
+    if PYAV_AVAILABLE and suffix in PYAV_SUFFIXES:
+        try:
+            audio_data, sample_rate = decode_with_pyav(audio_content, max_seconds)
+            return audio_data, sample_rate, "pyav"
+        except (av.error.FFmpegError, IndexError, ValueError) as e:
+            print(f"In-memory PyAV decode failed for {suffix}: {e}")
+
+    audio_data, sample_rate = decode_with_audioread(audio_content, suffix, max_seconds)
+    return audio_data, sample_rate, "audioread"
+
+
+def _reblock(chunks: Iterable[np.ndarray], block_frames: int, max_frames: Optional[int]) -> Iterator[np.ndarray]:
+    """Regroup decoded chunks into blocks of ``block_frames`` samples, stopping after ``max_frames``."""
+    buffer = _MonoBuffer(block_frames)
+    remaining = max_frames
+    for chunk in chunks:
+        if remaining is not None:
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+        while len(chunk):
+            taken = min(len(chunk), block_frames - buffer.length)
+            buffer.append(chunk[:taken])
+            chunk = chunk[taken:]
+            if buffer.full:
+                yield buffer.result().copy()
+                buffer.length = 0
+        if remaining == 0:
+            break
+    if buffer.length:
+        yield buffer.result().copy()
+
+
+def _soundfile_chunks(sound_file: "sf.SoundFile", block_frames: int) -> Iterator[np.ndarray]:
+    with sound_file:
+        for block in sound_file.blocks(block_frames, dtype="float32", always_2d=True):
+            yield block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+
+def _pyav_chunks(container, stream, sample_rate: int) -> Iterator[np.ndarray]:
+    with container:
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                yield resampled.to_ndarray().reshape(-1)
+        for resampled in resampler.resample(None):
+            yield resampled.to_ndarray().reshape(-1)
+
+
+def stream_audio(
+    audio_content: bytes,
+    file_suffix: str,
+    block_seconds: float = 10.0,
+    max_seconds: Optional[float] = None
+) -> Tuple[Iterator[np.ndarray], int, str]:
+    """
+    ``decode_audio`` as an iterator of mono float32 blocks of ``block_seconds`` each.
+
+    Returns ``(blocks, sample_rate, decode_path)``; only one block is decoded
+    at a time. The ``audioread`` fallback cannot stream, so it decodes the
+    whole recording up front and hands it out in blocks.
+    """
+    suffix = file_suffix.lower()
+
+    if suffix in SOUNDFILE_SUFFIXES:
+        try:
+            sound_file = sf.SoundFile(io.BytesIO(audio_content))
+            sample_rate = sound_file.samplerate
+            block_frames = max(1, int(block_seconds * sample_rate))
+            chunks = _soundfile_chunks(sound_file, block_frames)
+            return _reblock(chunks, block_frames, _max_frames(sample_rate, max_seconds)), sample_rate, "soundfile"
+        except (sf.LibsndfileError, RuntimeError) as e:
+            print(f"In-memory soundfile decode failed for {suffix}: {e}")
+
+    if PYAV_AVAILABLE and suffix in PYAV_SUFFIXES:
+        try:
+            container = av.open(io.BytesIO(audio_content), mode="r")
+            try:
+                stream = container.streams.audio[0]
+                sample_rate = stream.codec_context.sample_rate or stream.rate
+            except (IndexError, ValueError):
+                container.close()
+                raise
+            chunks = _pyav_chunks(container, stream, sample_rate)
+            return _reblock(chunks, max(1, int(block_seconds * sample_rate)), _max_frames(sample_rate, max_seconds)), sample_rate, "pyav"
+        except (av.error.FFmpegError, IndexError, ValueError) as e:
+            print(f"In-memory PyAV decode failed for {suffix}: {e}")
+
+    audio_data, sample_rate = decode_with_audioread(audio_content, suffix, max_seconds)
+    return _reblock([audio_data], max(1, int(block_seconds * sample_rate)), None), sample_rate, "audioread"
+
+
+class BlockResampler:
+    """
+    Resample a signal arriving in blocks, as ``resample_audio`` would resample it whole.
+
+    soxr presets use soxr's streaming resampler, which carries filter state
+    across blocks. Without soxr (or with ``polyphase``) each block is
+    resampled on its own, which leaves small discontinuities at block edges.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int, quality: str = "hq"):
+        if quality not in RESAMPLE_QUALITIES:
+            raise ValueError(f"Unknown resample quality {quality!r}. Must be one of: {list(RESAMPLE_QUALITIES)}")
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self.quality = quality
+        self._stream = None
+        if SOXR_AVAILABLE and RESAMPLE_QUALITIES[quality] is not None and orig_sr != target_sr:
+            self._stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype="float32", quality=RESAMPLE_QUALITIES[quality])
+
+    def resample(self, block: np.ndarray, last: bool = False) -> np.ndarray:
+        if self._stream is not None:
+            return np.ascontiguousarray(self._stream.resample_chunk(block, last=last), dtype=np.float32)
+        return resample_audio(block, self.orig_sr, self.target_sr, self.quality)
+
+
+def resample_audio(audio_data: np.ndarray, orig_sr: int, target_sr: int, quality: str = "hq") -> np.ndarray:
+    """
+    Resample a mono float32 signal to ``target_sr``.
+
+    ``quality`` selects a soxr preset (``vhq``, ``hq``, ``mq``, ``lq``, ``qq``;
+    lower is faster) or scipy's ``polyphase`` filter.
+    """
+    if orig_sr == target_sr or len(audio_data) == 0:
+        return audio_data
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"Unknown resample quality {quality!r}. Must be one of: {list(RESAMPLE_QUALITIES)}")
+
+    if SOXR_AVAILABLE and RESAMPLE_QUALITIES[quality] is not None:
+        resampled = soxr.resample(audio_data, orig_sr, target_sr, quality=RESAMPLE_QUALITIES[quality])
+    else:
+        from scipy.signal import resample_poly
+        divisor = gcd(int(orig_sr), int(target_sr))
+        resampled = resample_poly(audio_data, target_sr // divisor, orig_sr // divisor)
+    return np.ascontiguousarray(resampled, dtype=np.float32)
@@ -0,0 +1,488 @@
+"""
+Vectorized pitch-detection engines shared by both backends.
+
+Every engine implements ``PitchEngine.track`` and returns one pitch per frame
+(0 where unvoiced) with frame-centre times. ``run_pitch_engines`` tries a
+chain of engines, normally ordered by ``cost``, and stops at the first whose
+voicing quality meets the threshold, so a clean recording only pays for the
+first engine. New engines are added with ``register_pitch_engine``.
+
+``run_pitch_engines_many`` does the same for several signals at once (micro-
+batched requests). Engines that can share work across signals override
+``PitchEngine.track_many``: piptrack runs one STFT over a zero-padded 2-D
+stack of similar-length signals and autocorrelation runs one batched FFT over
+the frames of every signal. Results match running each signal on its own.
+
+Engines read their input through ``AnalysisFrames`` (``track_frames``), so
+the padded signal, STFT magnitude and frame energies of a request are
+computed once however many engines run; ``track`` wraps a bare signal.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import fft as sp_fft
+
+from .analysis_frames import AnalysisFrames, as_analysis_frames
+
+try:
+    import librosa
+    LIBROSA_AVAILABLE = True
+except ImportError:
+    LIBROSA_AVAILABLE = False
+
+# Frames transformed per batched FFT; bounds the complex spectrum held in memory
+AUTOCORR_BATCH_FRAMES = 256
+
+# Stacked signals are grouped so none is padded beyond this factor of the
+# group's shortest, and a group holds at most this many samples in total.
+# Signals longer than STACK_MAX_SIGNAL_SAMPLES (2 s at 16 kHz) are not stacked:
+# per-call overhead is already amortised and the larger stack measured slower.
+STACK_MAX_PADDING = 1.25
+STACK_MAX_SAMPLES = 1 << 22
+STACK_MAX_SIGNAL_SAMPLES = 1 << 15
+
+# Frames quieter than this (dB below the loudest frame) count as silence when
+# measuring how much of the recording an engine tracked
+ACTIVE_FLOOR_DB = -40.0
+
+# Consecutive voiced frames closer than this (in cents) count as a continuous
+# contour; noise and octave errors jump further
+CONTINUITY_CENTS = 100.0
+
+
+def strongest_pitch_per_frame(pitches: np.ndarray, magnitudes: np.ndarray) -> np.ndarray:
+    """
+    Pick the highest-magnitude piptrack candidate in every frame.
+
+    Returns a contiguous float32 array with one entry per frame (0 where no
+    pitch was found).
+    """
+    index = magnitudes.argmax(axis=0)[np.newaxis, :]
+    return np.ascontiguousarray(np.take_along_axis(pitches, index, axis=0)[0], dtype=np.float32)
+
+
+def frame_signal(audio_data: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    """
+    Return a (n_frames, frame_length) strided view of the signal.
+
+    Frames start at ``range(0, len(audio_data) - frame_length, hop_length)``,
+    matching the original per-frame loop. No samples are copied.
+    """
+    num_frames = len(range(0, len(audio_data) - frame_length, hop_length))
+    if num_frames <= 0:
+        return np.empty((0, frame_length), dtype=audio_data.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(audio_data, frame_length)
+    return windows[::hop_length][:num_frames]
+
+
+def stack_groups(
+    lengths: Sequence[int],
+    max_padding: float = STACK_MAX_PADDING,
+    max_samples: int = STACK_MAX_SAMPLES,
+    max_length: int = STACK_MAX_SIGNAL_SAMPLES
+) -> List[List[int]]:
+    """
+    Group signal indices by length for stacking.
+
+    Within a group no signal is longer than ``max_padding`` times the
+    shortest, and rows x longest length stays within ``max_samples``.
+    Signals longer than ``max_length`` get a group of their own.
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    for index in np.argsort(lengths, kind="stable"):
+        length = lengths[index]
+        if length > max_length:
+            groups.append([int(index)])
+            continue
+        if current and (length > max_padding * max(lengths[current[0]], 1) or (len(current) + 1) * length > max_samples):
+            groups.append(current)
+            current = []
+        current.append(int(index))
+    if current:
+        groups.append(current)
+    return groups
+
+
+def stack_signals(signals: Sequence[np.ndarray]) -> np.ndarray:
+    """Zero-pad signals to the longest and stack them into a (rows, samples) float32 array."""
+    stacked = np.zeros((len(signals), max(len(signal) for signal in signals)), dtype=np.float32)
+    for row, signal in enumerate(signals):
+        stacked[row, :len(signal)] = signal
+    return stacked
+
+
+def autocorr_pitch_track(
+    audio_data: np.ndarray,
+    sr: int,
+    fmin: float,
+    fmax: float,
+    frame_length: int,
+    hop_length: int
+) -> np.ndarray:
+    """
+    Estimate one pitch per frame from the autocorrelation peak in the voice-range lag window.
+
+    All frames are autocorrelated with a batched real FFT (Wiener-Khinchin),
+    only lags in ``[sr / fmax, sr / fmin]`` are examined, and the peak lag is
+    refined with parabolic interpolation. Returns a float32 array with one
+    entry per frame; frames with no energy or a peak outside the voice range
+    are 0.
+    """
+    frames = frame_signal(np.asarray(audio_data, dtype=np.float32), frame_length, hop_length)
+    return autocorr_pitch_frames(frames, sr, fmin, fmax)
+
+
+def autocorr_pitch_frames(frames: np.ndarray, sr: int, fmin: float, fmax: float) -> np.ndarray:
+    """``autocorr_pitch_track`` on a ready-made ``(n_frames, frame_length)`` array."""
+    min_period = max(1, int(sr / fmax))  # Max frequency
+    max_period = int(sr / fmin)          # Min frequency
+
+    num_frames, frame_length = frames.shape
+    pitches = np.zeros(num_frames, dtype=np.float32)
+    if num_frames == 0 or min_period >= max_period or max_period >= frame_length:
+        return pitches
+
+    # Zero-pad so the circular correlation equals the linear one for every lag we read
+    n_fft = sp_fft.next_fast_len(frame_length + max_period + 1, real=True)
+
+    for start in range(0, num_frames, AUTOCORR_BATCH_FRAMES):
+        batch = frames[start:start + AUTOCORR_BATCH_FRAMES]
+        spectrum = sp_fft.rfft(batch, n=n_fft, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        autocorr = sp_fft.irfft(power, n=n_fft, axis=1)[:, :max_period + 1]
+
+        # Peak lag within the voice-range window
+        peak_idx = np.argmax(autocorr[:, min_period:max_period], axis=1) + min_period
+        rows = np.arange(len(batch))
+
+        # Parabolic interpolation around the peak
+        left = autocorr[rows, np.maximum(peak_idx - 1, 0)]
+        center = autocorr[rows, peak_idx]
+        right = autocorr[rows, peak_idx + 1]
+        denom = left - 2.0 * center + right
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = np.where(denom < 0, 0.5 * (left - right) / denom, 0.0)
+        refined_lag = peak_idx + np.clip(delta, -0.5, 0.5)
+
+        frequency = sr / refined_lag
+        voiced = (autocorr[:, 0] > 0) & (frequency >= fmin) & (frequency <= fmax)
+        pitches[start:start + len(batch)] = np.where(voiced, frequency, 0.0)
+
+    return pitches
+
+
+class PitchEngine:
+    """
+    A pitch tracker. ``cost`` is its relative running time per second of audio
+    (autocorrelation = 1), used to order chains cheapest first.
+    """
+    name = ""
+    cost = 1.0
+    requires_librosa = False
+
+    @property
+    def available(self) -> bool:
+        return LIBROSA_AVAILABLE or not self.requires_librosa
+
+    def track(self, audio_data: np.ndarray, sr: int, fmin: float, fmax: float, frame_length: int, hop_length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(times, pitches)`` for every frame, with 0 pitch where unvoiced."""
+        return self.track_frames(AnalysisFrames(audio_data, sr, frame_length, hop_length), fmin, fmax)
+
+    def track_frames(self, frames: AnalysisFrames, fmin: float, fmax: float) -> Tuple[np.ndarray, np.ndarray]:
+        """``track`` reusing whatever ``frames`` has already computed; engines override ``track`` or this."""
+        return self.track(frames.audio_data, frames.sr, fmin, fmax, frames.frame_length, frames.hop_length)
+
+    def track_many(self, frames: Sequence[AnalysisFrames], fmin: float, fmax: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """``track_frames`` for each signal; engines that can share work across signals override this."""
+        return [self.track_frames(signal_frames, fmin, fmax) for signal_frames in frames]
+
+
+def _frame_times(num_frames: int, sr: int, hop_length: int) -> np.ndarray:
+    """Centres of librosa's centred frames."""
+    return np.arange(num_frames) * hop_length / sr
+
+
+class PiptrackEngine(PitchEngine):
+    """Strongest spectral peak per frame from ``librosa.piptrack``."""
+    name = "piptrack"
+    cost = 5.0
+    requires_librosa = True
+
+    def __init__(self, threshold: float = 0.1):
+        self.threshold = threshold
+
+    def track_frames(self, frames, fmin, fmax):
+        pitches, magnitudes = librosa.piptrack(
+            S=frames.magnitude, sr=frames.sr, n_fft=frames.frame_length, hop_length=frames.hop_length,
+            threshold=self.threshold, fmin=fmin, fmax=fmax
+        )
+        frame_pitches = strongest_pitch_per_frame(pitches, magnitudes)
+        return _frame_times(len(frame_pitches), frames.sr, frames.hop_length), frame_pitches
+
+    def track_many(self, frames, fmin, fmax):
+        """One STFT over each group of similar-length signals, zero-padded into a 2-D stack."""
+        results: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(frames)
+        sr, frame_length, hop_length = frames[0].sr, frames[0].frame_length, frames[0].hop_length
+        for group in stack_groups([len(signal_frames.audio_data) for signal_frames in frames]):
+            if len(group) == 1 or len(frames[group[0]].audio_data) < frame_length:
+                for index in group:
+                    results[index] = self.track_frames(frames[index], fmin, fmax)
+                continue
+            pitches, magnitudes = librosa.piptrack(
+                y=stack_signals([frames[index].audio_data for index in group]), sr=sr, n_fft=frame_length, hop_length=hop_length,
+                threshold=self.threshold, fmin=fmin, fmax=fmax
+            )
+            for row, index in enumerate(group):
+                # Each signal's share of the stacked STFT counts as its own transform
+                frames[index].count("stft")
+                # Centred frames of this signal alone; later columns only cover padding
+                num_frames = frames[index].num_frames
+                frame_pitches = strongest_pitch_per_frame(pitches[row, :, :num_frames], magnitudes[row, :, :num_frames])
+                results[index] = (_frame_times(num_frames, sr, hop_length), frame_pitches)
+        return results
+
+
+class YinEngine(PitchEngine):
+    """``librosa.yin``; reports a pitch for every frame, voiced or not."""
+    name = "yin"
+    cost = 4.0
+    requires_librosa = True
+
+    def track_frames(self, frames, fmin, fmax):
+        # Difference functions over the shared padded signal; yin's autocorrelation is its own transform
+        frames.count("yin")
+        f0 = librosa.yin(
+            frames.padded, fmin=fmin, fmax=fmax, sr=frames.sr,
+            frame_length=frames.frame_length, hop_length=frames.hop_length, center=False
+        )
+        return _frame_times(len(f0), frames.sr, frames.hop_length), np.ascontiguousarray(f0, dtype=np.float32)
+
+
+class PyinEngine(PitchEngine):
+    """Probabilistic yin with HMM voicing decisions; the most robust and by far the slowest."""
+    name = "pyin"
+    cost = 100.0
+    requires_librosa = True
+
+    def track_frames(self, frames, fmin, fmax):
+        frames.count("pyin")
+        f0, voiced_flag, _ = librosa.pyin(
+            frames.padded, fmin=fmin, fmax=fmax, sr=frames.sr,
+            frame_length=frames.frame_length, hop_length=frames.hop_length, center=False
+        )
+        pitches = np.where(voiced_flag, np.nan_to_num(f0), 0.0).astype(np.float32)
+        return _frame_times(len(pitches), frames.sr, frames.hop_length), pitches
+
+
+class AutocorrEngine(PitchEngine):
+    """Batched FFT autocorrelation on its own (longer) frames; needs only numpy/scipy."""
+    name = "autocorr"
+    cost = 1.0
+
+    def __init__(self, frame_seconds: float = 0.1):
+        self.frame_seconds = frame_seconds
+
+    def track(self, audio_data, sr, fmin, fmax, frame_length=None, hop_length=None):
+        frame_length = int(self.frame_seconds * sr)
+        hop_length = frame_length // 2
+        pitches = autocorr_pitch_track(audio_data, sr, fmin, fmax, frame_length, hop_length)
+        times = (np.arange(len(pitches)) * hop_length + frame_length / 2) / sr
+        return times, pitches
+
+    def track_frames(self, frames, fmin, fmax):
+        # Its 100 ms frames are longer than the shared analysis frames
+        frames.count("autocorr")
+        return self.track(frames.audio_data, frames.sr, fmin, fmax)
+
+    def track_many(self, frames, fmin, fmax):
+        """The frames of every signal autocorrelated together, then split back per signal."""
+        sr = frames[0].sr
+        frame_length = int(self.frame_seconds * sr)
+        hop_length = frame_length // 2
+        for signal_frames in frames:
+            signal_frames.count("autocorr")
+        framed = [frame_signal(signal_frames.audio_data, frame_length, hop_length) for signal_frames in frames]
+        pitches = autocorr_pitch_frames(np.concatenate(framed), sr, fmin, fmax)
+        bounds = np.cumsum([0] + [len(signal_frames) for signal_frames in framed])
+        return [
+            ((np.arange(end - start) * hop_length + frame_length / 2) / sr, pitches[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+
+PITCH_ENGINES: Dict[str, PitchEngine] = {}
+
+
+def register_pitch_engine(engine: PitchEngine) -> PitchEngine:
+    """Make an engine selectable by name in engine chains."""
+    PITCH_ENGINES[engine.name] = engine
+    return engine
+
+
+for _engine in (AutocorrEngine(), YinEngine(), PiptrackEngine(), PyinEngine()):
+    register_pitch_engine(_engine)
+
+
+def pitch_engine_chain(spec: str) -> List[PitchEngine]:
+    """
+    Resolve a comma-separated list of engine names, or ``"by_cost"`` for every
+    registered engine cheapest first. Engines whose dependencies are missing
+    are skipped.
+    """
+    if spec.strip() == "by_cost":
+        engines = sorted(PITCH_ENGINES.values(), key=lambda engine: engine.cost)
+    else:
+        names = [name.strip() for name in spec.split(",") if name.strip()]
+        unknown = [name for name in names if name not in PITCH_ENGINES]
+        if unknown:
+            raise ValueError(f"Unknown pitch engine(s) {unknown}. Must be among: {list(PITCH_ENGINES)}")
+        engines = [PITCH_ENGINES[name] for name in names]
+    return [engine for engine in engines if engine.available]
+
+
+def active_seconds(audio_data: np.ndarray, sr: int, frame_length: int, hop_length: int) -> float:
+    """Seconds of the recording louder than ``ACTIVE_FLOOR_DB`` below its loudest frame."""
+    return energy_active_seconds(AnalysisFrames(audio_data, sr, frame_length, hop_length).frame_energy, sr, hop_length)
+
+
+def energy_active_seconds(energy: np.ndarray, sr: int, hop_length: int) -> float:
+    """``active_seconds`` from per-frame energies."""
+    if len(energy) == 0:
+        return 0.0
+    peak = energy.max()
+    if peak <= 0:
+        return 0.0
+    active = energy >= peak * 10 ** (ACTIVE_FLOOR_DB / 10)
+    return float(active.sum() * hop_length / sr)
+
+
+def track_quality(times: np.ndarray, pitches: np.ndarray, active: float) -> float:
+    """
+    Voicing quality of a per-frame track, 0-1.
+
+    The product of coverage (voiced seconds over ``active`` non-silent
+    seconds, capped at 1) and continuity (share of consecutive voiced frames
+    within ``CONTINUITY_CENTS`` of each other). Pitch "found" in noise covers
+    the recording but jumps around, so it scores low on continuity.
+    """
+    voiced = pitches > 0
+    num_voiced = int(voiced.sum())
+    if active <= 0 or num_voiced < 2 or len(times) < 2:
+        return 0.0
+    coverage = min(1.0, num_voiced * float(times[1] - times[0]) / active)
+    cents = 1200.0 * np.log2(pitches[voiced].astype(np.float64))
+    continuity = float(np.mean(np.abs(np.diff(cents)) <= CONTINUITY_CENTS))
+    return coverage * continuity
+
+
+@dataclass
+class PitchTrack:
+    """Voiced frames chosen from an engine chain, with the per-engine report."""
+    engine: str
+    times: np.ndarray
+    pitches: np.ndarray
+    quality: float
+    report: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def run_pitch_engines(
+    audio_data: Union[np.ndarray, AnalysisFrames],
+    sr: int,
+    fmin: float,
+    fmax: float,
+    frame_length: int,
+    hop_length: int,
+    chain: Sequence[PitchEngine],
+    min_quality: float = 0.0,
+    min_voiced_frames: int = 10
+) -> PitchTrack:
+    """
+    Run ``chain`` in order until an engine is good enough.
+
+    An engine's quality is ``track_quality``: how much of the recording's
+    non-silent time it tracked, and how smoothly (0-1). The first engine with ``quality >= min_quality``
+    and at least ``min_voiced_frames`` voiced frames wins; if none does, the
+    highest-quality track is used. An engine that raises is skipped.
+    ``PitchTrack.report`` lists every engine tried with its time, quality
+    and voiced frame count. Pass ``AnalysisFrames`` (at ``frame_length`` and
+    ``hop_length``) to share its cached transforms and count them.
+    """
+    return run_pitch_engines_many(
+        [audio_data], sr, fmin, fmax, frame_length, hop_length, chain, min_quality, min_voiced_frames
+    )[0]
+
+
+def run_pitch_engines_many(
+    signals: Sequence[Union[np.ndarray, AnalysisFrames]],
+    sr: int,
+    fmin: float,
+    fmax: float,
+    frame_length: int,
+    hop_length: int,
+    chain: Sequence[PitchEngine],
+    min_quality: float = 0.0,
+    min_voiced_frames: int = 10
+) -> List[PitchTrack]:
+    """
+    ``run_pitch_engines`` for several signals, each engine running once over
+    every signal still waiting for a good enough track.
+
+    A signal's track is the one ``run_pitch_engines`` would pick for it alone.
+    With more than one signal, report entries carry the ``batch_size`` and
+    each signal's equal share of the engine's time. If a shared run raises,
+    the engine is retried per signal so only the failing signal skips it.
+    """
+    frames = [as_analysis_frames(signal, sr, frame_length, hop_length) for signal in signals]
+    actives = [energy_active_seconds(signal_frames.frame_energy, sr, hop_length) for signal_frames in frames]
+    reports: List[List[Dict[str, Any]]] = [[] for _ in signals]
+    best: List[Optional[PitchTrack]] = [None] * len(signals)
+    chosen: List[Optional[PitchTrack]] = [None] * len(signals)
+    pending = list(range(len(signals)))
+
+    for engine in chain:
+        if not pending:
+            break
+        started = time.perf_counter()
+        outcomes: List[Any] = []
+        if len(pending) > 1:
+            try:
+                outcomes = engine.track_many([frames[index] for index in pending], fmin, fmax)
+            except Exception:
+                outcomes = []
+        if not outcomes:
+            for index in pending:
+                try:
+                    outcomes.append(engine.track_frames(frames[index], fmin, fmax))
+                except Exception as e:
+                    outcomes.append(e)
+        elapsed = (time.perf_counter() - started) / len(pending)
+        batch = {"batch_size": len(pending)} if len(pending) > 1 else {}
+
+        still_pending = []
+        for index, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                reports[index].append({"engine": engine.name, "seconds": elapsed, "error": str(outcome), **batch})
+                still_pending.append(index)
+                continue
+            times, pitches = outcome
+            voiced = pitches > 0
+            num_voiced = int(voiced.sum())
+            quality = track_quality(times, pitches, actives[index])
+            reports[index].append({"engine": engine.name, "seconds": elapsed, "quality": quality, "voiced_frames": num_voiced, **batch})
+
+            track = PitchTrack(engine.name, times[voiced], np.ascontiguousarray(pitches[voiced], dtype=np.float32), quality, reports[index])
+            if best[index] is None or quality > best[index].quality:
+                best[index] = track
+            if quality >= min_quality and num_voiced >= min_voiced_frames:
+                chosen[index] = track
+            else:
+                still_pending.append(index)
+        pending = still_pending
+
+    for index in pending:
+        chosen[index] = best[index] or PitchTrack("none", np.zeros(0), np.zeros(0, dtype=np.float32), 0.0, reports[index])
+    return chosen
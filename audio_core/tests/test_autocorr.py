@@ -0,0 +1,100 @@
+"""The batched FFT autocorrelation against the per-frame ``np.correlate`` loop it replaced."""
+
+import numpy as np
+import pytest
+
+from audio_core.pitch_engines import AUTOCORR_BATCH_FRAMES, autocorr_pitch_frames, autocorr_pitch_track, frame_signal
+
+
+def correlate_loop(audio_data, sr, fmin, fmax, frame_length, hop_length):
+    """
+    One ``np.correlate`` per frame, in float64, with the same lag window,
+    parabolic peak refinement and voicing rule as ``autocorr_pitch_frames``.
+
+    Returns the pitches and each frame's autocorrelation, for resolving ties.
+    """
+    min_period = max(1, int(sr / fmax))
+    max_period = int(sr / fmin)
+    pitches, autocorrs = [], []
+    for start in range(0, len(audio_data) - frame_length, hop_length):
+        frame = audio_data[start:start + frame_length].astype(np.float64)
+        autocorr = np.correlate(frame, frame, mode="full")[frame_length - 1:]
+        peak = int(np.argmax(autocorr[min_period:max_period])) + min_period
+        left, center, right = autocorr[peak - 1], autocorr[peak], autocorr[peak + 1]
+        denom = left - 2.0 * center + right
+        delta = float(np.clip(0.5 * (left - right) / denom, -0.5, 0.5)) if denom < 0 else 0.0
+        frequency = sr / (peak + delta)
+        pitches.append(frequency if autocorr[0] > 0 and fmin <= frequency <= fmax else 0.0)
+        autocorrs.append(autocorr)
+    return np.array(pitches), autocorrs
+
+
+def sung_signal(sr, seconds, seed):
+    """Harmonic notes with vibrato, separated by digital silence, over a noise floor, then pure noise."""
+    rng = np.random.default_rng(seed)
+    pieces = []
+    for f0 in rng.uniform(90, 750, 4):
+        t = np.arange(int(seconds / 5 * sr)) / sr
+        phase = 2 * np.pi * np.cumsum(f0 * 2 ** (0.3 / 12 * np.sin(2 * np.pi * 5.5 * t))) / sr
+        tone = 0.3 * np.sin(phase) + 0.15 * np.sin(2 * phase) + 0.07 * np.sin(3 * phase)
+        pieces += [tone + 0.01 * rng.standard_normal(len(t)), np.zeros(int(0.2 * sr))]
+    pieces.append(0.05 * rng.standard_normal(int(seconds / 5 * sr)))
+    return np.concatenate(pieces).astype(np.float32)
+
+
+def assert_matches_loop(audio_data, sr, fmin, fmax, frame_length, hop_length):
+    expected, autocorrs = correlate_loop(audio_data, sr, fmin, fmax, frame_length, hop_length)
+    actual = autocorr_pitch_track(audio_data, sr, fmin, fmax, frame_length, hop_length)
+    assert actual.dtype == np.float32
+    assert len(actual) == len(expected)
+    np.testing.assert_array_equal(actual > 0, expected > 0)
+
+    close = np.isclose(actual, expected, rtol=1e-4, atol=0)
+    for index in np.flatnonzero(~close):
+        # Only near-ties between two lags may resolve differently in float32 FFT arithmetic
+        autocorr = autocorrs[index]
+        chosen = int(round(sr / actual[index]))
+        assert autocorr[chosen] >= autocorr[int(round(sr / expected[index]))] - 1e-3 * autocorr[0]
+    assert close.mean() > 0.99
+    return actual
+
+
+@pytest.mark.parametrize("sr,frame_length,hop_length", [
+    (16000, 1600, 800), (22050, 2048, 512), (44100, 4410, 2205), (48000, 2048, 256)
+])
+def test_matches_per_frame_correlate(sr, frame_length, hop_length):
+    audio_data = sung_signal(sr, 5.0, seed=sr)
+    pitches = assert_matches_loop(audio_data, sr, 80.0, 800.0, frame_length, hop_length)
+    assert (pitches > 0).any() and (pitches == 0).any()
+
+
+def test_spans_several_batches():
+    sr, hop_length = 16000, 64
+    audio_data = sung_signal(sr, 6.0, seed=1)
+    assert len(frame_signal(audio_data, 1024, hop_length)) > 3 * AUTOCORR_BATCH_FRAMES
+    assert_matches_loop(audio_data, sr, 80.0, 800.0, 1024, hop_length)
+
+
+def test_voice_range_window():
+    sr = 22050
+    audio_data = sung_signal(sr, 4.0, seed=5)
+    # A narrow range leaves the notes outside it unvoiced, as in the loop
+    pitches = assert_matches_loop(audio_data, sr, 200.0, 400.0, 2048, 512)
+    assert np.all((pitches == 0) | ((pitches >= 200.0) & (pitches <= 400.0)))
+
+
+def test_silence_and_short_signals():
+    sr = 16000
+    assert not autocorr_pitch_track(np.zeros(sr, dtype=np.float32), sr, 80.0, 800.0, 1600, 800).any()
+    assert autocorr_pitch_track(np.zeros(100, dtype=np.float32), sr, 80.0, 800.0, 1600, 800).size == 0
+    # A frame shorter than the longest lag cannot be analysed
+    assert not autocorr_pitch_frames(np.ones((3, 100), dtype=np.float32), sr, 80.0, 800.0).any()
+
+
+def test_frames_match_the_loop_framing():
+    audio_data = np.arange(10000, dtype=np.float32)
+    frames = frame_signal(audio_data, 1000, 300)
+    starts = list(range(0, len(audio_data) - 1000, 300))
+    assert len(frames) == len(starts)
+    for frame, start in zip(frames, starts):
+        np.testing.assert_array_equal(frame, audio_data[start:start + 1000])
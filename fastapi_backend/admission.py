@@ -0,0 +1,174 @@
+"""
+Admission control for the analysis stage.
+
+At most ``capacity`` analyses run at once; the process pool would otherwise
+accept every request and a burst would make all of them slow together.
+Requests beyond capacity wait in a bounded queue for up to ``max_wait``
+seconds and are then refused with a ``Retry-After`` estimate, so latency for
+admitted requests stays bounded.
+
+Waiters are queued per user. When a slot frees up it goes to the waiting user
+with the fewest analyses already running, taking turns among users with the
+same count, so one user's batch cannot starve everyone else.
+
+Refusals raise ``AdmissionRejected`` with the HTTP status to answer:
+
+- 503 when the shared queue is full or the wait deadline passes
+- 429 when one user already has ``max_queued_per_user`` recordings waiting
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+
+class AdmissionRejected(Exception):
+    """A request that could not get an analysis slot; carries the HTTP status and Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded, per-user fair wait queue. Event-loop only."""
+
+    def __init__(self, capacity: int, max_queued: int = 200, max_wait: float = 30.0, max_queued_per_user: int = 0):
+        self.capacity = capacity
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.max_queued_per_user = max_queued_per_user
+
+        self.in_flight = 0
+        self.queued = 0
+        self._running: Dict[str, int] = {}
+        # user -> waiting futures, in turn order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # Exponentially weighted mean of how long a slot is held
+        self._mean_hold_seconds = 1.0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is likely to have drained."""
+        return max(1, math.ceil(self._mean_hold_seconds * (self.queued + 1) / max(self.capacity, 1)))
+
+    def _reject(self, status_code: int, detail: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(status_code, detail, self.retry_after())
+
+    def _grant(self, user_id: str) -> None:
+        self.in_flight += 1
+        self._running[user_id] = self._running.get(user_id, 0) + 1
+        self.admitted += 1
+
+    def _grant_waiters(self) -> None:
+        while self.in_flight < self.capacity and self._waiting:
+            # The waiting user with the fewest running analyses; the earliest in turn order on ties
+            user_id = min(self._waiting, key=lambda user: self._running.get(user, 0))
+            waiters = self._waiting[user_id]
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if future.done():
+                continue
+            self._grant(user_id)
+            future.set_result(None)
+
+    def _release(self, user_id: str, held_seconds: float) -> None:
+        self.in_flight -= 1
+        self._running[user_id] -= 1
+        if not self._running[user_id]:
+            del self._running[user_id]
+        self._mean_hold_seconds += 0.1 * (held_seconds - self._mean_hold_seconds)
+        self._grant_waiters()
+
+    def _withdraw(self, user_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiting.get(user_id)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._waiting[user_id]
+
+    async def acquire(self, user_id: str, background: bool = False) -> float:
+        """
+        Wait for a slot; returns the seconds spent waiting.
+
+        ``background`` callers wait as long as it takes and skip the queue
+        limits; they are for work already bounded elsewhere (e.g. job workers)
+        but still take their fair turn.
+        """
+        max_wait = None if background else self.max_wait
+        if self.in_flight < self.capacity and not self._waiting:
+            self._grant(user_id)
+            return 0.0
+
+        if max_wait is not None:
+            if self.max_queued and self.queued >= self.max_queued:
+                raise self._reject(503, "Server is at capacity, please retry later")
+            if self.max_queued_per_user and len(self._waiting.get(user_id, ())) >= self.max_queued_per_user:
+                raise self._reject(429, "Too many recordings waiting for this user, please retry later")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(future)
+        self.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._withdraw(user_id, future)
+                self.timed_out += 1
+                raise self._reject(503, f"No analysis slot became free within {max_wait:g}s, please retry later")
+        except asyncio.CancelledError:
+            # The client went away; give up the place in line, or the slot if it was just granted
+            if future.done():
+                self._release(user_id, 0.0)
+            else:
+                future.cancel()
+                self._withdraw(user_id, future)
+            raise
+        return time.perf_counter() - started
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, background: bool = False) -> AsyncIterator[float]:
+        """Hold an analysis slot for the ``with`` block; yields the seconds spent waiting."""
+        if not self.enabled:
+            yield 0.0
+            return
+        waited = await self.acquire(user_id, background)
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self._release(user_id, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "waiting_users": len(self._waiting),
+            "max_queued": self.max_queued,
+            "max_wait_seconds": self.max_wait,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "retry_after_seconds": self.retry_after()
+        }
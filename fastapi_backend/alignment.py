@@ -0,0 +1,130 @@
+"""
+Banded DTW alignment of a pitch contour to a reference note sequence.
+
+Every voiced frame is assigned to one reference note, in order, with each note
+getting at least one frame; the assignment minimises the total distance in
+cents between frame pitch and note pitch. Unlike the equal split this follows
+the singer when one note is held longer than another, and it yields note
+boundaries.
+
+Frames are only allowed to match notes within ``band_notes`` of the diagonal
+(a Sakoe-Chiba band). Because each note is a contiguous run of frames, the
+recurrence for one note is a running minimum over its band window:
+
+    D[j](i) = S[j](i) + min over k <= i of (D[j-1](k-1) - S[j](k-1))
+
+where ``S[j]`` is the cumulative cost of note ``j``. Each note is therefore
+one vectorized pass over its window, and time and memory are
+O(frames x band) rather than a full frames x notes matrix.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from exercises import hz_to_midi
+
+# Per-frame cost cap in cents, so octave errors and stray frames cannot
+# outweigh a whole note's worth of correct frames
+MAX_FRAME_COST_CENTS = 500.0
+
+
+def dtw_note_boundaries(contour_cents: np.ndarray, reference_cents: np.ndarray, band_notes: float) -> Optional[np.ndarray]:
+    """
+    Align frames to notes within a Sakoe-Chiba band.
+
+    Returns an ``(num_notes, 2)`` array of inclusive ``[first, last]`` frame
+    indices per note, or None when there are fewer frames than notes. A band of
+    0 restricts every note to (about) its equal-split share of the frames.
+    """
+    num_frames, num_notes = len(contour_cents), len(reference_cents)
+    if num_notes == 0 or num_frames < num_notes:
+        return None
+
+    frames_per_note = num_frames / num_notes
+    windows: List[Tuple[int, np.ndarray]] = []
+    prev_lo = prev_hi = 0
+    prev_cost = np.zeros(0)
+
+    for j, reference in enumerate(reference_cents):
+        # Frames note j may cover: inside the band, leaving one frame per other note
+        lo = max(j, int(np.floor((j - band_notes) * frames_per_note)))
+        hi = min(num_frames - num_notes + j, int(np.ceil((j + band_notes + 1) * frames_per_note)) - 1)
+        lo = min(lo, hi)
+
+        frame_cost = np.minimum(np.abs(contour_cents[lo:hi + 1] - reference), MAX_FRAME_COST_CENTS)
+        cumulative = np.cumsum(frame_cost)
+        if j == 0:
+            # The first note always starts on frame 0
+            cost = cumulative
+            starts = np.zeros(len(cost), dtype=np.int32)
+        else:
+            # Best cost of notes 0..j-1 ending on frame k-1, for each start frame k
+            ends = np.arange(lo - 1, hi)
+            in_prev = (ends >= prev_lo) & (ends <= prev_hi)
+            before = np.full(len(ends), np.inf)
+            before[in_prev] = prev_cost[ends[in_prev] - prev_lo]
+            candidates = before - np.concatenate(([0.0], cumulative[:-1]))
+
+            running_min = np.minimum.accumulate(candidates)
+            cost = cumulative + running_min
+            # Latest start frame achieving the running minimum
+            positions = np.arange(len(candidates), dtype=np.int32)
+            starts = lo + np.maximum.accumulate(np.where(candidates <= running_min, positions, 0)).astype(np.int32)
+
+        windows.append((lo, starts))
+        prev_lo, prev_hi, prev_cost = lo, hi, cost
+
+    if not np.isfinite(prev_cost[num_frames - 1 - prev_lo]):
+        return None
+
+    # Backtrack from the last frame through each note's start frame
+    boundaries = np.empty((num_notes, 2), dtype=np.intp)
+    end = num_frames - 1
+    for j in range(num_notes - 1, -1, -1):
+        lo, starts = windows[j]
+        start = int(starts[end - lo])
+        boundaries[j] = (start, end)
+        end = start - 1
+    return boundaries
+
+
+def align_pitches_to_notes(
+    times: np.ndarray,
+    pitches: np.ndarray,
+    reference_frequencies: np.ndarray,
+    fmin: float,
+    fmax: float,
+    band_fraction: float = 0.1,
+    min_band_notes: float = 2.0
+) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Segment a voiced pitch track into reference notes by banded DTW.
+
+    Frames outside ``[fmin, fmax]`` are dropped first, as in the equal split.
+    The band is ``band_fraction`` of the note count, but never narrower than
+    ``min_band_notes``. Returns the median pitch per note (0 where no frame
+    was available) and per-note ``start_time``/``end_time``/``num_frames``.
+    """
+    num_notes = len(reference_frequencies)
+    pitches = np.asarray(pitches, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    in_range = (pitches >= fmin) & (pitches <= fmax)
+    pitches, times = pitches[in_range], times[in_range]
+
+    notes = np.zeros(num_notes)
+    segments = [{"start_time": None, "end_time": None, "num_frames": 0} for _ in range(num_notes)]
+
+    band_notes = max(min_band_notes, band_fraction * num_notes)
+    boundaries = dtw_note_boundaries(100.0 * hz_to_midi(pitches), 100.0 * hz_to_midi(reference_frequencies), band_notes)
+    if boundaries is None:
+        # Fewer frames than notes: one frame per note, in order
+        notes[:len(pitches)] = pitches
+        for j in range(len(pitches)):
+            segments[j] = {"start_time": float(times[j]), "end_time": float(times[j]), "num_frames": 1}
+        return notes, segments
+
+    for j, (first, last) in enumerate(boundaries):
+        notes[j] = np.median(pitches[first:last + 1])
+        segments[j] = {"start_time": float(times[first]), "end_time": float(times[last]), "num_frames": int(last - first + 1)}
+    return notes, segments
@@ -0,0 +1,515 @@
+"""
+Singing analysis pipeline.
+
+Everything in this module is CPU-bound and free of FastAPI/Supabase state so it
+can run inside worker processes (see ``run_grading_pipeline``) without
+importing the web app.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from audio_core.analysis_frames import AnalysisFrames
+from audio_core.audio_io import decode_audio, resample_audio
+from audio_core.pitch_engines import PITCH_ENGINES, PitchTrack, pitch_engine_chain, run_pitch_engines, run_pitch_engines_many
+
+from alignment import align_pitches_to_notes
+from contours import encode_contour_text
+from exercises import VOICE_RANGES, CompiledExercise, get_exercise, hz_to_midi, hz_to_note_names
+from metrics import StageTimer
+from vad import voice_activity_regions
+
+# Rate every recording is resampled to before pitch analysis (0 keeps the native rate)
+ANALYSIS_SAMPLE_RATE = int(os.getenv("ANALYSIS_SAMPLE_RATE", "16000"))
+
+# Resampler quality: vhq, hq, mq, lq or qq (soxr presets), or polyphase
+RESAMPLE_QUALITY = os.getenv("RESAMPLE_QUALITY", "hq")
+
+# Only the first MAX_ANALYSIS_SECONDS of a recording are decoded and analysed (0 = no cap)
+MAX_ANALYSIS_SECONDS = float(os.getenv("MAX_ANALYSIS_SECONDS", "120"))
+
+# STFT/yin frame and hop durations, taken from librosa's defaults (2048/512
+# samples) at 48 kHz browser recordings, so every analysis rate sees the same
+# time and frequency resolution.
+FRAME_SECONDS = 2048 / 48000
+HOP_SECONDS = 512 / 48000
+
+# Pitch engines tried in order until one tracks at least PITCH_MIN_QUALITY of the
+# non-silent audio (0-1): comma-separated names, or "by_cost" for cheapest first
+PITCH_ENGINE_CHAIN_SPEC = os.getenv("PITCH_ENGINE_CHAIN", "piptrack,yin,autocorr")
+PITCH_ENGINE_CHAIN = pitch_engine_chain(PITCH_ENGINE_CHAIN_SPEC)
+PITCH_MIN_QUALITY = float(os.getenv("PITCH_MIN_QUALITY", "0.0"))
+
+# Run pitch engines only inside voice-activity regions (leading/trailing
+# silence and long gaps are skipped); set to 0 to analyse the whole recording
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") != "0"
+
+# How the contour is split into notes: "equal" (equal-length chunks of voiced
+# frames) or "dtw" (banded DTW alignment to the reference notes)
+SEGMENTATION_MODE = os.getenv("SEGMENTATION_MODE", "equal")
+
+# DTW band half-width as a fraction of the exercise's note count (at least 2 notes)
+ALIGNMENT_BAND_FRACTION = float(os.getenv("ALIGNMENT_BAND_FRACTION", "0.1"))
+
+SEGMENTATION_MODES = ("equal", "dtw")
+
+# Recordings at least this long (by their headers), or with no length in their
+# headers, are analysed in blocks by streaming_analysis with constant memory;
+# 0 disables streaming
+STREAMING_MIN_SECONDS = float(os.getenv("STREAMING_MIN_SECONDS", "60"))
+
+# Seconds of audio decoded and analysed per streaming block
+STREAM_BLOCK_SECONDS = float(os.getenv("STREAM_BLOCK_SECONDS", "10"))
+
+# Duration cap for streamed recordings (0 = no cap); memory no longer limits it, only CPU time
+STREAMING_MAX_SECONDS = float(os.getenv("STREAMING_MAX_SECONDS", "1800"))
+
+# Parameters that affect grading output. Anything that changes a score for the
+# same recording belongs here so cached results are keyed on it.
+ANALYSIS_PARAMS = {
+    "pipeline_version": 2,
+    "tolerance_hz": 50.0,
+    "analysis_sample_rate": ANALYSIS_SAMPLE_RATE,
+    "resample_quality": RESAMPLE_QUALITY,
+    "max_analysis_seconds": MAX_ANALYSIS_SECONDS,
+    "pitch_engine_chain": [engine.name for engine in PITCH_ENGINE_CHAIN],
+    "pitch_min_quality": PITCH_MIN_QUALITY,
+    "vad": VAD_ENABLED,
+    "segmentation": SEGMENTATION_MODE,
+    "alignment_band_fraction": ALIGNMENT_BAND_FRACTION,
+    "streaming_min_seconds": STREAMING_MIN_SECONDS,
+    "stream_block_seconds": STREAM_BLOCK_SECONDS,
+    "streaming_max_seconds": STREAMING_MAX_SECONDS,
+}
+
+# Default reference (soprano)
+REFERENCE_MELODY = VOICE_RANGES["soprano"]["melody"]
+REFERENCE_SEQUENCE = VOICE_RANGES["soprano"]["sequence"]
+REFERENCE_NOTES = VOICE_RANGES["soprano"]["notes"]
+
+class PitchAnalysisResult(BaseModel):
+    note_index: int
+    expected_note: str
+    expected_frequency: float
+    detected_frequency: float
+    detected_note: str
+    is_accurate: bool
+    frequency_difference: float
+    confidence: float
+    cents_difference: float = 0.0
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+def analysis_frame_params(sr: int) -> Tuple[int, int]:
+    """STFT/yin frame length and hop in samples for a sample rate."""
+    frame_length = int(round(FRAME_SECONDS * sr))
+    return frame_length, max(1, frame_length // 4)
+
+def load_analysis_audio(audio_content: bytes, file_suffix: str, timer: Optional[StageTimer] = None) -> Tuple[np.ndarray, int, Dict[str, Any]]:
+    """
+    Decode an upload and bring it to the analysis sample rate and duration cap.
+    
+    Returns ``(audio_data, sample_rate, info)`` where ``info`` describes the
+    decode path, native rate and whether the recording was truncated. Decode
+    and resample time are recorded on ``timer`` when given.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("decode"):
+        audio_data, native_rate, decode_path = decode_audio(audio_content, file_suffix, MAX_ANALYSIS_SECONDS or None)
+    truncated = bool(MAX_ANALYSIS_SECONDS) and len(audio_data) >= int(MAX_ANALYSIS_SECONDS * native_rate)
+    
+    sample_rate = native_rate
+    if ANALYSIS_SAMPLE_RATE and native_rate != ANALYSIS_SAMPLE_RATE:
+        with timer.stage("resample"):
+            audio_data = resample_audio(audio_data, native_rate, ANALYSIS_SAMPLE_RATE, RESAMPLE_QUALITY)
+        sample_rate = ANALYSIS_SAMPLE_RATE
+    
+    return audio_data, sample_rate, {
+        "decode_path": decode_path,
+        "native_sample_rate": native_rate,
+        "sample_rate": sample_rate,
+        "duration_seconds": len(audio_data) / sample_rate if sample_rate else 0.0,
+        "truncated": truncated
+    }
+
+def pitch_engine_args(sr: int, voice_range: str) -> Tuple[int, float, float, int, int]:
+    """``(sr, fmin, fmax, frame_length, hop_length)`` for the pitch engines."""
+    # Get frequency range for voice type
+    range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
+    
+    # Frame sizes scale with the sample rate so results stay comparable
+    frame_length, hop_length = analysis_frame_params(sr)
+    return sr, range_data["min_freq"], range_data["max_freq"], frame_length, hop_length
+
+def extract_pitch_contour(audio_data: np.ndarray, sr: int, voice_range: str = "soprano", info: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """
+    Extract the voiced pitch contour with the configured pitch engine chain.
+    
+    Returns a contiguous float32 array of the voiced (non-zero) frame pitches.
+    The engine that produced it is stored as ``info["pitch_engine"]``.
+    """
+    return extract_pitch_track(audio_data, sr, voice_range, info)[1]
+
+def extract_pitch_track(audio_data: np.ndarray, sr: int, voice_range: str = "soprano", info: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``extract_pitch_contour`` that also returns when each voiced frame occurred.
+    
+    Engines in ``PITCH_ENGINE_CHAIN`` run in order until one reaches
+    ``PITCH_MIN_QUALITY``. Returns ``(times, pitches)``: frame-centre times in
+    seconds and the matching voiced pitches. ``info`` receives the winning
+    ``pitch_engine``, its ``pitch_quality``, a ``pitch_engines`` report with
+    the time and quality of every engine tried and the ``spectral_transforms`` run.
+    """
+    frames = AnalysisFrames(audio_data, sr, *analysis_frame_params(sr))
+    track = run_pitch_engines(frames, *pitch_engine_args(sr, voice_range), chain=PITCH_ENGINE_CHAIN, min_quality=PITCH_MIN_QUALITY)
+    if info is not None:
+        info["pitch_engine"] = track.engine
+        info["pitch_quality"] = track.quality
+        info["pitch_engines"] = track.report
+        info["spectral_transforms"] = frames.transforms
+    return track.times, track.pitches
+
+def extract_pitch_track_in_regions(audio_data: np.ndarray, sr: int, voice_range: str, regions: List[Tuple[int, int]], info: Dict[str, Any], frames: Optional[AnalysisFrames] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``extract_pitch_track`` over each ``(start, end)`` sample region, with times
+    relative to the whole recording.
+    
+    ``info`` gets the engine that produced the most voiced frames, the
+    frame-weighted quality and every region's engine report. ``frames`` is
+    the recording's ``AnalysisFrames`` when it already has one.
+    """
+    frames = frames or AnalysisFrames(audio_data, sr, *analysis_frame_params(sr))
+    tracks = [
+        run_pitch_engines(frames.region(start, end), *pitch_engine_args(sr, voice_range), chain=PITCH_ENGINE_CHAIN, min_quality=PITCH_MIN_QUALITY)
+        for start, end in regions
+    ]
+    return merge_region_tracks(tracks, regions, sr, info)
+
+def merge_region_tracks(tracks: List[PitchTrack], regions: List[Tuple[int, int]], sr: int, info: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Join one pitch track per region into a track over the whole recording, filling ``info`` as above."""
+    times, pitches, report = [], [], []
+    engine_frames: Dict[str, int] = {}
+    weighted_quality = 0.0
+    for index, (track, (start, _)) in enumerate(zip(tracks, regions)):
+        times.append(track.times + start / sr)
+        pitches.append(track.pitches)
+        report.extend({**entry, "region": index} for entry in track.report)
+        engine_frames[track.engine] = engine_frames.get(track.engine, 0) + len(track.pitches)
+        weighted_quality += track.quality * len(track.pitches)
+    
+    num_frames = sum(len(region_pitches) for region_pitches in pitches)
+    info["pitch_engine"] = max(engine_frames, key=engine_frames.get) if engine_frames else "none"
+    info["pitch_quality"] = weighted_quality / num_frames if num_frames else 0.0
+    info["pitch_engines"] = report
+    if not pitches:
+        return np.zeros(0), np.zeros(0, dtype=np.float32)
+    return np.concatenate(times), np.concatenate(pitches)
+
+def extract_pitch_basic_autocorr(audio_data: np.ndarray, sr: int, voice_range: str = "soprano") -> np.ndarray:
+    """Fallback pitch detection using basic autocorrelation."""
+    range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
+    _, pitches = PITCH_ENGINES["autocorr"].track(audio_data, sr, range_data["min_freq"], range_data["max_freq"])
+    return pitches[pitches > 0]
+
+def segment_pitches_to_notes(pitches: np.ndarray, voice_range: str = "soprano", num_expected_notes: int = 5) -> np.ndarray:
+    """Segment continuous pitch contour into discrete notes."""
+    pitches = np.asarray(pitches, dtype=np.float32)
+    if pitches.size == 0:
+        return np.zeros(num_expected_notes)
+    
+    # Get frequency range for voice type
+    range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
+    fmin = range_data["min_freq"]
+    fmax = range_data["max_freq"]
+    
+    # Remove outliers (frequencies outside voice range)
+    filtered_pitches = pitches[(pitches >= fmin) & (pitches <= fmax)]
+    
+    if filtered_pitches.size == 0:
+        return np.zeros(num_expected_notes)
+    
+    # Simple segmentation: divide into equal time segments
+    segment_size = len(filtered_pitches) // num_expected_notes
+    if segment_size == 0:
+        # If we have fewer pitches than expected notes, pad with zeros
+        result = np.zeros(num_expected_notes)
+        result[:len(filtered_pitches)] = filtered_pitches
+        return result
+    
+    # Use median pitch of segment as the note (more robust than mean). All
+    # segments are segment_size long except the last, which takes the remainder.
+    segmented_notes = np.empty(num_expected_notes)
+    head = (num_expected_notes - 1) * segment_size
+    segmented_notes[:-1] = np.median(filtered_pitches[:head].reshape(num_expected_notes - 1, segment_size), axis=1)
+    segmented_notes[-1] = np.median(filtered_pitches[head:])
+    
+    return segmented_notes
+
+def segment_pitch_track(
+    times: np.ndarray,
+    pitches: np.ndarray,
+    exercise: CompiledExercise,
+    mode: str = SEGMENTATION_MODE,
+    band_fraction: float = ALIGNMENT_BAND_FRACTION
+) -> Tuple[np.ndarray, Optional[List[Dict[str, Any]]]]:
+    """
+    Split a voiced pitch track into one detected pitch per exercise note.
+    
+    Returns ``(detected_notes, segments)``; ``segments`` holds per-note
+    start/end times in ``dtw`` mode and is None for the ``equal`` split.
+    """
+    if mode == "equal":
+        return segment_pitches_to_notes(pitches, exercise.voice_range, num_expected_notes=len(exercise)), None
+    if mode == "dtw":
+        range_data = VOICE_RANGES[exercise.voice_range]
+        return align_pitches_to_notes(
+            times, pitches, exercise.frequencies, range_data["min_freq"], range_data["max_freq"],
+            band_fraction=band_fraction
+        )
+    raise ValueError(f"Unknown segmentation mode {mode!r}. Must be one of: {list(SEGMENTATION_MODES)}")
+
+def analyze_pitch_accuracy(detected: np.ndarray, exercise: CompiledExercise, tolerance: float = 50.0) -> Dict[str, Any]:
+    """
+    Analyze pitch accuracy against a compiled exercise in one vectorized pass.
+    
+    Exercises with ``tolerance_cents`` are scored in cents; the built-in voice
+    range scales keep the legacy ``tolerance`` in Hz. Per-note results are
+    returned as plain dicts and only become ``PitchAnalysisResult`` models at
+    the response boundary.
+    """
+    reference_arr = exercise.frequencies
+    num_notes = len(reference_arr)
+    
+    # Ensure detected array matches reference length
+    detected_padded = np.zeros(num_notes)
+    detected_arr = np.asarray(detected, dtype=np.float64)[:num_notes]
+    detected_padded[:len(detected_arr)] = detected_arr
+    
+    voiced = detected_padded > 0
+    frequency_difference = np.where(voiced, detected_padded - reference_arr, 0.0)
+    cents_difference = np.where(voiced, 100.0 * (hz_to_midi(np.where(voiced, detected_padded, 1.0)) - exercise.midi), 0.0)
+    
+    # Calculate confidence based on how close the pitch is
+    if exercise.tolerance_cents is not None:
+        error, limit = np.abs(cents_difference), exercise.tolerance_cents
+    else:
+        error, limit = np.abs(frequency_difference), tolerance
+    is_accurate = voiced & (error <= limit)
+    confidence = np.where(voiced, np.clip(1.0 - error / limit, 0.0, 1.0), 0.0)
+    
+    detected_notes = detected_padded.tolist()
+    note_results = [
+        {
+            "note_index": i,
+            "expected_note": expected_note,
+            "expected_frequency": expected_frequency,
+            "detected_frequency": detected_frequency,
+            "detected_note": detected_note,
+            "is_accurate": accurate,
+            "frequency_difference": difference,
+            "confidence": note_confidence,
+            "cents_difference": cents
+        }
+        for i, (expected_note, expected_frequency, detected_frequency, detected_note, accurate, difference, note_confidence, cents) in enumerate(zip(
+            exercise.note_names,
+            reference_arr.tolist(),
+            detected_notes,
+            hz_to_note_names(detected_padded),
+            is_accurate.tolist(),
+            frequency_difference.tolist(),
+            confidence.tolist(),
+            cents_difference.tolist()
+        ))
+    ]
+    
+    # Calculate overall score
+    overall_percentage = (int(is_accurate.sum()) / num_notes) * 100 if num_notes else 0
+    score = int(overall_percentage)
+    
+    return {
+        "score": score,
+        "overall_percentage": overall_percentage,
+        "note_by_note_results": note_results,
+        "detected_pitches_hz": detected_notes,
+        "reference_melody": {
+            "notes": list(exercise.note_names),
+            "frequencies_hz": reference_arr.tolist(),
+            "voice_range": exercise.voice_range,
+            "exercise_id": exercise.exercise_id
+        }
+    }
+
+
+class NoPitchDetectedError(Exception):
+    """Raised when no usable pitch contour could be extracted from a recording."""
+
+
+@dataclass
+class PreparedRecording:
+    """A decoded recording with its voice-activity regions, ready for pitch analysis."""
+    exercise: CompiledExercise
+    audio_data: np.ndarray
+    sample_rate: int
+    regions: List[Tuple[int, int]]
+    info: Dict[str, Any]
+    frames: AnalysisFrames
+    timer: StageTimer = field(default_factory=StageTimer)
+
+def prepare_recording(audio_content: bytes, file_suffix: str, voice_range: str = "soprano", exercise_id: Optional[str] = None) -> PreparedRecording:
+    """Resolve the exercise, decode the upload and find the regions to run pitch engines over."""
+    exercise = get_exercise(exercise_id, voice_range)
+    timer = StageTimer()
+
+    # Decode straight from memory at the analysis rate
+    audio_data, sample_rate, audio_info = load_analysis_audio(audio_content, file_suffix, timer)
+
+    # Frames, spectra and energies shared by VAD and every pitch engine; the
+    # transform counts fill in as engines run
+    frames = AnalysisFrames(audio_data, sample_rate, *analysis_frame_params(sample_rate))
+    audio_info["spectral_transforms"] = frames.transforms
+
+    # Skip silence before the expensive pitch engines; an all-quiet recording is analysed whole
+    regions = [(0, len(audio_data))]
+    if VAD_ENABLED:
+        with timer.stage("vad"):
+            active_regions, audio_info["vad"] = voice_activity_regions(audio_data, sample_rate, frames.power_sum)
+        if active_regions:
+            regions = active_regions
+        else:
+            audio_info["vad"].update(trimmed_duration_seconds=audio_info["duration_seconds"], skipped_fraction=0.0)
+
+    return PreparedRecording(exercise, audio_data, sample_rate, regions, audio_info, frames, timer)
+
+def grade_pitch_track(exercise: CompiledExercise, timer: StageTimer, info: Dict[str, Any], pitch_times: np.ndarray, pitch_contour: np.ndarray) -> Dict[str, Any]:
+    """Segment and score a recording's voiced pitch track; the last half of ``run_grading_pipeline``."""
+    with timer.stage("pitch"):
+        if pitch_contour.size == 0:
+            raise NoPitchDetectedError(
+                "Could not detect any pitches in the audio. Please ensure the recording contains clear vocal content."
+            )
+
+    analysis = score_pitch_track(pitch_times, pitch_contour, exercise, timer=timer)
+
+    # Keep the contour so the result can be re-graded without the audio (see regrade.py)
+    with timer.stage("contour"):
+        analysis["pitch_contour"] = encode_contour_text(pitch_times, pitch_contour)
+    analysis["debug_info"] = {**info, "timings": timer.timings}
+    return analysis
+
+def score_pitch_track(
+    pitch_times: np.ndarray,
+    pitch_contour: np.ndarray,
+    exercise: CompiledExercise,
+    tolerance_hz: float = ANALYSIS_PARAMS["tolerance_hz"],
+    mode: str = SEGMENTATION_MODE,
+    band_fraction: float = ALIGNMENT_BAND_FRACTION,
+    timer: Optional[StageTimer] = None
+) -> Dict[str, Any]:
+    """
+    Segment a voiced pitch track into the exercise's notes and score them.
+
+    The parameters default to the service's configuration; ``regrade.py``
+    passes new ones to re-grade stored contours.
+    """
+    timer = timer or StageTimer()
+
+    # Segment pitches into discrete notes
+    with timer.stage("segment"):
+        detected_notes, segments = segment_pitch_track(pitch_times, pitch_contour, exercise, mode, band_fraction)
+
+    # Analyze pitch accuracy
+    with timer.stage("score"):
+        analysis = analyze_pitch_accuracy(detected_notes, exercise, tolerance=tolerance_hz)
+        if segments is not None:
+            for note_result, segment in zip(analysis["note_by_note_results"], segments):
+                note_result["start_time"] = segment["start_time"]
+                note_result["end_time"] = segment["end_time"]
+    return analysis
+
+def run_grading_pipeline(audio_content: bytes, file_suffix: str, voice_range: str = "soprano", exercise_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run the full decode -> pitch -> segment -> score pipeline for one recording.
+
+    This is the unit of work submitted to the grading process pool. It takes the
+    raw (still compressed) upload bytes rather than decoded samples so the
+    payload pickled across the process boundary stays as small as possible.
+
+    Per-stage wall-clock seconds are returned in ``debug_info["timings"]``; an
+    exception carries the stage that raised it as ``grading_stage``.
+
+    Recordings of ``STREAMING_MIN_SECONDS`` or more, or of unknown length, go through
+    ``streaming_analysis.run_streaming_grading_pipeline`` instead.
+    """
+    # Imported here: streaming_analysis builds on this module
+    from streaming_analysis import run_streaming_grading_pipeline, should_stream
+    if should_stream(audio_content, file_suffix):
+        return run_streaming_grading_pipeline(audio_content, file_suffix, voice_range, exercise_id)
+
+    recording = prepare_recording(audio_content, file_suffix, voice_range, exercise_id)
+
+    # Extract pitch contour
+    with recording.timer.stage("pitch"):
+        pitch_times, pitch_contour = extract_pitch_track_in_regions(
+            recording.audio_data, recording.sample_rate, recording.exercise.voice_range, recording.regions, recording.info,
+            recording.frames
+        )
+
+    return grade_pitch_track(recording.exercise, recording.timer, recording.info, pitch_times, pitch_contour)
+
+def run_grading_pipeline_batch(submissions: List[Tuple[bytes, str, str, Optional[str]]]) -> List[Any]:
+    """
+    ``run_grading_pipeline`` for several recordings, with the pitch engines run
+    once per engine over every voice-activity region of recordings that share
+    a voice range and sample rate.
+
+    Each submission is ``run_grading_pipeline``'s arguments as a tuple. Returns
+    one result dict or exception per submission, in order, so one bad upload
+    does not fail the rest. Every recording in a group reports the group's
+    pitch time and ``debug_info["micro_batch_size"]``. Long recordings are
+    streamed on their own, as in ``run_grading_pipeline``.
+    """
+    from streaming_analysis import run_streaming_grading_pipeline, should_stream
+    outcomes: List[Any] = [None] * len(submissions)
+    groups: Dict[Tuple[str, int], List[int]] = {}
+    recordings: Dict[int, PreparedRecording] = {}
+    for index, submission in enumerate(submissions):
+        try:
+            if should_stream(submission[0], submission[1]):
+                outcomes[index] = run_streaming_grading_pipeline(*submission)
+                continue
+            recording = prepare_recording(*submission)
+        except Exception as e:
+            outcomes[index] = e
+            continue
+        recordings[index] = recording
+        groups.setdefault((recording.exercise.voice_range, recording.sample_rate), []).append(index)
+
+    for (voice_range, sample_rate), members in groups.items():
+        timer = StageTimer()
+        try:
+            with timer.stage("pitch"):
+                slices = [(index, start, end) for index in members for start, end in recordings[index].regions]
+                tracks = run_pitch_engines_many(
+                    [recordings[index].frames.region(start, end) for index, start, end in slices],
+                    *pitch_engine_args(sample_rate, voice_range), chain=PITCH_ENGINE_CHAIN, min_quality=PITCH_MIN_QUALITY
+                )
+        except Exception as e:
+            for index in members:
+                outcomes[index] = e
+            continue
+
+        for index in members:
+            recording = recordings[index]
+            recording.timer.timings["pitch"] = timer.timings["pitch"]
+            recording.info["micro_batch_size"] = len(members)
+            region_tracks = [track for (owner, _, _), track in zip(slices, tracks) if owner == index]
+            try:
+                pitch_times, pitch_contour = merge_region_tracks(region_tracks, recording.regions, sample_rate, recording.info)
+                outcomes[index] = grade_pitch_track(recording.exercise, recording.timer, recording.info, pitch_times, pitch_contour)
+            except Exception as e:
+                outcomes[index] = e
+    return outcomes
@@ -0,0 +1,371 @@
+"""
+Benchmark every grading pipeline stage of both backends on synthetic singing.
+
+    python benchmarks/run_benchmarks.py --durations 5 30 120 --rates 16000 48000 \
+        --output results.json --baseline previous.json
+
+For each exercise, duration and recording sample rate this times, separately:
+
+- fastapi_backend: ``decode_audio`` (per format), ``resample_audio``,
+  ``extract_pitch_contour``, each pitch engine on its own (``--engines``),
+  ``segment_pitches_to_notes``, ``analyze_pitch_accuracy`` and the end-to-end
+  ``run_grading_pipeline`` (per format)
+- with ``--micro-batch-sizes``: ``run_grading_pipeline_batch`` over that many
+  copies of each recording, with its throughput and speedup over grading the
+  copies one by one (every recording in a batch waits for the whole batch,
+  so ``median_seconds`` is also the per-recording latency)
+- response serialization for a graded exercise of each ``--response-notes``
+  size: ``response_pydantic`` (``AssessmentResponse`` built, re-validated as
+  FastAPI does for ``response_model`` and JSON-encoded) against
+  ``response_lean`` (``assessment_payload`` encoded with ``responses.dumps``)
+- python_backend: ``extract_pitch_contour_librosa``,
+  ``extract_pitch_contour_basic``, ``segment_pitches_to_notes`` and
+  ``compare_pitches``
+
+Timings are the median/min of ``--repeat`` runs after a warm-up pass (so numba
+JIT compilation is excluded); peak memory comes from one extra run under
+tracemalloc. Grading accuracy (score, expected score and mean absolute cents
+error of the detected notes) is recorded for every end-to-end run, so a
+speedup that breaks scoring shows up as a regression.
+
+Results are written as JSON. With ``--baseline`` the run is compared against a
+previous result file and the process exits with status 1 on regressions.
+Pipeline settings (``ANALYSIS_SAMPLE_RATE`` etc.) come from the environment as
+in the service and are recorded in the output.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import librosa  # noqa: E402
+
+from audio_core.audio_io import decode_audio, resample_audio  # noqa: E402
+from audio_core.pitch_engines import PITCH_ENGINES  # noqa: E402
+
+import analysis  # noqa: E402
+from benchmarks.synthetic import FORMATS, build_corpus, synthesize_singing  # noqa: E402
+from exercises import EXERCISES, VOICE_RANGES, compile_exercise, hz_to_midi  # noqa: E402
+from responses import AssessmentResponse, assessment_payload, dumps  # noqa: E402
+
+
+def load_python_backend():
+    """Import python_backend/main.py under its own module name."""
+    path = os.path.join(os.path.dirname(BACKEND_DIR), "python_backend", "main.py")
+    spec = importlib.util.spec_from_file_location("python_backend_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func: Callable, repeat: int) -> Tuple[Any, Dict[str, float]]:
+    """Run ``func`` under tracemalloc once, then ``repeat`` timed runs."""
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return result, {
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "peak_memory_bytes": peak
+    }
+
+
+def run_engine(name: str, audio: np.ndarray, sr: int, fmin: float, fmax: float):
+    frame_length, hop_length = analysis.analysis_frame_params(sr)
+    return PITCH_ENGINES[name].track(audio, sr, fmin, fmax, frame_length, hop_length)
+
+
+def cents_error(detected: List[float], expected: np.ndarray) -> Optional[float]:
+    detected = np.asarray(detected, dtype=np.float64)[:len(expected)]
+    voiced = detected > 0
+    if not voiced.any():
+        return None
+    return float(np.mean(np.abs(100.0 * (hz_to_midi(detected[voiced]) - hz_to_midi(expected[:len(detected)][voiced])))))
+
+
+def pydantic_response(analysis: Dict[str, Any], debug_info: Dict[str, Any]) -> bytes:
+    """The model path: build the response, re-validate it like FastAPI's response_model, encode like JSONResponse."""
+    response = AssessmentResponse(**analysis, user_id="benchmark", timestamp=datetime.now(), debug_info=debug_info)
+    validated = AssessmentResponse.model_validate(response.model_dump())
+    return json.dumps(validated.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def lean_response(analysis: Dict[str, Any], debug_info: Dict[str, Any]) -> bytes:
+    return dumps(assessment_payload(analysis, "benchmark", debug_info))
+
+
+def graded_exercise(num_notes: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """A scored soprano exercise of ``num_notes`` notes, with every fifth note flat, and typical debug info."""
+    notes = [VOICE_RANGES["soprano"]["notes"][index % 5] for index in range(num_notes)]
+    exercise = compile_exercise({"id": f"synthetic_{num_notes}", "voice_range": "soprano", "notes": notes})
+    detected = exercise.frequencies * np.where(np.arange(num_notes) % 5 == 0, 0.97, 1.0)
+    debug_info = {"decode_path": "soundfile", "pitch_engine": "piptrack", "timings": {"decode": 0.001, "pitch": 0.01}}
+    return analysis.analyze_pitch_accuracy(detected, exercise), debug_info
+
+
+def warm_up(python_backend, engines: List[str]) -> float:
+    """Exercise every stage once per voice range so JIT compilation is not timed."""
+    started = time.perf_counter()
+    for voice_range in VOICE_RANGES:
+        exercise = EXERCISES[voice_range]
+        audio = synthesize_singing(exercise.frequencies, 1.0, 16000)
+        sr = 16000
+        fmin, fmax = VOICE_RANGES[voice_range]["min_freq"], VOICE_RANGES[voice_range]["max_freq"]
+        for name in engines:
+            run_engine(name, audio, sr, fmin, fmax)
+        analysis.extract_pitch_contour(audio, sr, voice_range)
+        python_backend.extract_pitch_contour_librosa(audio, sr)
+    return time.perf_counter() - started
+
+
+def run(args) -> Dict[str, Any]:
+    python_backend = load_python_backend()
+    warm_up_seconds = warm_up(python_backend, args.engines)
+
+    exercises = {exercise_id: EXERCISES[exercise_id] for exercise_id in args.exercises}
+    stages: List[Dict[str, Any]] = []
+    accuracy: List[Dict[str, Any]] = []
+    skipped: List[Dict[str, Any]] = []
+    component_done = set()
+
+    def record(backend: str, stage: str, item: Dict[str, Any], metrics: Dict[str, float], audio_format: Optional[str] = None):
+        stages.append({
+            "backend": backend,
+            "stage": stage,
+            "exercise_id": item["exercise_id"],
+            "duration_seconds": item["duration_seconds"],
+            "sample_rate": item["sample_rate"],
+            "format": audio_format,
+            **metrics
+        })
+
+    for item in build_corpus(exercises, args.durations, args.rates, args.formats, args.detune_cents):
+        exercise = item["exercise"]
+        voice_range = exercise.voice_range
+        expected = exercise.frequencies * 2 ** (args.detune_cents / 1200)
+        audio_format = item["format"]
+        label = f"{item['exercise_id']} {item['duration_seconds']:g}s {item['sample_rate']}Hz {audio_format}"
+
+        if item["encoded"] is None:
+            skipped.append({"recording": label, "reason": "encoder unavailable"})
+            continue
+        print(f"Benchmarking {label}", file=sys.stderr)
+        suffix = f".{audio_format}"
+
+        # Decode and end-to-end grading depend on the format
+        _, metrics = measure(lambda: decode_audio(item["encoded"], suffix, analysis.MAX_ANALYSIS_SECONDS or None), args.repeat)
+        record("fastapi_backend", "decode_audio", item, metrics, audio_format)
+
+        result, metrics = measure(lambda: analysis.run_grading_pipeline(item["encoded"], suffix, exercise_id=exercise.exercise_id), args.repeat)
+        record("fastapi_backend", "run_grading_pipeline", item, metrics, audio_format)
+        accuracy.append({
+            "backend": "fastapi_backend",
+            "exercise_id": item["exercise_id"],
+            "duration_seconds": item["duration_seconds"],
+            "sample_rate": item["sample_rate"],
+            "format": audio_format,
+            "score": result["score"],
+            "expected_score": analysis.analyze_pitch_accuracy(expected, exercise)["score"],
+            "mean_abs_cents_error": cents_error(result["detected_pitches_hz"], expected)
+        })
+        single_seconds = metrics["median_seconds"]
+
+        submission = (item["encoded"], suffix, voice_range, exercise.exercise_id)
+        for batch_size in args.micro_batch_sizes:
+            _, metrics = measure(lambda: analysis.run_grading_pipeline_batch([submission] * batch_size), args.repeat)
+            metrics.update(
+                batch_size=batch_size,
+                recordings_per_second=batch_size / metrics["median_seconds"],
+                speedup=single_seconds * batch_size / metrics["median_seconds"]
+            )
+            record("fastapi_backend", f"run_grading_pipeline_batch[{batch_size}]", item, metrics, audio_format)
+
+        # Component stages depend only on the audio, so run them once per recording
+        component_key = (item["exercise_id"], item["duration_seconds"], item["sample_rate"])
+        if component_key in component_done:
+            continue
+        component_done.add(component_key)
+
+        native_audio, native_sr = item["samples"], item["sample_rate"]
+        audio, sr = native_audio, native_sr
+        if analysis.ANALYSIS_SAMPLE_RATE and native_sr != analysis.ANALYSIS_SAMPLE_RATE:
+            audio, metrics = measure(lambda: resample_audio(native_audio, native_sr, analysis.ANALYSIS_SAMPLE_RATE, analysis.RESAMPLE_QUALITY), args.repeat)
+            sr = analysis.ANALYSIS_SAMPLE_RATE
+            record("fastapi_backend", "resample_audio", item, metrics)
+
+        fmin, fmax = VOICE_RANGES[voice_range]["min_freq"], VOICE_RANGES[voice_range]["max_freq"]
+        contour, metrics = measure(lambda: analysis.extract_pitch_contour(audio, sr, voice_range), args.repeat)
+        record("fastapi_backend", "extract_pitch_contour", item, metrics)
+        for name in args.engines:
+            _, metrics = measure(lambda: run_engine(name, audio, sr, fmin, fmax), args.repeat)
+            record("fastapi_backend", f"engine_{name}", item, metrics)
+        notes, metrics = measure(lambda: analysis.segment_pitches_to_notes(contour, voice_range, num_expected_notes=len(exercise)), args.repeat)
+        record("fastapi_backend", "segment_pitches_to_notes", item, metrics)
+        _, metrics = measure(lambda: analysis.analyze_pitch_accuracy(notes, exercise), args.repeat)
+        record("fastapi_backend", "analyze_pitch_accuracy", item, metrics)
+
+        # python_backend analyses at the native rate
+        contour, metrics = measure(lambda: python_backend.extract_pitch_contour_librosa(native_audio, native_sr), args.repeat)
+        record("python_backend", "extract_pitch_contour_librosa", item, metrics)
+        _, metrics = measure(lambda: python_backend.extract_pitch_contour_basic(native_audio, native_sr), args.repeat)
+        record("python_backend", "extract_pitch_contour_basic", item, metrics)
+        notes, metrics = measure(lambda: python_backend.segment_pitches_to_notes(contour, num_expected_notes=len(exercise)), args.repeat)
+        record("python_backend", "segment_pitches_to_notes", item, metrics)
+        assessment, metrics = measure(lambda: python_backend.compare_pitches(list(notes), python_backend.REFERENCE_SEQUENCE), args.repeat)
+        record("python_backend", "compare_pitches", item, metrics)
+
+        # python_backend only grades against the soprano scale
+        if exercise.exercise_id == "soprano":
+            accuracy.append({
+                "backend": "python_backend",
+                "exercise_id": item["exercise_id"],
+                "duration_seconds": item["duration_seconds"],
+                "sample_rate": item["sample_rate"],
+                "format": None,
+                "score": int(assessment["overall_percentage_score"]),
+                "expected_score": int(python_backend.compare_pitches(list(expected), python_backend.REFERENCE_SEQUENCE)["overall_percentage_score"]),
+                "mean_abs_cents_error": cents_error(assessment["detected_pitches_hz"], expected)
+            })
+
+    for num_notes in args.response_notes:
+        graded, debug_info = graded_exercise(num_notes)
+        item = {"exercise_id": f"synthetic_{num_notes}", "duration_seconds": None, "sample_rate": None}
+        for stage, serialize in (("response_pydantic", pydantic_response), ("response_lean", lean_response)):
+            _, metrics = measure(lambda: serialize(graded, debug_info), args.repeat)
+            record("fastapi_backend", stage, item, metrics)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+            "analysis_params": analysis.ANALYSIS_PARAMS,
+            "engines": args.engines,
+            "repeat": args.repeat,
+            "micro_batch_sizes": args.micro_batch_sizes,
+            "response_notes": args.response_notes,
+            "detune_cents": args.detune_cents,
+            "warm_up_seconds": warm_up_seconds
+        },
+        "stages": stages,
+        "accuracy": accuracy,
+        "skipped": skipped
+    }
+
+
+def stage_key(entry: Dict[str, Any]) -> Tuple:
+    return (entry["backend"], entry["stage"], entry["exercise_id"], entry["duration_seconds"], entry["sample_rate"], entry["format"])
+
+
+def accuracy_key(entry: Dict[str, Any]) -> Tuple:
+    return (entry["backend"], entry["exercise_id"], entry["duration_seconds"], entry["sample_rate"], entry["format"])
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float) -> List[str]:
+    """List regressions: slower stages beyond ``threshold`` and any drop in grading accuracy."""
+    regressions = []
+    previous_stages = {stage_key(entry): entry for entry in baseline.get("stages", [])}
+    for entry in current["stages"]:
+        previous = previous_stages.get(stage_key(entry))
+        if previous is None:
+            continue
+        slower = entry["median_seconds"] - previous["median_seconds"]
+        if slower > min_delta and entry["median_seconds"] > previous["median_seconds"] * (1 + threshold):
+            regressions.append(
+                f"{' '.join(str(part) for part in stage_key(entry) if part is not None)}: "
+                f"{previous['median_seconds'] * 1000:.2f} ms -> {entry['median_seconds'] * 1000:.2f} ms"
+            )
+
+    previous_accuracy = {accuracy_key(entry): entry for entry in baseline.get("accuracy", [])}
+    for entry in current["accuracy"]:
+        previous = previous_accuracy.get(accuracy_key(entry))
+        if previous is not None and entry["score"] < previous["score"]:
+            regressions.append(
+                f"{' '.join(str(part) for part in accuracy_key(entry) if part is not None)}: "
+                f"score {previous['score']} -> {entry['score']}"
+            )
+    return regressions
+
+
+def print_summary(results: Dict[str, Any]) -> None:
+    totals: Dict[Tuple[str, str], List[float]] = {}
+    for entry in results["stages"]:
+        totals.setdefault((entry["backend"], entry["stage"]), []).append(entry["median_seconds"])
+    print(f"{'backend':<16} {'stage':<30} {'runs':>5} {'total ms':>10} {'max ms':>10}")
+    for (backend, stage), values in sorted(totals.items()):
+        print(f"{backend:<16} {stage:<30} {len(values):>5} {sum(values) * 1000:>10.2f} {max(values) * 1000:>10.2f}")
+
+    batches = [entry for entry in results["stages"] if "batch_size" in entry]
+    if batches:
+        print(f"\n{'micro-batch':<44} {'size':>5} {'latency ms':>11} {'rec/s':>8} {'speedup':>8}")
+        for entry in batches:
+            label = f"{entry['exercise_id']} {entry['duration_seconds']:g}s {entry['sample_rate']}Hz {entry['format']}"
+            print(f"{label:<44} {entry['batch_size']:>5} {entry['median_seconds'] * 1000:>11.2f} "
+                  f"{entry['recordings_per_second']:>8.1f} {entry['speedup']:>7.2f}x")
+
+    wrong = [entry for entry in results["accuracy"] if entry["score"] != entry["expected_score"]]
+    print(f"\nGrading accuracy: {len(results['accuracy']) - len(wrong)}/{len(results['accuracy'])} recordings scored as expected")
+    for entry in wrong:
+        print(f"  {entry['backend']} {entry['exercise_id']} {entry['duration_seconds']:g}s {entry['sample_rate']}Hz "
+              f"{entry['format'] or ''}: score {entry['score']}, expected {entry['expected_score']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the singing assessment pipelines on synthetic audio.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120], help="Recording durations in seconds")
+    parser.add_argument("--rates", type=int, nargs="+", default=[16000, 44100, 48000], help="Recording sample rates")
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS, help="Encoded formats to decode")
+    parser.add_argument("--exercises", nargs="+", default=list(VOICE_RANGES), choices=list(EXERCISES), help="Exercise IDs to sing")
+    parser.add_argument("--engines", nargs="+", default=["piptrack", "yin", "autocorr"], choices=list(PITCH_ENGINES), help="Pitch engines to time on their own")
+    parser.add_argument("--detune-cents", type=float, default=0.0, help="Detune every sung note by this many cents")
+    parser.add_argument("--response-notes", type=int, nargs="*", default=[5, 100, 1000], help="Exercise sizes (in notes) to time response serialization for")
+    parser.add_argument("--micro-batch-sizes", type=int, nargs="*", default=[], help="Also grade batches of this many recordings together")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write JSON results")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown treated as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.001, help="Ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    results = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
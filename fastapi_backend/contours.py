@@ -0,0 +1,116 @@
+"""
+Compact binary pitch contours.
+
+Every graded recording's voiced pitch track (the frame times and pitches
+segmentation starts from) is stored with its result, so scores can be
+recomputed under a new tolerance, segmentation mode or rubric without the
+original audio (see ``regrade.py``).
+
+A contour is packed as:
+
+- a fixed header: magic, version, frame count, the reference pitch and the
+  time unit
+- frame times as unsigned deltas in ``TIME_UNIT_SECONDS`` (0.1 ms) steps,
+  which are nearly all the same hop and compress to almost nothing
+- pitches as 16-bit integer cents relative to the contour's median pitch, in
+  steps of ``CENTS_UNIT`` (1/16 cent); a contour spanning more than about
+  two octaves either side of its median uses the smallest step that fits
+
+and the body is zlib-compressed. A one-minute recording's contour takes a
+few kB; ``encode_contour_text`` base64-encodes it for JSON and the
+``pitch_results.pitch_contour`` text column.
+"""
+
+import base64
+import struct
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+CONTOUR_MAGIC = b"PCTR"
+CONTOUR_VERSION = 2
+
+# Resolution frame times are stored at
+TIME_UNIT_SECONDS = 1e-4
+
+# Finest step pitches are stored at; a pitch comes back within half a step,
+# close enough that re-grading reproduces per-note cents to a few hundredths
+CENTS_UNIT = 1 / 16
+
+# magic, version, frame count, reference pitch (Hz), time unit (s), cents unit
+_HEADER = struct.Struct("<4sBxxxIddd")
+# Version 1 stored float16 cents and had no cents unit
+_HEADER_V1 = struct.Struct("<4sBxxxIdd")
+
+
+class ContourFormatError(ValueError):
+    """Raised for data that is not a contour written by ``encode_contour``."""
+
+
+def encode_contour(times: np.ndarray, pitches: np.ndarray) -> bytes:
+    """Pack a voiced contour (increasing frame times in seconds, pitches in Hz > 0)."""
+    times = np.asarray(times, dtype=np.float64)
+    pitches = np.asarray(pitches, dtype=np.float64)
+    if len(times) != len(pitches):
+        raise ValueError(f"{len(times)} frame times for {len(pitches)} pitches")
+    if len(pitches) and not (np.all(pitches > 0) and np.all(np.isfinite(pitches))):
+        raise ValueError("Pitches must be positive and finite")
+
+    reference = float(np.median(pitches)) if len(pitches) else 0.0
+    ticks = np.round(times / TIME_UNIT_SECONDS).astype(np.int64)
+    deltas = np.diff(ticks, prepend=0)
+    if len(deltas) and (deltas.min() < 0 or deltas.max() > np.iinfo(np.uint32).max):
+        raise ValueError("Frame times must be non-negative and increasing")
+    cents = 1200.0 * np.log2(pitches / reference) if len(pitches) else pitches
+    cents_unit = max(CENTS_UNIT, float(np.abs(cents).max()) / np.iinfo(np.int16).max) if len(cents) else CENTS_UNIT
+    steps = np.round(cents / cents_unit)
+
+    body = deltas.astype("<u4").tobytes() + steps.astype("<i2").tobytes()
+    header = _HEADER.pack(CONTOUR_MAGIC, CONTOUR_VERSION, len(times), reference, TIME_UNIT_SECONDS, cents_unit)
+    return header + zlib.compress(body)
+
+
+def decode_contour(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """``(times, pitches)`` of a packed contour (either version), as float64 seconds and float32 Hz."""
+    if len(data) < _HEADER_V1.size:
+        raise ContourFormatError("Contour is truncated")
+    magic, version = data[:4], data[4]
+    if magic != CONTOUR_MAGIC or version not in (1, CONTOUR_VERSION):
+        raise ContourFormatError(f"Not a version 1 or {CONTOUR_VERSION} pitch contour")
+    header = _HEADER if version == CONTOUR_VERSION else _HEADER_V1
+    if len(data) < header.size:
+        raise ContourFormatError("Contour is truncated")
+    if version == CONTOUR_VERSION:
+        _, _, count, reference, time_unit, cents_unit = header.unpack_from(data)
+    else:
+        _, _, count, reference, time_unit = header.unpack_from(data)
+    try:
+        body = zlib.decompress(data[header.size:])
+    except zlib.error as e:
+        raise ContourFormatError(f"Contour body is corrupt: {e}") from e
+    if len(body) != count * 6:
+        raise ContourFormatError(f"Contour body holds {len(body)} bytes for {count} frames")
+
+    deltas = np.frombuffer(body, dtype="<u4", count=count)
+    if version == CONTOUR_VERSION:
+        cents = np.frombuffer(body, dtype="<i2", count=count, offset=count * 4) * cents_unit
+    else:
+        cents = np.frombuffer(body, dtype="<f2", count=count, offset=count * 4)
+    times = np.cumsum(deltas, dtype=np.int64) * time_unit
+    pitches = (reference * np.exp2(cents.astype(np.float64) / 1200.0)).astype(np.float32)
+    return times, pitches
+
+
+def encode_contour_text(times: np.ndarray, pitches: np.ndarray) -> str:
+    """``encode_contour`` as base64 text."""
+    return base64.b64encode(encode_contour(times, pitches)).decode("ascii")
+
+
+def decode_contour_text(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """``decode_contour`` of base64 text from ``encode_contour_text``."""
+    try:
+        data = base64.b64decode(text, validate=True)
+    except ValueError as e:
+        raise ContourFormatError(f"Contour is not valid base64: {e}") from e
+    return decode_contour(data)
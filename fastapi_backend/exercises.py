@@ -0,0 +1,238 @@
+"""
+Reference exercises and note math.
+
+Every exercise is compiled once at import into MIDI and frequency arrays so
+grading never walks a note dictionary. The built-in exercise for each voice
+range is its ``VOICE_RANGES`` scale (exercise ID = voice range name); further
+exercises are loaded from JSON files in ``EXERCISES_DIR``:
+
+    {
+        "id": "soprano_octave_scale",
+        "title": "C major scale, one octave up and down",
+        "voice_range": "soprano",
+        "notes": ["C4", "D4", "E4", 65, "G4"],
+        "tolerance_cents": 50
+    }
+
+Notes may be scientific pitch names (``"F#3"``, ``"Bb4"``) or MIDI numbers.
+Exercises without ``tolerance_cents`` use the legacy Hz tolerance.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Reference melodies for different voice ranges
+VOICE_RANGES = {
+    "soprano": {
+        "melody": {
+            "C4": 261.63,
+            "D4": 293.66,
+            "E4": 329.63,
+            "F4": 349.23,
+            "G4": 392.00
+        },
+        "sequence": [261.63, 293.66, 329.63, 349.23, 392.00],
+        "notes": ["C4", "D4", "E4", "F4", "G4"],
+        "min_freq": 200,
+        "max_freq": 600
+    },
+    "alto": {
+        "melody": {
+            "G3": 196.00,
+            "A3": 220.00,
+            "B3": 246.94,
+            "C4": 261.63,
+            "D4": 293.66
+        },
+        "sequence": [196.00, 220.00, 246.94, 261.63, 293.66],
+        "notes": ["G3", "A3", "B3", "C4", "D4"],
+        "min_freq": 150,
+        "max_freq": 450
+    },
+    "tenor": {
+        "melody": {
+            "C3": 130.81,
+            "D3": 146.83,
+            "E3": 164.81,
+            "F3": 174.61,
+            "G3": 196.00
+        },
+        "sequence": [130.81, 146.83, 164.81, 174.61, 196.00],
+        "notes": ["C3", "D3", "E3", "F3", "G3"],
+        "min_freq": 100,
+        "max_freq": 400
+    },
+    "bass": {
+        "melody": {
+            "G2": 98.00,
+            "A2": 110.00,
+            "B2": 123.47,
+            "C3": 130.81,
+            "D3": 146.83
+        },
+        "sequence": [98.00, 110.00, 123.47, 130.81, 146.83],
+        "notes": ["G2", "A2", "B2", "C3", "D3"],
+        "min_freq": 70,
+        "max_freq": 300
+    }
+}
+
+EXERCISES_DIR = os.getenv("EXERCISES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exercises"))
+
+PITCH_CLASSES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+PITCH_CLASS_OFFSETS = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+ACCIDENTAL_OFFSETS = {"": 0, "#": 1, "b": -1}
+
+# Name of every MIDI note 0-127, indexed by MIDI number, plus a trailing "Unknown"
+CHROMATIC_NOTE_NAMES = np.array(
+    [f"{PITCH_CLASSES[midi % 12]}{midi // 12 - 1}" for midi in range(128)] + ["Unknown"]
+)
+
+
+def note_name_to_midi(note: str) -> int:
+    """Convert a scientific pitch name like ``"C4"`` or ``"F#3"`` to a MIDI number."""
+    note = note.strip()
+    letter = note[:1].upper()
+    accidental = note[1:2] if note[1:2] in ("#", "b") else ""
+    octave = note[1 + len(accidental):]
+    if letter not in PITCH_CLASS_OFFSETS or not octave.lstrip("-").isdigit():
+        raise ValueError(f"Invalid note name: {note!r}")
+    return (int(octave) + 1) * 12 + PITCH_CLASS_OFFSETS[letter] + ACCIDENTAL_OFFSETS[accidental]
+
+
+def midi_to_hz(midi: np.ndarray) -> np.ndarray:
+    return 440.0 * np.power(2.0, (np.asarray(midi, dtype=np.float64) - 69.0) / 12.0)
+
+
+def hz_to_midi(frequencies: np.ndarray) -> np.ndarray:
+    """Fractional MIDI number for each frequency (NaN where the frequency is not positive)."""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(frequencies > 0, 69.0 + 12.0 * np.log2(frequencies / 440.0), np.nan)
+
+
+def hz_to_note_names(frequencies: np.ndarray) -> List[str]:
+    """Nearest chromatic note name for each frequency, in O(1) per value."""
+    midi = np.rint(hz_to_midi(frequencies))
+    valid = np.isfinite(midi) & (midi >= 0) & (midi <= 127)
+    index = np.where(valid, np.nan_to_num(midi), len(CHROMATIC_NOTE_NAMES) - 1).astype(np.intp)
+    return CHROMATIC_NOTE_NAMES[index].tolist()
+
+
+def hz_to_note_name(frequency: float) -> str:
+    """Convert a frequency to its nearest chromatic note name."""
+    return hz_to_note_names(np.array([frequency]))[0]
+
+
+@dataclass(frozen=True)
+class CompiledExercise:
+    """A reference exercise precompiled into MIDI/frequency arrays."""
+    exercise_id: str
+    title: str
+    voice_range: str
+    note_names: Tuple[str, ...]
+    midi: np.ndarray
+    frequencies: np.ndarray
+    tolerance_cents: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.note_names)
+
+    def definition_hash(self) -> str:
+        """Hash of what the exercise grades against: its target frequencies and cents tolerance."""
+        digest = hashlib.sha256(np.ascontiguousarray(self.frequencies, dtype="<f8").tobytes())
+        digest.update(repr(self.tolerance_cents).encode("ascii"))
+        return digest.hexdigest()
+
+    def describe(self) -> Dict[str, Union[str, int, float, List]]:
+        return {
+            "id": self.exercise_id,
+            "title": self.title,
+            "voice_range": self.voice_range,
+            "notes": list(self.note_names),
+            "frequencies_hz": self.frequencies.tolist(),
+            "tolerance_cents": self.tolerance_cents
+        }
+
+
+def compile_exercise(definition: Dict) -> CompiledExercise:
+    """Validate an exercise definition and compile it to arrays."""
+    exercise_id = definition["id"]
+    voice_range = definition["voice_range"]
+    if voice_range not in VOICE_RANGES:
+        raise ValueError(f"Exercise {exercise_id!r} has unknown voice_range {voice_range!r}")
+
+    raw_notes = definition["notes"]
+    if not raw_notes:
+        raise ValueError(f"Exercise {exercise_id!r} has no notes")
+    midi = np.array([note if isinstance(note, (int, float)) else note_name_to_midi(note) for note in raw_notes], dtype=np.float64)
+    frequencies = midi_to_hz(midi)
+
+    range_data = VOICE_RANGES[voice_range]
+    if frequencies.min() < range_data["min_freq"] or frequencies.max() > range_data["max_freq"]:
+        raise ValueError(f"Exercise {exercise_id!r} has notes outside the {voice_range} range")
+
+    tolerance_cents = definition.get("tolerance_cents", 50.0)
+    return CompiledExercise(
+        exercise_id=exercise_id,
+        title=definition.get("title", exercise_id),
+        voice_range=voice_range,
+        note_names=tuple(CHROMATIC_NOTE_NAMES[int(round(m))] for m in midi),
+        midi=midi,
+        frequencies=frequencies,
+        tolerance_cents=float(tolerance_cents) if tolerance_cents is not None else None
+    )
+
+
+def builtin_exercises() -> Dict[str, CompiledExercise]:
+    """One exercise per voice range, using the exact ``VOICE_RANGES`` frequencies and Hz tolerance."""
+    exercises = {}
+    for voice_range, range_data in VOICE_RANGES.items():
+        frequencies = np.array(range_data["sequence"], dtype=np.float64)
+        exercises[voice_range] = CompiledExercise(
+            exercise_id=voice_range,
+            title=f"{voice_range.title()} five-note scale",
+            voice_range=voice_range,
+            note_names=tuple(range_data["notes"]),
+            midi=hz_to_midi(frequencies),
+            frequencies=frequencies,
+            tolerance_cents=None
+        )
+    return exercises
+
+
+def load_exercises(directory: str = EXERCISES_DIR) -> Dict[str, CompiledExercise]:
+    """Load and compile the built-in exercises plus every JSON exercise in ``directory``."""
+    exercises = builtin_exercises()
+    if not os.path.isdir(directory):
+        return exercises
+
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for definition in data if isinstance(data, list) else [data]:
+            try:
+                exercise = compile_exercise(definition)
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"Invalid exercise in {path}: {e}") from e
+            if exercise.exercise_id in exercises:
+                raise ValueError(f"Duplicate exercise id {exercise.exercise_id!r} in {path}")
+            exercises[exercise.exercise_id] = exercise
+    return exercises
+
+
+# Loaded once per process (including analysis workers)
+EXERCISES = load_exercises()
+
+
+def get_exercise(exercise_id: Optional[str] = None, voice_range: str = "soprano") -> CompiledExercise:
+    """Look up an exercise by ID, defaulting to the voice range's built-in scale."""
+    return EXERCISES[exercise_id or voice_range]
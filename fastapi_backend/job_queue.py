@@ -0,0 +1,431 @@
+"""
+Persistent grading job queue.
+
+``POST /jobs`` stores the upload and returns at once; ``JobWorkers`` grade
+jobs in the background and ``GET /jobs/{id}`` reports their progress. The
+queue is a local SQLite database (WAL mode, no external broker), so queued
+jobs survive a restart and several API processes on one host can share it:
+a job is claimed inside an immediate transaction, so only one worker ever
+takes it.
+
+Jobs run highest ``priority`` first, oldest first within a priority. A job
+that fails with ``JobError`` is final (the recording itself is unusable);
+any other exception is treated as transient and the job is re-queued with
+exponential backoff until it has used ``max_attempts``. Uploads are deleted
+once a job finishes, and finished jobs are purged after ``retention_seconds``.
+
+A claimed job records its ``owner`` (one ``JobQueue`` per process) and a
+lease that the owner's workers renew every ``lease_seconds / 3`` while the
+job runs. Only jobs whose lease has expired (their process crashed or hung)
+are re-queued, at startup and periodically while workers run, so a
+restarting process never takes jobs its siblings are still grading.
+
+``process`` is any coroutine taking ``(job, content)`` and returning the
+result as a JSON-serialisable dict, so a local stand-in can replace the
+grading pipeline in tests.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    voice_range TEXT NOT NULL,
+    exercise_id TEXT,
+    filename TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    status_code INTEGER,
+    error TEXT,
+    result TEXT,
+    owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, created_at);
+CREATE TABLE IF NOT EXISTS job_uploads (
+    job_id TEXT PRIMARY KEY,
+    content BLOB NOT NULL
+);
+"""
+
+# Columns added after the first release, with their definitions, for existing databases
+LEASE_COLUMNS = {"owner": "TEXT", "lease_expires_at": "REAL"}
+
+
+class JobError(Exception):
+    """A job failure that retrying cannot fix, recorded with its HTTP status."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class QueueFullError(Exception):
+    """The queue already holds ``max_queued`` jobs waiting to run."""
+
+
+class JobQueue:
+    """SQLite-backed job store. Methods are blocking; call them from an executor."""
+
+    def __init__(
+        self,
+        path: str,
+        max_queued: int = 10000,
+        retention_seconds: float = 7 * 86400,
+        lease_seconds: float = 60.0,
+        owner: Optional[str] = None
+    ):
+        self.path = path
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in LEASE_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(
+        self,
+        content: bytes,
+        filename: str,
+        user_id: str,
+        voice_range: str,
+        exercise_id: Optional[str] = None,
+        priority: int = 0,
+        max_attempts: int = 3
+    ) -> Dict[str, Any]:
+        """Store an upload as a queued job; raises ``QueueFullError`` at capacity."""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if self.max_queued and queued >= self.max_queued:
+                    raise QueueFullError(f"Job queue is full ({queued} jobs waiting)")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, priority, user_id, voice_range, exercise_id, filename, max_attempts, created_at, available_at)"
+                    " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, priority, user_id, voice_range, exercise_id, filename, max_attempts, now, now)
+                )
+                self._conn.execute("INSERT INTO job_uploads (job_id, content) VALUES (?, ?)", (job_id, content))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def claim(self) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Mark the next runnable job as running under this queue's lease and return it with its upload."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ?"
+                    " ORDER BY priority DESC, created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, owner = ?, lease_expires_at = ?"
+                    " WHERE id = ?",
+                    (now, self.owner, now + self.lease_seconds, row["id"])
+                )
+                job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                upload = self._conn.execute("SELECT content FROM job_uploads WHERE job_id = ?", (row["id"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._job(job), upload["content"] if upload is not None else b""
+
+    # Every state change below applies only while this queue still holds the
+    # job's lease; a job whose lease expired may already be running elsewhere
+
+    def _finish(self, job_id: str, status: str, status_code: int, error: Optional[str], result: Optional[Dict[str, Any]]) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, status_code = ?, error = ?, result = ?, lease_expires_at = NULL"
+                    " WHERE id = ? AND status = 'running' AND owner = ?",
+                    (status, time.time(), status_code, error, json.dumps(result) if result is not None else None, job_id, self.owner)
+                ).rowcount
+                if updated:
+                    self._conn.execute("DELETE FROM job_uploads WHERE job_id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(updated)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> bool:
+        """Record a job's result; False if its lease was lost and it was re-queued."""
+        return self._finish(job_id, "succeeded", 200, None, result)
+
+    def fail(self, job_id: str, status_code: int, error: str) -> bool:
+        """Record a final failure; False if the job's lease was lost."""
+        return self._finish(job_id, "failed", status_code, error, None)
+
+    def retry(self, job_id: str, delay: float, error: str) -> None:
+        """Put a job back in the queue, runnable again after ``delay`` seconds."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', available_at = ?, error = ?, lease_expires_at = NULL"
+                " WHERE id = ? AND status = 'running' AND owner = ?",
+                (time.time() + delay, error, job_id, self.owner)
+            )
+
+    def release(self, job_id: str) -> None:
+        """Re-queue a job interrupted by shutdown without counting the attempt."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_expires_at = NULL"
+                " WHERE id = ? AND status = 'running' AND owner = ?",
+                (job_id, self.owner)
+            )
+
+    def heartbeat(self, job_ids: List[str]) -> int:
+        """Renew the lease of jobs this queue is running; returns how many it still holds."""
+        if not job_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE status = 'running' AND owner = ? AND id IN ({placeholders})",
+                (time.time() + self.lease_seconds, self.owner, *job_ids)
+            ).rowcount
+
+    def recover(self) -> int:
+        """Re-queue running jobs whose lease has expired: their process exited or stopped renewing it."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', lease_expires_at = NULL"
+                " WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (time.time(),)
+            ).rowcount
+
+    def purge(self) -> int:
+        """Delete finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?", (cutoff,)
+            ).rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job with its result, plus ``queue_position`` (0 = next) while queued."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._job(row)
+            job["queue_position"] = None
+            if job["status"] == "queued":
+                job["queue_position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND created_at < ?))",
+                    (job["priority"], job["priority"], job["created_at"])
+                ).fetchone()[0]
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth by status and priority, and how long jobs wait before starting."""
+        now = time.time()
+        with self._lock:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            by_priority = self._conn.execute(
+                "SELECT priority, COUNT(*), MIN(created_at) FROM jobs WHERE status = 'queued' GROUP BY priority ORDER BY priority DESC"
+            ).fetchall()
+            recent_wait = self._conn.execute(
+                "SELECT AVG(started_at - created_at), MAX(started_at - created_at) FROM jobs WHERE started_at >= ?",
+                (now - 3600,)
+            ).fetchone()
+        oldest = min((created for _, _, created in by_priority), default=None)
+        return {
+            "queued": by_status.get("queued", 0),
+            "running": by_status.get("running", 0),
+            "succeeded": by_status.get("succeeded", 0),
+            "failed": by_status.get("failed", 0),
+            "max_queued": self.max_queued,
+            "queued_by_priority": {str(priority): count for priority, count, _ in by_priority},
+            "oldest_queued_seconds": now - oldest if oldest is not None else 0.0,
+            "mean_wait_seconds_1h": recent_wait[0] or 0.0,
+            "max_wait_seconds_1h": recent_wait[1] or 0.0
+        }
+
+
+class JobWorkers:
+    """A fixed number of asyncio tasks taking jobs from a ``JobQueue``."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        process: Callable[[Dict[str, Any], bytes], Awaitable[Dict[str, Any]]],
+        workers: int = 2,
+        retry_base_delay: float = 2.0,
+        poll_interval: float = 1.0,
+        on_finished: Optional[Callable[[Dict[str, Any], str], None]] = None
+    ):
+        self.queue = queue
+        self.process = process
+        self.workers = workers
+        self.retry_base_delay = retry_base_delay
+        self.poll_interval = poll_interval
+        self.on_finished = on_finished
+
+        self._tasks: List[asyncio.Task] = []
+        self._running_jobs: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        self.jobs_succeeded = 0
+        self.jobs_failed = 0
+        self.jobs_retried = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self) -> None:
+        """Re-queue jobs whose lease expired, purge finished ones and start the workers."""
+        loop = asyncio.get_running_loop()
+        recovered = await loop.run_in_executor(None, self.queue.recover)
+        purged = await loop.run_in_executor(None, self.queue.purge)
+        if recovered or purged:
+            print(f"Job queue: re-queued {recovered} interrupted job(s), purged {purged} expired job(s)")
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._keep_leases()))
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running go back to the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers (called after a submit)."""
+        self._wakeup.set()
+
+    def _notify_changed(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait until any job changes state in this process; False on timeout."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _keep_leases(self) -> None:
+        """Renew the leases of this process's running jobs and re-queue other processes' expired ones."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await loop.run_in_executor(None, self.queue.heartbeat, list(self._running_jobs))
+                recovered = await loop.run_in_executor(None, self.queue.recover)
+                if recovered:
+                    print(f"Job queue: re-queued {recovered} job(s) whose lease expired")
+                    self.notify()
+            except Exception as e:
+                print(f"Error renewing job leases: {e}")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            claimed = await loop.run_in_executor(None, self.queue.claim)
+            if claimed is None:
+                # Idle: wait for a submit, or poll for retries and jobs queued by other processes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job, content = claimed
+            self._running_jobs.add(job["id"])
+            self._notify_changed()
+            try:
+                outcome = await self._run_job(job, content)
+            except asyncio.CancelledError:
+                await asyncio.shield(loop.run_in_executor(None, self.queue.release, job["id"]))
+                raise
+            finally:
+                self._running_jobs.discard(job["id"])
+            self._notify_changed()
+            if self.on_finished is not None:
+                self.on_finished(job, outcome)
+
+    async def _run_job(self, job: Dict[str, Any], content: bytes) -> str:
+        """Run one job and record its outcome: ``succeeded``, ``failed`` or ``retried``."""
+        loop = asyncio.get_running_loop()
+        try:
+            result = await self.process(job, content)
+        except JobError as e:
+            await loop.run_in_executor(None, self.queue.fail, job["id"], e.status_code, e.detail)
+            self.jobs_failed += 1
+            return "failed"
+        except Exception as e:
+            error = f"Error processing audio: {e}"
+            if job["attempts"] >= job["max_attempts"]:
+                await loop.run_in_executor(None, self.queue.fail, job["id"], 500, error)
+                self.jobs_failed += 1
+                return "failed"
+            delay = self.retry_base_delay * (2 ** (job["attempts"] - 1))
+            print(f"Job {job['id']} attempt {job['attempts']} failed, retrying in {delay:g}s: {e}")
+            await loop.run_in_executor(None, self.queue.retry, job["id"], delay, error)
+            self.jobs_retried += 1
+            return "retried"
+
+        if not await loop.run_in_executor(None, self.queue.complete, job["id"], result):
+            print(f"Job {job['id']} finished after its lease expired; keeping the state recorded since")
+        self.jobs_succeeded += 1
+        return "succeeded"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "jobs_succeeded": self.jobs_succeeded,
+            "jobs_failed": self.jobs_failed,
+            "jobs_retried": self.jobs_retried
+        }
@@ -0,0 +1,106 @@
+"""
+Incremental pitch tracking for real-time (WebSocket) grading.
+
+The browser streams raw PCM while the student sings. ``StreamingPitchTracker``
+keeps the tail of the previous chunk so analysis frames overlap across chunk
+boundaries exactly as they would over the whole recording, and accumulates the
+voiced contour so the session can be scored with the usual
+``segment_pitches_to_notes`` / ``analyze_pitch_accuracy`` stages at any time.
+"""
+
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from audio_core.pitch_engines import autocorr_pitch_track
+
+from analysis import ANALYSIS_PARAMS, VOICE_RANGES, segment_pitches_to_notes, analyze_pitch_accuracy
+from exercises import CompiledExercise, hz_to_note_names
+
+# Supported PCM encodings for incoming chunks
+PCM_DTYPES = {
+    "f32le": np.dtype("<f4"),
+    "s16le": np.dtype("<i2"),
+}
+
+
+def decode_pcm_chunk(payload: bytes, encoding: str = "f32le") -> np.ndarray:
+    """Convert a binary PCM message into float32 samples in [-1, 1]."""
+    dtype = PCM_DTYPES[encoding]
+    usable = len(payload) - (len(payload) % dtype.itemsize)
+    samples = np.frombuffer(payload[:usable], dtype=dtype)
+    if dtype.kind == "i":
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32, copy=False)
+
+
+class StreamingPitchTracker:
+    """Per-session pitch tracker fed with consecutive PCM chunks."""
+
+    def __init__(self, sample_rate: int, exercise: CompiledExercise, frame_seconds: float = 0.04, hop_seconds: float = 0.01):
+        range_data = VOICE_RANGES[exercise.voice_range]
+        self.sample_rate = sample_rate
+        self.exercise = exercise
+        self.voice_range = exercise.voice_range
+        self.fmin = range_data["min_freq"]
+        self.fmax = range_data["max_freq"]
+        self.frame_length = int(frame_seconds * sample_rate)
+        self.hop_length = max(1, int(hop_seconds * sample_rate))
+
+        # Samples not yet consumed by a complete frame (carried into the next chunk)
+        self._pending = np.zeros(0, dtype=np.float32)
+        # Absolute sample index of self._pending[0]
+        self._pending_offset = 0
+        self._contour_chunks: List[np.ndarray] = []
+        self._contour_cache = np.zeros(0, dtype=np.float32)
+        self.samples_received = 0
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.samples_received / self.sample_rate
+
+    @property
+    def contour(self) -> np.ndarray:
+        """Voiced frame pitches seen so far, as one contiguous float32 array."""
+        if self._contour_chunks:
+            self._contour_cache = np.concatenate([self._contour_cache] + self._contour_chunks)
+            self._contour_chunks = []
+        return self._contour_cache
+
+    def push(self, samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add a chunk and analyse every frame it completes.
+
+        Returns ``(times, pitches)`` for the newly completed frames, with times
+        in seconds at frame centres and 0 pitch for unvoiced frames.
+        """
+        self.samples_received += len(samples)
+        buffer = np.concatenate([self._pending, samples]) if len(self._pending) else np.asarray(samples, dtype=np.float32)
+
+        pitches = autocorr_pitch_track(buffer, self.sample_rate, self.fmin, self.fmax, self.frame_length, self.hop_length)
+        num_frames = len(pitches)
+        starts = self._pending_offset + np.arange(num_frames) * self.hop_length
+        times = (starts + self.frame_length / 2) / self.sample_rate
+
+        # Keep the overlap: everything from the first frame start not yet analysed
+        consumed = num_frames * self.hop_length
+        self._pending = buffer[consumed:].copy()
+        self._pending_offset += consumed
+
+        voiced = pitches[pitches > 0]
+        if voiced.size:
+            self._contour_chunks.append(voiced)
+        return times, pitches
+
+    def frame_updates(self, times: np.ndarray, pitches: np.ndarray) -> List[Dict[str, Any]]:
+        """Per-frame messages for newly tracked frames."""
+        notes = hz_to_note_names(pitches)
+        return [
+            {"time": time, "frequency_hz": pitch, "note": note}
+            for time, pitch, note in zip(np.round(times, 4).tolist(), np.round(pitches.astype(np.float64), 2).tolist(), notes)
+        ]
+
+    def analyze(self) -> Dict[str, Any]:
+        """Score the contour collected so far against the session's exercise."""
+        detected_notes = segment_pitches_to_notes(self.contour, self.voice_range, num_expected_notes=len(self.exercise))
+        return analyze_pitch_accuracy(detected_notes, self.exercise, tolerance=ANALYSIS_PARAMS["tolerance_hz"])
@@ -1,22 +1,362 @@
+import json
 import os
-import tempfile
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from datetime import datetime
+import multiprocessing
 from typing import Optional, List, Dict, Any
 
-import librosa
-import numpy as np
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from supabase import create_client, Client
 import asyncio
 from pydantic import BaseModel
 
+from admission import AdmissionController, AdmissionRejected
+from analysis import (
+    ANALYSIS_PARAMS,
+    VOICE_RANGES,
+    NoPitchDetectedError,
+    run_grading_pipeline,
+    run_grading_pipeline_batch,
+)
+from exercises import EXERCISES, CompiledExercise, get_exercise
+from job_queue import TERMINAL_STATUSES, JobError, JobQueue, JobWorkers, QueueFullError
+from metrics import MetricsRegistry
+from progress import ProgressStore
+from micro_batching import MicroBatcher
+from result_cache import ResultCache, result_cache_key
+from responses import AssessmentResponse, LeanJSONResponse, assessment_payload, dumps
+from result_writer import ResultWriteBehind
+from uploads import UploadLimitMiddleware, UploadTooLargeError, check_recording_duration, read_upload
+from warmup import warm_up_pipeline, warm_up_worker, worker_warmup_status
+from live_grading import PCM_DTYPES, StreamingPitchTracker, decode_pcm_chunk
+
+# Number of worker processes used for audio analysis. Defaults to one per core;
+# set to 0 to run analysis on a thread in the API process instead.
+GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", str(os.cpu_count() or 1)))
+
+# Grade synthetic clips in every worker at startup so numba compilation and
+# decoder initialisation never land on a real request. /health reports ready
+# once this finishes (or after WARMUP_TIMEOUT seconds).
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))
+
+# Maximum number of recordings accepted by a single /grade_singing/batch request
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+
+# Upload limits (0 = no limit). Request bodies over the cap are refused with
+# 413 while streaming; recordings whose headers exceed MAX_UPLOAD_SECONDS are
+# refused before decode.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 << 20)))
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(250 << 20)))
+MAX_UPLOAD_SECONDS = float(os.getenv("MAX_UPLOAD_SECONDS", "600"))
+
+# Allowance for the multipart boundaries and form fields around a single upload
+FORM_OVERHEAD_BYTES = 64 << 10
+
+# Lean responses: grading results are built as plain dicts and encoded with a
+# numpy-aware JSON encoder (orjson when installed) instead of being validated
+# through AssessmentResponse. The JSON schema is the same; set to 0 to go back
+# to the pydantic models.
+LEAN_RESPONSES = os.getenv("LEAN_RESPONSES", "1") != "0"
+
+# Micro-batching: recordings arriving within MICRO_BATCH_WINDOW_MS of each other
+# are graded together, up to MICRO_BATCH_MAX_SIZE per batch, so the pitch
+# engines run once over a stacked array. Only pays off for bursts of short
+# recordings; 0 (the default) disables it.
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "0"))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "8"))
+MICRO_BATCHING = MICRO_BATCH_WINDOW_MS > 0 and MICRO_BATCH_MAX_SIZE > 1
+
+# Admission control in front of the analysis stage: at most ADMISSION_CAPACITY
+# analyses run at once (default one per worker, or enough to fill every
+# worker's batch with micro-batching on); others wait, fairly shared
+# between users, up to ADMISSION_MAX_WAIT seconds in a queue of at most
+# ADMISSION_MAX_QUEUED before being refused with Retry-After. Capacity 0 disables it.
+ADMISSION_CAPACITY = int(os.getenv(
+    "ADMISSION_CAPACITY",
+    str((GRADING_WORKERS or os.cpu_count() or 1) * (MICRO_BATCH_MAX_SIZE if MICRO_BATCHING else 1))
+))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "200"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+ADMISSION_MAX_QUEUED_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUED_PER_USER", "0"))
+
+# Job mode (POST /jobs): uploads are queued in a local SQLite database and graded
+# by JOB_WORKERS background tasks; transient failures are retried up to
+# JOB_MAX_ATTEMPTS times with exponential backoff from JOB_RETRY_DELAY seconds.
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "grading_jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(GRADING_WORKERS, 1))))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "2.0"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "10000"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 86400)))
+# A running job's lease; its process renews it every third of this, and any
+# process re-queues jobs whose lease has lapsed (their process died)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Job event streams re-read the job at least every JOB_EVENT_POLL_INTERVAL
+# seconds and send a keep-alive comment after JOB_EVENT_HEARTBEAT idle seconds
+JOB_EVENT_POLL_INTERVAL = float(os.getenv("JOB_EVENT_POLL_INTERVAL", "1.0"))
+JOB_EVENT_HEARTBEAT = float(os.getenv("JOB_EVENT_HEARTBEAT", "15"))
+
+# Per-user progress aggregates (GET /users/{user_id}/progress), updated as each
+# result is stored; the last PROGRESS_RECENT_WINDOW scores/attempts form the recent trend
+PROGRESS_DB_PATH = os.getenv("PROGRESS_DB_PATH", "grading_progress.sqlite3")
+PROGRESS_RECENT_WINDOW = int(os.getenv("PROGRESS_RECENT_WINDOW", "10"))
+
+# Store each result's compact pitch contour in pitch_results.pitch_contour so it
+# can be re-graded without the audio (regrade.py). Off by default: every insert
+# fails until the column's migration is applied, so enable it only afterwards
+STORE_PITCH_CONTOURS = os.getenv("STORE_PITCH_CONTOURS", "0") == "1"
+
+# Longest real-time session accepted before the socket is closed
+REALTIME_MAX_SECONDS = float(os.getenv("REALTIME_MAX_SECONDS", "300"))
+
+# Largest binary PCM message accepted from a real-time client (1 MiB is about
+# 5 seconds of 48 kHz f32le); larger frames close the socket with 1009
+REALTIME_MAX_FRAME_BYTES = int(os.getenv("REALTIME_MAX_FRAME_BYTES", str(1024 * 1024)))
+
+# Audio seconds between running-accuracy updates pushed to real-time clients
+REALTIME_SUMMARY_INTERVAL = float(os.getenv("REALTIME_SUMMARY_INTERVAL", "0.5"))
+
+# Result cache for repeated submissions of the same recording. Set
+# RESULT_CACHE_SIZE=0 to disable, RESULT_CACHE_DIR to add an on-disk tier.
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+    disk_dir=os.getenv("RESULT_CACHE_DIR") or None
+)
+
+# Write-behind storage: results are inserted in batches by a background task
+result_writer = ResultWriteBehind(
+    insert_rows=lambda rows: insert_pitch_results(rows),  # resolved at call time
+    on_written=lambda rows: record_progress(rows),
+    journal_path=os.getenv("RESULT_JOURNAL_PATH", "pitch_results_journal.jsonl"),
+    max_queue=int(os.getenv("RESULT_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("RESULT_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("RESULT_FLUSH_INTERVAL", "1.0"))
+)
+
+SUPPORTED_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.webm')
+
+# Prometheus metrics served by GET /metrics. Worker processes report their
+# stage timings in debug_info; they are recorded here in the API process.
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "grading_stage_seconds", "Time spent in each grading stage",
+    ("stage", "voice_range", "format")
+)
+requests_total = metrics.counter(
+    "grading_requests_total", "Graded recordings by endpoint and HTTP status",
+    ("endpoint", "voice_range", "format", "status")
+)
+failures_total = metrics.counter(
+    "grading_failures_total", "Grading failures by the stage that raised",
+    ("stage", "voice_range", "format")
+)
+pitch_engine_total = metrics.counter(
+    "grading_pitch_engine_total", "Recordings whose pitch contour came from each engine",
+    ("engine", "voice_range")
+)
+decoded_bytes_total = metrics.counter(
+    "grading_decoded_bytes_total", "Upload bytes decoded for analysis",
+    ("format",)
+)
+audio_seconds_total = metrics.counter(
+    "grading_audio_seconds_total", "Seconds of audio analysed",
+    ("voice_range",)
+)
+vad_skipped_seconds_total = metrics.counter(
+    "grading_vad_skipped_seconds_total", "Seconds of silence skipped by voice activity detection",
+    ("voice_range",)
+)
+spectral_transforms_total = metrics.counter(
+    "grading_spectral_transforms_total", "STFTs and other spectral transforms run by the pitch engines",
+    ("kind",)
+)
+spectral_transforms_per_recording = metrics.histogram(
+    "grading_spectral_transforms_per_recording", "Spectral transforms run to grade one recording",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+)
+vad_skipped_fraction = metrics.histogram(
+    "grading_vad_skipped_fraction", "Fraction of each recording skipped as silence",
+    ("voice_range",), buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+storage_insert_seconds = metrics.histogram(
+    "grading_storage_insert_seconds", "Supabase insert latency per batch of results"
+)
+storage_failures_total = metrics.counter(
+    "grading_storage_failures_total", "Failed Supabase insert attempts"
+)
+admission_wait_seconds = metrics.histogram(
+    "grading_admission_wait_seconds", "Time spent waiting for an analysis slot"
+)
+admission_rejected_total = metrics.counter(
+    "grading_admission_rejected_total", "Requests refused by admission control, by HTTP status",
+    ("status",)
+)
+admission_depth = metrics.gauge(
+    "grading_admission_depth", "Analyses running (in_flight) and waiting for a slot (queued)",
+    ("state",)
+)
+jobs_total = metrics.counter(
+    "grading_jobs_total", "Finished job attempts by outcome (succeeded, failed, retried)",
+    ("outcome",)
+)
+job_wait_seconds = metrics.histogram(
+    "grading_job_wait_seconds", "Time from job submission to its first attempt starting",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+)
+job_queue_depth = metrics.gauge(
+    "grading_job_queue_depth", "Jobs currently queued or running",
+    ("status",)
+)
+
+analysis_pool: Optional[ProcessPoolExecutor] = None
+
+admission = AdmissionController(
+    capacity=ADMISSION_CAPACITY,
+    max_queued=ADMISSION_MAX_QUEUED,
+    max_wait=ADMISSION_MAX_WAIT,
+    max_queued_per_user=ADMISSION_MAX_QUEUED_PER_USER
+)
+
+async def run_pipeline_batch(submissions: List[tuple]) -> List[Any]:
+    return await run_in_analysis_pool(run_grading_pipeline_batch, submissions)
+
+micro_batcher = MicroBatcher(run_pipeline_batch, MICRO_BATCH_WINDOW_MS / 1000, MICRO_BATCH_MAX_SIZE)
+
+# Created on startup; see POST /jobs
+job_queue: Optional[JobQueue] = None
+job_workers: Optional[JobWorkers] = None
+progress_store: Optional[ProgressStore] = None
+
+# Startup/readiness state reported by /health
+warmup_state: Dict[str, Any] = {
+    "ready": not WARMUP_ENABLED,
+    "enabled": WARMUP_ENABLED,
+    "failed": False,
+    "seconds": None,
+    "workers": [],
+    "error": None
+}
+
+def create_analysis_pool() -> Optional[ProcessPoolExecutor]:
+    """Create the worker-process pool that runs the grading pipeline."""
+    if GRADING_WORKERS <= 0:
+        return None
+    # spawn keeps workers independent of the event loop and Supabase client threads.
+    # Workers warm up before taking jobs, including replacements after a crash.
+    return ProcessPoolExecutor(
+        max_workers=GRADING_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_up_worker if WARMUP_ENABLED else None
+    )
+
+async def warm_up_analysis() -> None:
+    """
+    Wait until every analysis worker (or the API process in thread mode) is warm, then mark ready.
+    
+    A timeout or error still marks the service ready, since cold workers only grade
+    more slowly, but sets ``failed`` and keeps the statuses of the workers that answered.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    workers: Dict[int, Dict[str, Any]] = {}
+    try:
+        if analysis_pool is None:
+            status = await loop.run_in_executor(None, warm_up_pipeline)
+            workers[os.getpid()] = status
+        else:
+            # A status call only runs after its worker's initializer has finished; keep
+            # asking until every worker process has answered at least once
+            deadline = started + WARMUP_TIMEOUT
+            while len(workers) < GRADING_WORKERS and time.perf_counter() < deadline:
+                calls = [loop.run_in_executor(analysis_pool, worker_warmup_status) for _ in range(GRADING_WORKERS)]
+                done, pending = await asyncio.wait(calls, timeout=max(deadline - time.perf_counter(), 0.0))
+                for call in pending:
+                    call.cancel()
+                for call in done:
+                    status = call.result()
+                    workers[status["pid"]] = status
+            if len(workers) < GRADING_WORKERS:
+                warmup_state["error"] = f"Only {len(workers)} of {GRADING_WORKERS} workers warmed up within {WARMUP_TIMEOUT:g}s"
+    except Exception as e:
+        warmup_state["error"] = f"Warm-up failed: {e}"
+    
+    warmup_state["workers"] = list(workers.values())
+    warmup_state["failed"] = warmup_state["error"] is not None
+    warmup_state["seconds"] = time.perf_counter() - started
+    warmup_state["ready"] = True
+    failures = [failure for worker in warmup_state["workers"] for failure in worker.get("failures", [])]
+    print(f"Warm-up finished in {warmup_state['seconds']:.2f}s ({len(warmup_state['workers'])} worker(s), {len(failures)} failure(s))")
+    if warmup_state["error"]:
+        print(f"Warning: {warmup_state['error']}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the analysis pool and result writer on startup and shut them down on exit."""
+    global analysis_pool, job_queue, job_workers, progress_store
+    started = time.perf_counter()
+    analysis_pool = create_analysis_pool()
+    print(f"Analysis pool started with {GRADING_WORKERS} worker process(es)")
+    # Open the progress store first: replaying the journal records progress
+    progress_store = ProgressStore(PROGRESS_DB_PATH, recent_window=PROGRESS_RECENT_WINDOW)
+    await result_writer.start()
+    
+    job_queue = JobQueue(
+        JOB_DB_PATH, max_queued=JOB_MAX_QUEUED, retention_seconds=JOB_RETENTION_SECONDS, lease_seconds=JOB_LEASE_SECONDS
+    )
+    job_workers = JobWorkers(
+        job_queue,
+        grade_job,
+        workers=JOB_WORKERS,
+        retry_base_delay=JOB_RETRY_DELAY,
+        on_finished=lambda job, outcome: jobs_total.inc(outcome=outcome)
+    )
+    await job_workers.start()
+    print(f"Job queue started with {JOB_WORKERS} worker(s) at {JOB_DB_PATH}")
+    
+    # Warm up in the background so /health can report progress while it runs
+    warmup_task = asyncio.create_task(warm_up_analysis()) if WARMUP_ENABLED else None
+    print(f"Startup completed in {time.perf_counter() - started:.2f}s")
+    try:
+        yield
+    finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+        # Jobs still running go back to the queue for the next startup
+        await job_workers.stop()
+        job_queue.close()
+        # Drain queued results (and their progress updates) before exiting
+        await result_writer.stop()
+        progress_store.close()
+        if analysis_pool is not None:
+            analysis_pool.shutdown(wait=True, cancel_futures=True)
+            analysis_pool = None
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Singing Assessment API",
     description="AI-powered singing assessment with pitch detection and Supabase integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Refuse oversized uploads before the whole body is read (added first so
+# CORS headers still wrap the 413)
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/grade_singing": MAX_UPLOAD_BYTES and MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES,
+        "/grade_singing/batch": MAX_BATCH_UPLOAD_BYTES,
+        "/jobs": MAX_UPLOAD_BYTES and MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES
+    }
 )
 
 # Add CORS middleware
@@ -35,282 +375,355 @@ SUPABASE_ANON_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmFzZS
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
-# Reference melodies for different voice ranges
-VOICE_RANGES = {
-    "soprano": {
-        "melody": {
-            "C4": 261.63,
-            "D4": 293.66,
-            "E4": 329.63,
-            "F4": 349.23,
-            "G4": 392.00
-        },
-        "sequence": [261.63, 293.66, 329.63, 349.23, 392.00],
-        "notes": ["C4", "D4", "E4", "F4", "G4"],
-        "min_freq": 200,
-        "max_freq": 600
-    },
-    "alto": {
-        "melody": {
-            "G3": 196.00,
-            "A3": 220.00,
-            "B3": 246.94,
-            "C4": 261.63,
-            "D4": 293.66
-        },
-        "sequence": [196.00, 220.00, 246.94, 261.63, 293.66],
-        "notes": ["G3", "A3", "B3", "C4", "D4"],
-        "min_freq": 150,
-        "max_freq": 450
-    }
-}
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    priority: int
+    user_id: str
+    filename: str
+    attempts: int
+    max_attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    wait_seconds: Optional[float] = None
+    queue_position: Optional[int] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    result: Optional[AssessmentResponse] = None
+
+def build_job_status(job: Dict[str, Any]) -> JobStatusResponse:
+    """Job status for the API, with timestamps as datetimes and the time it waited to start."""
+    timestamp = lambda value: datetime.fromtimestamp(value) if value is not None else None
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        priority=job["priority"],
+        user_id=job["user_id"],
+        filename=job["filename"],
+        attempts=job["attempts"],
+        max_attempts=job["max_attempts"],
+        created_at=timestamp(job["created_at"]),
+        started_at=timestamp(job["started_at"]),
+        finished_at=timestamp(job["finished_at"]),
+        wait_seconds=job["started_at"] - job["created_at"] if job["started_at"] is not None else None,
+        queue_position=job.get("queue_position"),
+        status_code=job["status_code"],
+        error=job["error"],
+        result=job["result"]
+    )
 
-# Default reference (soprano)
-REFERENCE_MELODY = VOICE_RANGES["soprano"]["melody"]
-REFERENCE_SEQUENCE = VOICE_RANGES["soprano"]["sequence"]
-REFERENCE_NOTES = VOICE_RANGES["soprano"]["notes"]
-
-class PitchAnalysisResult(BaseModel):
-    note_index: int
-    expected_note: str
-    expected_frequency: float
-    detected_frequency: float
-    detected_note: str
-    is_accurate: bool
-    frequency_difference: float
-    confidence: float
-
-class AssessmentResponse(BaseModel):
-    score: int
-    overall_percentage: float
-    note_by_note_results: List[PitchAnalysisResult]
-    detected_pitches_hz: List[float]
-    reference_melody: Dict[str, List]
+class NoteProgress(BaseModel):
+    note: str
+    attempts: int
+    accuracy: float
+    recent_accuracy: Optional[float] = None
+    mean_abs_cents: Optional[float] = None
+    last_at: datetime
+
+class ScorePoint(BaseModel):
+    at: datetime
+    score: float
+
+class VoiceRangeProgress(BaseModel):
+    voice_range: str
+    attempts: int
+    mean_score: float
+    recent_mean_score: Optional[float] = None
+    best_score: float
+    best_at: datetime
+    first_at: datetime
+    last_score: float
+    last_at: datetime
+    recent_scores: List[ScorePoint]
+    notes: List[NoteProgress]
+
+class UserProgressResponse(BaseModel):
     user_id: str
-    timestamp: datetime
+    attempts: int
+    mean_score: float
+    best_score: float
+    first_at: datetime
+    last_score: float
+    last_at: datetime
+    voice_ranges: List[VoiceRangeProgress]
+
+def build_user_progress(progress: Dict[str, Any]) -> UserProgressResponse:
+    """User progress for the API, with timestamps as datetimes."""
+    timestamp = datetime.fromtimestamp
+    return UserProgressResponse.model_validate({
+        **progress,
+        "first_at": timestamp(progress["first_at"]),
+        "last_at": timestamp(progress["last_at"]),
+        "voice_ranges": [
+            {
+                **voice_range,
+                "best_at": timestamp(voice_range["best_at"]),
+                "first_at": timestamp(voice_range["first_at"]),
+                "last_at": timestamp(voice_range["last_at"]),
+                "recent_scores": [{"at": timestamp(point["at"]), "score": point["score"]} for point in voice_range["recent_scores"]],
+                "notes": [{**note, "last_at": timestamp(note["last_at"])} for note in voice_range["notes"]]
+            }
+            for voice_range in progress["voice_ranges"]
+        ]
+    })
 
-def hz_to_note_name(frequency: float, voice_range: str = "soprano", tolerance: float = 50.0) -> str:
-    """Convert frequency to closest note name within tolerance for the given voice range."""
-    if frequency <= 0:
-        return "Unknown"
+def build_result_row(user_id: str, score: int, results: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a pitch_results row for insertion; the packed pitch contour goes in its own column."""
+    # Convert UUID string to proper format
+    user_uuid = str(uuid.UUID(user_id))
     
-    range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
-    reference_melody = range_data["melody"]
+    row = {
+        "user_id": user_uuid,
+        "score": score,
+        "results": {key: value for key, value in results.items() if key != "pitch_contour"}
+    }
+    # Bulk inserts need the same keys on every row, so real-time results store null
+    if STORE_PITCH_CONTOURS:
+        row["pitch_contour"] = results.get("pitch_contour")
+    return row
+
+def insert_pitch_results(rows: List[Dict[str, Any]]) -> None:
+    """Insert pitch_results rows with a single Supabase request, raising on failure."""
+    with storage_insert_seconds.time():
+        try:
+            response = supabase.table("pitch_results").insert(rows).execute()
+            if not response.data:
+                raise RuntimeError(f"Failed to store results: {response}")
+        except Exception:
+            storage_failures_total.inc()
+            raise
+
+def record_progress(rows: List[Dict[str, Any]]) -> None:
+    """Fold rows the store accepted into the per-user progress aggregates; called by the result writer."""
+    if progress_store is None:
+        return
+    progress_store.record_many([(row["user_id"], row["results"]) for row in rows])
+
+async def store_results_in_supabase(user_id: str, score: int, results: Dict[str, Any]) -> bool:
+    """Queue assessment results for storage in Supabase; the user's progress is updated once they are written."""
+    try:
+        # Prepare data for insertion
+        data = build_result_row(user_id, score, results)
+        
+        # Hand off to the write-behind queue; the insert happens in the background
+        queued = result_writer.enqueue([data])
+            
+    except Exception as e:
+        print(f"Error storing results in Supabase: {e}")
+        return False
     
-    closest_note = "Unknown"
-    min_diff = float('inf')
+    return queued
+
+async def store_results_batch_in_supabase(rows: List[Dict[str, Any]]) -> bool:
+    """Queue many assessment results for storage; they are flushed together as bulk inserts."""
+    if not rows:
+        return True
+    return result_writer.enqueue(rows)
+
+async def run_in_analysis_pool(func, *args):
+    """Run a CPU-bound function off the event loop, in the process pool when enabled."""
+    global analysis_pool
+    loop = asyncio.get_running_loop()
     
-    for note, freq in reference_melody.items():
-        diff = abs(frequency - freq)
-        if diff < min_diff and diff <= tolerance:
-            min_diff = diff
-            closest_note = note
+    pool = analysis_pool
+    if pool is None:
+        return await loop.run_in_executor(None, func, *args)
     
-    return closest_note
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); replace the pool so later requests
+        # recover. Every call that was in the broken pool lands here, so only the
+        # first replaces it; the rest must not shut down its healthy successor.
+        if analysis_pool is pool:
+            print("Analysis worker crashed, restarting process pool")
+            pool.shutdown(wait=False, cancel_futures=True)
+            analysis_pool = create_analysis_pool()
+        raise
 
-def extract_pitch_contour(audio_data: np.ndarray, sr: int, voice_range: str = "soprano") -> List[float]:
+def metric_labels(voice_range: str, file_suffix: str) -> Dict[str, str]:
+    """Voice range and format labels, bounded to known values to keep metric cardinality fixed."""
+    file_suffix = file_suffix.lower()
+    return {
+        "voice_range": voice_range if voice_range in VOICE_RANGES else "invalid",
+        "format": file_suffix.lstrip(".") if file_suffix in SUPPORTED_EXTENSIONS else "other"
+    }
+
+def record_analysis_metrics(debug_info: Dict[str, Any], labels: Dict[str, str], content_length: int, elapsed: float) -> None:
+    """Record one analysis; worker stage timings are skipped for cache hits."""
+    stage_seconds.observe(elapsed, stage="analysis", **labels)
+    if debug_info.get("cache") == "hit":
+        return
+    for stage, seconds in debug_info.get("timings", {}).items():
+        stage_seconds.observe(seconds, stage=stage, **labels)
+    if "pitch_engine" in debug_info:
+        pitch_engine_total.inc(engine=debug_info["pitch_engine"], voice_range=labels["voice_range"])
+    transforms = debug_info.get("spectral_transforms")
+    if transforms is not None:
+        for kind, count in transforms.items():
+            spectral_transforms_total.inc(count, kind=kind)
+        spectral_transforms_per_recording.observe(sum(transforms.values()))
+    decoded_bytes_total.inc(content_length, format=labels["format"])
+    audio_seconds_total.inc(debug_info.get("duration_seconds", 0.0), voice_range=labels["voice_range"])
+    vad = debug_info.get("vad")
+    if vad:
+        skipped = debug_info.get("duration_seconds", 0.0) - vad["trimmed_duration_seconds"]
+        vad_skipped_seconds_total.inc(max(skipped, 0.0), voice_range=labels["voice_range"])
+        vad_skipped_fraction.observe(vad["skipped_fraction"], voice_range=labels["voice_range"])
+
+async def run_analysis(audio_content: bytes, file_suffix: str, exercise: CompiledExercise, user_id: str, background: bool = False) -> Dict[str, Any]:
     """
-    Extract pitch contour using librosa's fundamental frequency estimation.
-    Uses a combination of piptrack and yin algorithms for better accuracy.
+    Grade one recording and record its stage metrics.
+    
+    Analysis waits for an admission slot shared fairly by ``user_id``; see
+    ``AdmissionController`` for ``background``.
     """
+    labels = metric_labels(exercise.voice_range, file_suffix)
+    started = time.perf_counter()
     try:
-        # Get frequency range for voice type
-        range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
-        fmin = range_data["min_freq"]
-        fmax = range_data["max_freq"]
-        
-        # Method 1: Use piptrack for pitch detection
-        pitches, magnitudes = librosa.piptrack(
-            y=audio_data, 
-            sr=sr, 
-            threshold=0.1,
-            fmin=fmin,  # Voice-specific minimum frequency
-            fmax=fmax   # Voice-specific maximum frequency
-        )
-        
-        # Extract the strongest pitch at each time frame
-        pitch_contour = []
-        for t in range(pitches.shape[1]):
-            # Find the pitch with highest magnitude
-            index = magnitudes[:, t].argmax()
-            pitch = pitches[index, t]
-            if pitch > 0:
-                pitch_contour.append(pitch)
-        
-        # If piptrack doesn't return enough data, try yin algorithm
-        if len(pitch_contour) < 10:
-            try:
-                # Use yin algorithm as backup
-                f0 = librosa.yin(
-                    audio_data, 
-                    fmin=fmin, 
-                    fmax=fmax, 
-                    sr=sr,
-                    frame_length=2048
-                )
-                pitch_contour = [freq for freq in f0 if freq > 0]
-            except Exception as e:
-                print(f"Yin algorithm failed: {e}")
-                # Fallback to basic autocorrelation
-                pitch_contour = extract_pitch_basic_autocorr(audio_data, sr, voice_range)
-        
-        return pitch_contour
-        
+        # Header-only duration check, so over-long recordings never reach a worker
+        with stage_seconds.time(stage="probe", **labels):
+            check_recording_duration(audio_content, file_suffix, MAX_UPLOAD_SECONDS)
+    except UploadTooLargeError:
+        failures_total.inc(stage="probe", **labels)
+        raise
+    try:
+        analysis = await run_cached_analysis(audio_content, file_suffix, exercise, user_id, background)
+    except AdmissionRejected as e:
+        failures_total.inc(stage="admission", **labels)
+        admission_rejected_total.inc(status=str(e.status_code))
+        raise
     except Exception as e:
-        print(f"Pitch extraction error: {e}")
-        # Fallback to basic method
-        return extract_pitch_basic_autocorr(audio_data, sr, voice_range)
+        failures_total.inc(stage=getattr(e, "grading_stage", "analysis"), **labels)
+        raise
+    record_analysis_metrics(analysis.get("debug_info", {}), labels, len(audio_content), time.perf_counter() - started)
+    return analysis
 
-def extract_pitch_basic_autocorr(audio_data: np.ndarray, sr: int, voice_range: str = "soprano") -> List[float]:
-    """Fallback pitch detection using basic autocorrelation."""
-    range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
-    fmin = range_data["min_freq"]
-    fmax = range_data["max_freq"]
-    
-    frame_length = int(0.1 * sr)  # 100ms frames
-    hop_length = frame_length // 2
+async def run_admitted_pipeline(pipeline_args: tuple, user_id: str, background: bool = False) -> Dict[str, Any]:
+    """Run the grading pipeline once admission control grants a slot."""
+    async with admission.slot(user_id, background) as waited:
+        admission_wait_seconds.observe(waited)
+        if micro_batcher.enabled:
+            analysis = await micro_batcher.submit(pipeline_args)
+        else:
+            analysis = await run_in_analysis_pool(run_grading_pipeline, *pipeline_args)
+    analysis.setdefault("debug_info", {})["admission_wait_seconds"] = waited
+    return analysis
+
+async def run_cached_analysis(audio_content: bytes, file_suffix: str, exercise: CompiledExercise, user_id: str, background: bool = False) -> Dict[str, Any]:
+    """Grade one recording, serving repeated submissions from the result cache without taking a slot."""
+    pipeline_args = (audio_content, file_suffix, exercise.voice_range, exercise.exercise_id)
+    if not result_cache.enabled:
+        return await run_admitted_pipeline(pipeline_args, user_id, background)
     
-    pitches = []
+    # Hashing and disk-tier lookups stay off the event loop
+    loop = asyncio.get_running_loop()
+    # The definition hash keeps results from going stale when an exercise file is edited under the same ID
+    cache_params = {**ANALYSIS_PARAMS, "exercise_id": exercise.exercise_id, "exercise": exercise.definition_hash()}
+    cache_key = await loop.run_in_executor(None, result_cache_key, audio_content, exercise.voice_range, cache_params)
+    cached = await loop.run_in_executor(None, result_cache.get, cache_key)
+    if cached is not None:
+        cached.setdefault("debug_info", {})["cache"] = "hit"
+        return cached
     
-    for i in range(0, len(audio_data) - frame_length, hop_length):
-        frame = audio_data[i:i + frame_length]
-        
-        # Simple autocorrelation-based pitch detection
-        autocorr = np.correlate(frame, frame, mode='full')
-        autocorr = autocorr[len(autocorr)//2:]
-        
-        # Look for fundamental frequency in voice range
-        min_period = int(sr / fmax)  # Max frequency
-        max_period = int(sr / fmin)  # Min frequency
-        
-        if max_period < len(autocorr):
-            search_range = autocorr[min_period:max_period]
-            if len(search_range) > 0:
-                peak_idx = np.argmax(search_range) + min_period
-                frequency = sr / peak_idx if peak_idx > 0 else 0
-                
-                # Only keep frequencies in voice range
-                if fmin <= frequency <= fmax:
-                    pitches.append(frequency)
-    
-    return pitches
-
-def segment_pitches_to_notes(pitches: List[float], voice_range: str = "soprano", num_expected_notes: int = 5) -> List[float]:
-    """Segment continuous pitch contour into discrete notes."""
-    if not pitches:
-        return [0.0] * num_expected_notes
-    
-    # Get frequency range for voice type
-    range_data = VOICE_RANGES.get(voice_range, VOICE_RANGES["soprano"])
-    fmin = range_data["min_freq"]
-    fmax = range_data["max_freq"]
-    
-    # Remove outliers (frequencies outside voice range)
-    filtered_pitches = [p for p in pitches if fmin <= p <= fmax]
-    
-    if not filtered_pitches:
-        return [0.0] * num_expected_notes
-    
-    # Simple segmentation: divide into equal time segments
-    segment_size = len(filtered_pitches) // num_expected_notes
-    if segment_size == 0:
-        # If we have fewer pitches than expected notes, pad with zeros
-        result = filtered_pitches[:num_expected_notes]
-        while len(result) < num_expected_notes:
-            result.append(0.0)
-        return result
-    
-    segmented_notes = []
-    for i in range(num_expected_notes):
-        start_idx = i * segment_size
-        end_idx = start_idx + segment_size if i < num_expected_notes - 1 else len(filtered_pitches)
-        
-        segment = filtered_pitches[start_idx:end_idx]
-        if segment:
-            # Use median pitch of segment as the note (more robust than mean)
-            median_pitch = np.median(segment)
-            segmented_notes.append(median_pitch)
-        else:
-            segmented_notes.append(0.0)
+    analysis = await run_admitted_pipeline(pipeline_args, user_id, background)
+    analysis["debug_info"]["cache"] = "miss"
+    await loop.run_in_executor(None, result_cache.put, cache_key, analysis)
+    return analysis
+
+async def grade_job(job: Dict[str, Any], content: bytes) -> Dict[str, Any]:
+    """Grade one queued job; problems with the recording itself fail the job without retrying."""
+    if job["attempts"] == 1:
+        job_wait_seconds.observe(job["started_at"] - job["created_at"])
+    try:
+        exercise = validate_submission(job["filename"], job["user_id"], job["voice_range"], job["exercise_id"])
+        analysis = await run_analysis(content, os.path.splitext(job["filename"])[1], exercise, job["user_id"], background=True)
+    except HTTPException as e:
+        raise JobError(e.status_code, e.detail)
+    except UploadTooLargeError as e:
+        raise JobError(413, str(e))
+    except NoPitchDetectedError as e:
+        raise JobError(422, str(e))
+    except Exception as e:
+        # The pipeline is deterministic, so a stage that failed would fail again;
+        # anything else (a crashed worker, running out of memory) is retried
+        if getattr(e, "grading_stage", None) and not isinstance(e, MemoryError):
+            raise JobError(500, f"Error processing audio: {e}")
+        raise
     
-    return segmented_notes
+    debug_info = analysis.pop("debug_info", {})
+    storage_successful = await store_results_in_supabase(job["user_id"], analysis["score"], analysis)
+    if not storage_successful:
+        print("Warning: Job results could not be queued and were journaled for later storage")
+    return assessment_result(analysis, job["user_id"], debug_info)
 
-def analyze_pitch_accuracy(detected: List[float], reference: List[float], reference_notes: List[str], voice_range: str = "soprano", tolerance: float = 50.0) -> Dict[str, Any]:
-    """Analyze pitch accuracy with detailed results."""
-    note_results = []
-    detected_notes = []
+def validate_submission(filename: str, user_id: str, voice_range: str, exercise_id: Optional[str] = None) -> CompiledExercise:
+    """
+    Validate one recording's filename, user_id, voice range and exercise, raising HTTP 400 if invalid.
     
-    # Ensure detected list matches reference length
-    detected_padded = detected[:len(reference)]
-    while len(detected_padded) < len(reference):
-        detected_padded.append(0.0)
+    Returns the exercise to grade against: ``exercise_id`` when given, otherwise
+    the voice range's built-in scale.
+    """
+    # Validate file type
+    if not filename or not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(
+            status_code=400, 
+            detail="Only .wav, .mp3, .m4a, and .webm files are supported"
+        )
     
-    for i, (det, ref) in enumerate(zip(detected_padded, reference)):
-        is_accurate = abs(det - ref) <= tolerance if det > 0 else False
-        
-        # Calculate confidence based on how close the pitch is
-        confidence = 0.0
-        if det > 0:
-            diff = abs(det - ref)
-            confidence = max(0.0, min(1.0, 1.0 - (diff / tolerance)))
-        
-        result = PitchAnalysisResult(
-            note_index=i,
-            expected_note=reference_notes[i],
-            expected_frequency=ref,
-            detected_frequency=det,
-            detected_note=hz_to_note_name(det, voice_range),
-            is_accurate=is_accurate,
-            frequency_difference=det - ref if det > 0 else 0.0,
-            confidence=confidence
+    # Validate user_id format
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid user_id format. Must be a valid UUID."
+        )
+    
+    # Validate voice range
+    if voice_range not in VOICE_RANGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid voice_range. Must be one of: {list(VOICE_RANGES.keys())}"
         )
-        
-        note_results.append(result)
-        detected_notes.append(det)
     
-    # Calculate overall score
-    accurate_count = sum(1 for result in note_results if result.is_accurate)
-    overall_percentage = (accurate_count / len(reference)) * 100 if reference else 0
-    score = int(overall_percentage)
+    # Validate exercise
+    if exercise_id and exercise_id not in EXERCISES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid exercise_id. Must be one of: {list(EXERCISES.keys())}"
+        )
     
-    return {
-        "score": score,
-        "overall_percentage": overall_percentage,
-        "note_by_note_results": note_results,
-        "detected_pitches_hz": detected_notes,
-        "reference_melody": {
-            "notes": reference_notes,
-            "frequencies_hz": reference,
-            "voice_range": voice_range
-        }
-    }
+    return get_exercise(exercise_id, voice_range)
 
-async def store_results_in_supabase(user_id: str, score: int, results: Dict[str, Any]) -> bool:
-    """Store assessment results in Supabase."""
-    try:
-        # Convert UUID string to proper format
-        user_uuid = str(uuid.UUID(user_id))
-        
-        # Prepare data for insertion
-        data = {
-            "user_id": user_uuid,
-            "score": score,
-            "results": results
-        }
-        
-        # Insert into Supabase
-        response = supabase.table("pitch_results").insert(data).execute()
-        
-        if response.data:
-            print(f"Successfully stored results for user {user_id}")
-            return True
-        else:
-            print(f"Failed to store results: {response}")
-            return False
-            
-    except Exception as e:
-        print(f"Error storing results in Supabase: {e}")
-        return False
+def build_assessment_response(analysis: Dict[str, Any], user_id: str, debug_info: Dict[str, Any]) -> AssessmentResponse:
+    """Build the API response for one analysed recording."""
+    return AssessmentResponse(
+        score=analysis["score"],
+        overall_percentage=analysis["overall_percentage"],
+        note_by_note_results=analysis["note_by_note_results"],
+        detected_pitches_hz=analysis["detected_pitches_hz"],
+        reference_melody=analysis["reference_melody"],
+        user_id=user_id,
+        timestamp=datetime.now(),
+        debug_info=debug_info
+    )
+
+def assessment_result(analysis: Dict[str, Any], user_id: str, debug_info: Dict[str, Any]) -> Dict[str, Any]:
+    """The JSON form of the API response, built without the models in lean mode."""
+    if LEAN_RESPONSES:
+        return assessment_payload(analysis, user_id, debug_info)
+    return build_assessment_response(analysis, user_id, debug_info).model_dump(mode="json")
+
+def ndjson_line(line: Dict[str, Any]):
+    return dumps(line) + b"\n" if LEAN_RESPONSES else json.dumps(line) + "\n"
+
+async def send_message(websocket: WebSocket, message: Dict[str, Any]) -> None:
+    if LEAN_RESPONSES:
+        await websocket.send_text(dumps(message).decode("utf-8"))
+    else:
+        await websocket.send_json(message)
 
 @app.get("/")
 async def root():
@@ -320,130 +733,521 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "grade_singing": "POST /grade_singing - Upload audio and get singing assessment",
-            "health": "GET /health - API health check"
+            "grade_singing_batch": "POST /grade_singing/batch - Grade many recordings, streaming NDJSON results",
+            "grade_singing_ws": "WS /ws/grade_singing - Stream PCM and get live pitch and accuracy",
+            "exercises": "GET /exercises - List reference exercises",
+            "jobs": "POST /jobs - Queue a recording for grading and poll GET /jobs/{job_id} or stream GET /jobs/{job_id}/events",
+            "progress": "GET /users/{user_id}/progress - Score trend and per-note accuracy for a user",
+            "health": "GET /health - API health check",
+            "metrics": "GET /metrics - Prometheus metrics"
         }
     }
 
+@app.get("/exercises")
+async def list_exercises():
+    """List the reference exercises that can be selected with exercise_id."""
+    return {"exercises": [exercise.describe() for exercise in EXERCISES.values()]}
+
+async def job_queue_stats() -> Dict[str, Any]:
+    """Queue depth, wait times and worker counters of the job queue."""
+    if job_queue is None:
+        return {}
+    stats = await asyncio.get_running_loop().run_in_executor(None, job_queue.stats)
+    return {**stats, "workers": job_workers.stats()}
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint. ``ready`` is false until the analysis pipeline has warmed up; ``degraded`` if warm-up failed."""
     return {
-        "status": "healthy",
+        "status": ("degraded" if warmup_state["failed"] else "healthy") if warmup_state["ready"] else "warming_up",
+        "ready": warmup_state["ready"],
+        "warmup": warmup_state,
         "timestamp": datetime.now().isoformat(),
         "supabase_url": SUPABASE_URL,
-        "reference_melody": VOICE_RANGES
+        "reference_melody": VOICE_RANGES,
+        "result_cache": result_cache.stats(),
+        "result_writer": result_writer.stats(),
+        "admission": admission.stats(),
+        "micro_batching": micro_batcher.stats(),
+        "jobs": await job_queue_stats()
     }
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the analysis pipeline has warmed up."""
+    if not warmup_state["ready"]:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"ready": True}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency histograms and grading counters in Prometheus text format."""
+    admission_depth.set(admission.in_flight, state="in_flight")
+    admission_depth.set(admission.queued, state="queued")
+    jobs = await job_queue_stats()
+    for status in ("queued", "running"):
+        job_queue_depth.set(jobs.get(status, 0), status=status)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/grade_singing", response_model=AssessmentResponse)
 async def grade_singing(
     file: UploadFile = File(..., description="Audio file (.wav, .mp3, or .m4a)"),
     user_id: str = Form(..., description="User ID for result storage"),
-    voice_range: str = Form("soprano", description="Voice range: soprano or alto")
+    voice_range: str = Form("soprano", description="Voice range: soprano, alto, tenor or bass"),
+    exercise_id: Optional[str] = Form(None, description="Reference exercise ID (defaults to the voice range's scale)")
 ):
     """
     Grade singing performance against reference melody for specified voice range.
     
     - **file**: Audio file in .wav, .mp3, or .m4a format
     - **user_id**: UUID of the user submitting the recording
-    - **voice_range**: Voice range - "soprano" (C4-G4) or "alto" (G3-D4)
+    - **voice_range**: Voice range - "soprano" (C4-G4), "alto" (G3-D4), "tenor" (C3-G3) or "bass" (G2-D3)
+    - **exercise_id**: Optional exercise from ``GET /exercises``; its own voice range takes precedence
     
     Returns detailed pitch analysis and stores results in Supabase.
     """
+    file_suffix = os.path.splitext(file.filename or "")[1]
+    labels = metric_labels(voice_range, file_suffix)
+    status_code = 500
     
-    # Validate file type
-    if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.webm')):
-        raise HTTPException(
-            status_code=400, 
-            detail="Only .wav, .mp3, .m4a, and .webm files are supported"
-        )
-    
-    # Validate user_id format
     try:
-        uuid.UUID(user_id)
-    except ValueError:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid user_id format. Must be a valid UUID."
-        )
-    
-    # Validate voice range
-    if voice_range not in VOICE_RANGES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid voice_range. Must be one of: {list(VOICE_RANGES.keys())}"
-        )
-    
-    # Get reference data for the selected voice range
-    range_data = VOICE_RANGES[voice_range]
-    reference_sequence = range_data["sequence"]
-    reference_notes = range_data["notes"]
-    
-    try:
-        # Read audio file
-        audio_content = await file.read()
+        exercise = validate_submission(file.filename, user_id, voice_range, exercise_id)
+        labels = metric_labels(exercise.voice_range, file_suffix)
         
-        # Save to temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            temp_file.write(audio_content)
-            temp_file_path = temp_file.name
+        # Read audio file
+        try:
+            with stage_seconds.time(stage="upload_read", **labels):
+                audio_content = await read_upload(file, MAX_UPLOAD_BYTES)
+        except Exception as e:
+            failures_total.inc(stage="upload_read", **labels)
+            if isinstance(e, UploadTooLargeError):
+                raise HTTPException(status_code=413, detail=str(e))
+            raise
         
+        # Decode, extract, segment and score in a worker process
         try:
-            # Load audio using librosa
-            audio_data, sample_rate = librosa.load(temp_file_path, sr=None, mono=True)
-            
-            # Extract pitch contour
-            pitch_contour = extract_pitch_contour(audio_data, sample_rate, voice_range)
-            
-            if not pitch_contour:
-                raise HTTPException(
-                    status_code=422,
-                    detail="Could not detect any pitches in the audio. Please ensure the recording contains clear vocal content."
-                )
-            
-            # Segment pitches into discrete notes
-            detected_notes = segment_pitches_to_notes(pitch_contour, voice_range, num_expected_notes=5)
-            
-            # Analyze pitch accuracy
-            analysis = analyze_pitch_accuracy(detected_notes, reference_sequence, reference_notes, voice_range, tolerance=50.0)
-            
-            # Store results in Supabase
+            analysis = await run_analysis(audio_content, file_suffix, exercise, user_id)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+        except NoPitchDetectedError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        
+        # Decoder/timing details go in the response only, not the stored results
+        debug_info = analysis.pop("debug_info", {})
+        
+        # Store results in Supabase
+        with stage_seconds.time(stage="store_enqueue", **labels):
             storage_successful = await store_results_in_supabase(
                 user_id, 
                 analysis["score"], 
                 analysis
             )
-            
-            if not storage_successful:
-                print("Warning: Failed to store results in Supabase, but continuing with response")
-            
-            # Prepare response
-            response = AssessmentResponse(
-                score=analysis["score"],
-                overall_percentage=analysis["overall_percentage"],
-                note_by_note_results=analysis["note_by_note_results"],
-                detected_pitches_hz=analysis["detected_pitches_hz"],
-                reference_melody=analysis["reference_melody"],
-                user_id=user_id,
-                timestamp=datetime.now()
-            )
-            
-            return response
-            
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+        
+        if not storage_successful:
+            print("Warning: Results could not be queued and were journaled for later storage")
+        
+        # Prepare response; lean mode skips response_model validation by returning a Response
+        status_code = 200
+        if LEAN_RESPONSES:
+            return LeanJSONResponse(assessment_payload(analysis, user_id, debug_info))
+        return build_assessment_response(analysis, user_id, debug_info)
             
     except Exception as e:
         if isinstance(e, HTTPException):
+            status_code = e.status_code
             raise e
         
         raise HTTPException(
             status_code=500, 
             detail=f"Error processing audio: {str(e)}"
         )
+    finally:
+        requests_total.inc(endpoint="grade_singing", status=str(status_code), **labels)
+
+@app.post("/grade_singing/batch")
+async def grade_singing_batch(
+    files: List[UploadFile] = File(..., description="Audio files (.wav, .mp3, .m4a, or .webm)"),
+    user_ids: List[str] = Form(..., description="User ID for each file, in the same order"),
+    voice_ranges: List[str] = Form(["soprano"], description="Voice range for each file, or a single range for all files"),
+    exercise_ids: List[str] = Form([], description="Exercise ID for each file, or a single exercise for all files")
+):
+    """
+    Grade many recordings in one request.
+    
+    - **files**: Audio files, repeated form field
+    - **user_ids**: One UUID per file, repeated form field in the same order
+    - **voice_ranges**: One voice range per file, or a single value applied to every file
+    - **exercise_ids**: Optional; one exercise ID per file, or a single value applied to every file
+    
+    All files are analysed in parallel and each result is streamed back as one
+    NDJSON line as soon as it finishes (``{"index", "filename", "status", ...}``).
+    Successful results are queued for storage together and flushed as bulk
+    inserts, after which a final ``{"status": "summary", ...}`` line reports the totals.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files in batch. Maximum is {BATCH_MAX_FILES}."
+        )
+    
+    if len(user_ids) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail="user_ids must contain exactly one entry per file"
+        )
+    
+    if len(voice_ranges) == 1:
+        voice_ranges = voice_ranges * len(files)
+    elif len(voice_ranges) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail="voice_ranges must contain one entry per file, or a single entry for all files"
+        )
+    
+    if len(exercise_ids) <= 1:
+        exercise_ids = (exercise_ids or [None]) * len(files)
+    elif len(exercise_ids) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail="exercise_ids must contain one entry per file, or a single entry for all files"
+        )
+    
+    # Read every upload now: the files are closed once the streaming response starts.
+    # An oversized file fails on its own line instead of failing the whole batch.
+    submissions = []
+    for index, (file, user_id, voice_range, exercise_id) in enumerate(zip(files, user_ids, voice_ranges, exercise_ids)):
+        submission = {
+            "index": index,
+            "filename": file.filename,
+            "user_id": user_id,
+            "voice_range": voice_range,
+            "exercise_id": exercise_id,
+            "content": b""
+        }
+        try:
+            submission["content"] = await read_upload(file, MAX_UPLOAD_BYTES)
+        except UploadTooLargeError as e:
+            submission["upload_error"] = str(e)
+        submissions.append(submission)
+    
+    async def grade_one(submission: Dict[str, Any]) -> Dict[str, Any]:
+        line = await grade_submission(submission)
+        labels = metric_labels(submission["voice_range"], os.path.splitext(submission["filename"] or "")[1])
+        requests_total.inc(endpoint="batch", status=str(line.get("status_code", 200)), **labels)
+        return line
+    
+    async def grade_submission(submission: Dict[str, Any]) -> Dict[str, Any]:
+        line = {"index": submission["index"], "filename": submission["filename"]}
+        try:
+            exercise = validate_submission(
+                submission["filename"], submission["user_id"], submission["voice_range"], submission["exercise_id"]
+            )
+            if "upload_error" in submission:
+                raise UploadTooLargeError(submission["upload_error"])
+            analysis = await run_analysis(
+                submission["content"],
+                os.path.splitext(submission["filename"])[1],
+                exercise,
+                submission["user_id"]
+            )
+        except HTTPException as e:
+            return {**line, "status": "error", "status_code": e.status_code, "detail": e.detail}
+        except UploadTooLargeError as e:
+            return {**line, "status": "error", "status_code": 413, "detail": str(e)}
+        except AdmissionRejected as e:
+            return {**line, "status": "error", "status_code": e.status_code, "detail": e.detail, "retry_after": e.retry_after}
+        except NoPitchDetectedError as e:
+            return {**line, "status": "error", "status_code": 422, "detail": str(e)}
+        except Exception as e:
+            return {**line, "status": "error", "status_code": 500, "detail": f"Error processing audio: {str(e)}"}
+        finally:
+            # Release the upload bytes as soon as this file is done
+            submission["content"] = b""
+        
+        debug_info = analysis.pop("debug_info", {})
+        return {
+            **line,
+            "status": "ok",
+            "result": assessment_result(analysis, submission["user_id"], debug_info),
+            "row": build_result_row(submission["user_id"], analysis["score"], analysis)
+        }
+    
+    async def stream_results():
+        rows = []
+        failed = 0
+        for next_result in asyncio.as_completed([grade_one(submission) for submission in submissions]):
+            line = await next_result
+            if line["status"] == "ok":
+                rows.append(line.pop("row"))
+            else:
+                failed += 1
+            yield ndjson_line(line)
+        
+        # Queue the whole batch at once; the writer flushes it as bulk inserts
+        storage_successful = await store_results_batch_in_supabase(rows)
+        if not storage_successful:
+            print("Warning: Batch results could not be queued and were journaled for later storage")
+        
+        yield ndjson_line({
+            "status": "summary",
+            "total": len(submissions),
+            "succeeded": len(rows),
+            "failed": failed,
+            "queued": storage_successful
+        })
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/jobs", response_model=JobStatusResponse, status_code=202)
+async def submit_job(
+    file: UploadFile = File(..., description="Audio file (.wav, .mp3, .m4a, or .webm)"),
+    user_id: str = Form(..., description="User ID for result storage"),
+    voice_range: str = Form("soprano", description="Voice range: soprano, alto, tenor or bass"),
+    exercise_id: Optional[str] = Form(None, description="Reference exercise ID (defaults to the voice range's scale)"),
+    priority: int = Form(0, ge=0, le=9, description="0-9; higher-priority jobs run first")
+):
+    """
+    Queue a recording for grading and return immediately.
+    
+    Takes the same fields as ``POST /grade_singing`` plus ``priority``. The
+    upload is validated and stored, and the response (HTTP 202) carries the
+    ``job_id`` and the job's position in the queue. Poll ``GET /jobs/{job_id}``
+    or stream ``GET /jobs/{job_id}/events`` for the ``AssessmentResponse``.
+    """
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is not running")
+    file_suffix = os.path.splitext(file.filename or "")[1]
+    exercise = validate_submission(file.filename, user_id, voice_range, exercise_id)
+    try:
+        audio_content = await read_upload(file, MAX_UPLOAD_BYTES)
+        check_recording_duration(audio_content, file_suffix, MAX_UPLOAD_SECONDS)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    loop = asyncio.get_running_loop()
+    try:
+        job = await loop.run_in_executor(
+            None,
+            lambda: job_queue.submit(
+                audio_content, file.filename, user_id, exercise.voice_range, exercise.exercise_id,
+                priority=priority, max_attempts=JOB_MAX_ATTEMPTS
+            )
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    job_workers.notify()
+    return build_job_status(job)
+
+async def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    job = None
+    if job_queue is not None:
+        job = await asyncio.get_running_loop().run_in_executor(None, job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Status of a queued job: ``queued``, ``running``, ``succeeded`` (with ``result``) or ``failed`` (with ``status_code`` and ``error``)."""
+    return build_job_status(await get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-sent events for one job.
+    
+    Sends an event named after the job's status each time it changes (the
+    data is the same JSON as ``GET /jobs/{job_id}``) and closes after
+    ``succeeded`` or ``failed``.
+    """
+    job = await get_job_or_404(job_id)
+    
+    async def events():
+        nonlocal job
+        loop = asyncio.get_running_loop()
+        last_sent = None
+        last_write = time.monotonic()
+        while job is not None:
+            state = (job["status"], job["attempts"], job["queue_position"])
+            if state != last_sent:
+                last_sent = state
+                last_write = time.monotonic()
+                yield f"event: {job['status']}\ndata: {build_job_status(job).model_dump_json()}\n\n"
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            # Woken by local workers; the timeout also catches jobs run by other processes
+            await job_workers.wait_for_change(JOB_EVENT_POLL_INTERVAL)
+            if time.monotonic() - last_write >= JOB_EVENT_HEARTBEAT:
+                last_write = time.monotonic()
+                yield ": keep-alive\n\n"
+            job = await loop.run_in_executor(None, job_queue.get, job_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/users/{user_id}/progress", response_model=UserProgressResponse)
+async def get_user_progress(user_id: str):
+    """
+    A user's score trend and per-note accuracy, overall and per voice range.
+    
+    Served from aggregates updated as each result is stored, so the cost does
+    not grow with the number of recordings. ``recent_*`` fields cover the last
+    ``PROGRESS_RECENT_WINDOW`` attempts.
+    """
+    try:
+        user_id = str(uuid.UUID(user_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user_id format. Must be a valid UUID.")
+    
+    progress = None
+    if progress_store is not None:
+        progress = await asyncio.get_running_loop().run_in_executor(None, progress_store.get, user_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No assessments recorded for this user")
+    return build_user_progress(progress)
+
+@app.websocket("/ws/grade_singing")
+async def grade_singing_realtime(
+    websocket: WebSocket,
+    user_id: str,
+    voice_range: str = "soprano",
+    exercise_id: Optional[str] = None,
+    sample_rate: int = 48000,
+    encoding: str = "f32le"
+):
+    """
+    Real-time grading over a WebSocket.
+    
+    Query parameters: ``user_id``, ``voice_range``, ``exercise_id``, ``sample_rate`` and
+    ``encoding`` (``f32le`` or ``s16le`` mono PCM). The client sends PCM chunks
+    as binary messages and ``{"type": "end"}`` as a text message when done.
+    
+    For every chunk the server replies with ``{"type": "pitch", "frames": [...]}``
+    and, every ``REALTIME_SUMMARY_INTERVAL`` seconds of audio, a ``running``
+    note-by-note score. After ``end`` it sends ``{"type": "result", "result": ...}``
+    with the same ``AssessmentResponse`` as ``/grade_singing``, stores it, and closes.
+    
+    Chunk analysis runs in a thread under an admission slot; a refusal closes the
+    socket with 1013. Messages over ``REALTIME_MAX_FRAME_BYTES`` close it with 1009.
+    """
+    await websocket.accept()
+    
+    async def reject(detail: str, code: int = 1008):
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=code)
+    
+    try:
+        exercise = validate_submission(".wav", user_id, voice_range, exercise_id)
+    except HTTPException as e:
+        await reject(e.detail)
+        return
+    if encoding not in PCM_DTYPES:
+        await reject(f"Invalid encoding. Must be one of: {list(PCM_DTYPES.keys())}")
+        return
+    if not 8000 <= sample_rate <= 192000:
+        await reject("Invalid sample_rate. Must be between 8000 and 192000.")
+        return
+    
+    tracker = StreamingPitchTracker(sample_rate, exercise)
+    itemsize = PCM_DTYPES[encoding].itemsize
+    next_summary_at = REALTIME_SUMMARY_INTERVAL
+    loop = asyncio.get_running_loop()
+    
+    def process_chunk(payload: bytes, summarize: bool) -> Dict[str, Any]:
+        times, pitches = tracker.push(decode_pcm_chunk(payload, encoding))
+        update = {"type": "pitch", "frames": tracker.frame_updates(times, pitches)}
+        if summarize:
+            running = tracker.analyze()
+            update["running"] = {
+                "score": running["score"],
+                "overall_percentage": running["overall_percentage"],
+                "note_by_note_results": running["note_by_note_results"]
+            }
+        return update
+    
+    async def run_admitted(func, *args):
+        # Each chunk's analysis takes an admission slot like an upload does, and
+        # runs in a thread so other sockets and requests keep being served
+        async with admission.slot(user_id) as waited:
+            admission_wait_seconds.observe(waited)
+            return await loop.run_in_executor(None, func, *args)
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                # Abandoned session: nothing is stored
+                return
+            
+            if message.get("bytes") is not None:
+                payload = message["bytes"]
+                if len(payload) > REALTIME_MAX_FRAME_BYTES:
+                    await reject(f"PCM messages must be at most {REALTIME_MAX_FRAME_BYTES} bytes", code=1009)
+                    return
+                
+                # Enforce the session cap before any of the chunk is analysed
+                duration_after = (tracker.samples_received + len(payload) // itemsize) / sample_rate
+                if duration_after > REALTIME_MAX_SECONDS:
+                    await reject(f"Session exceeded the maximum of {REALTIME_MAX_SECONDS:g} seconds")
+                    return
+                
+                summarize = duration_after >= next_summary_at
+                update = await run_admitted(process_chunk, payload, summarize)
+                if summarize:
+                    next_summary_at = tracker.duration_seconds + REALTIME_SUMMARY_INTERVAL
+                
+                await send_message(websocket, update)
+                continue
+            
+            control = json.loads(message.get("text") or "{}")
+            if not isinstance(control, dict):
+                await reject("Control messages must be JSON objects, e.g. {\"type\": \"end\"}")
+                return
+            if control.get("type") == "end":
+                break
+        
+        labels = {"voice_range": exercise.voice_range, "format": "pcm"}
+        if tracker.contour.size == 0:
+            requests_total.inc(endpoint="websocket", status="422", **labels)
+            await reject("Could not detect any pitches in the audio. Please ensure the recording contains clear vocal content.")
+            return
+        
+        analysis = await run_admitted(tracker.analyze)
+        requests_total.inc(endpoint="websocket", status="200", **labels)
+        audio_seconds_total.inc(tracker.duration_seconds, voice_range=exercise.voice_range)
+        storage_successful = await store_results_in_supabase(user_id, analysis["score"], analysis)
+        if not storage_successful:
+            print("Warning: Results could not be queued and were journaled for later storage")
+        
+        result = assessment_result(analysis, user_id, {
+            "decode_path": f"websocket_{encoding}",
+            "sample_rate": sample_rate,
+            "duration_seconds": tracker.duration_seconds
+        })
+        await send_message(websocket, {"type": "result", "result": result})
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        return
+    except json.JSONDecodeError:
+        await reject("Control messages must be JSON, e.g. {\"type\": \"end\"}")
+    except AdmissionRejected as e:
+        admission_rejected_total.inc(status=str(e.status_code))
+        # 1013: try again later
+        await websocket.send_json({"type": "error", "detail": e.detail, "retry_after": e.retry_after})
+        await websocket.close(code=1013)
+    except Exception as e:
+        print(f"Real-time grading session failed: {e}")
+        try:
+            await reject(f"Error processing audio: {str(e)}", code=1011)
+        except Exception:
+            # The socket is already gone
+            pass
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,102 @@
+"""
+Micro-batching for the analysis stage.
+
+Recordings that arrive within a few milliseconds of each other are collected
+and handed to the analysis pool as one batch, so the pitch engines can run
+their framing/FFT kernels once over a stacked array (see
+``analysis.run_grading_pipeline_batch``) instead of once per recording.
+
+A batch is flushed ``window_seconds`` after its first recording arrived, or
+as soon as it holds ``max_size`` recordings. The window is added latency for
+every recording, so it only pays off when recordings are short and arrive in
+bursts; a window of 0 disables batching.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Collect items submitted concurrently and run them through ``run_batch`` together. Event-loop only.
+
+    ``run_batch`` takes a list of items and returns one result per item, in
+    order; a result that is an exception is raised to that item's submitter.
+    If ``run_batch`` itself raises, every submitter in the batch gets the error.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], Awaitable[List[Any]]], window_seconds: float, max_size: int = 8):
+        self.run_batch = run_batch
+        self.window_seconds = window_seconds
+        self.max_size = max(1, max_size)
+
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.max_size > 1
+
+    async def submit(self, item: Any) -> Any:
+        """Run ``item`` in the next batch and return its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self.full_batches += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Submitters that went away while waiting for the window are dropped
+        batch = [(item, future) for item, future in self._pending if not future.done()]
+        self._pending = []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_seconds * 1000,
+            "max_size": self.max_size,
+            "pending": len(self._pending),
+            "running_batches": len(self._tasks),
+            "batches": self.batches,
+            "items": self.items,
+            "full_batches": self.full_batches,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0
+        }
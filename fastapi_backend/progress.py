@@ -0,0 +1,196 @@
+"""
+Per-user progress aggregates.
+
+Every stored assessment also updates running aggregates for its user and
+voice range (attempts, score sum, best, last and a window of recent scores)
+and for each reference note sung (attempts, accurate count, cents error and
+recent accuracy). ``GET /users/{user_id}/progress`` is served from these rows
+alone, so reading a student's trend costs the same however many recordings
+they have made; ``pitch_results`` is never rescanned.
+
+The aggregates live in a local SQLite database (WAL mode) shared by every API
+process on the host, like the job queue. An update reads and rewrites a
+user's rows inside one immediate transaction, so concurrent writers never
+lose an attempt.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from exercises import note_name_to_midi
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_progress (
+    user_id TEXT NOT NULL,
+    voice_range TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    best_score REAL NOT NULL,
+    best_at REAL NOT NULL,
+    first_at REAL NOT NULL,
+    last_score REAL NOT NULL,
+    last_at REAL NOT NULL,
+    recent TEXT NOT NULL,
+    PRIMARY KEY (user_id, voice_range)
+);
+CREATE TABLE IF NOT EXISTS note_progress (
+    user_id TEXT NOT NULL,
+    voice_range TEXT NOT NULL,
+    note TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    voiced INTEGER NOT NULL,
+    accurate INTEGER NOT NULL,
+    abs_cents_sum REAL NOT NULL,
+    last_at REAL NOT NULL,
+    recent TEXT NOT NULL,
+    PRIMARY KEY (user_id, voice_range, note)
+);
+"""
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def _note_order(note: str) -> Tuple[int, str]:
+    try:
+        return note_name_to_midi(note), note
+    except ValueError:
+        return 128, note
+
+
+class ProgressStore:
+    """SQLite-backed progress aggregates. Methods are blocking; call them from an executor."""
+
+    def __init__(self, path: str, recent_window: int = 10):
+        self.path = path
+        self.recent_window = recent_window
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def record(self, user_id: str, results: Dict[str, Any], recorded_at: Optional[float] = None) -> None:
+        """Fold one assessment (the stored ``results`` dict) into the user's aggregates."""
+        self.record_many([(user_id, results)], recorded_at)
+
+    def record_many(self, assessments: Iterable[Tuple[str, Dict[str, Any]]], recorded_at: Optional[float] = None) -> None:
+        """``record`` for several ``(user_id, results)`` pairs in one transaction."""
+        now = recorded_at if recorded_at is not None else time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id, results in assessments:
+                    voice_range = results["reference_melody"]["voice_range"]
+                    self._update_user(user_id, voice_range, float(results["score"]), now)
+                    self._update_notes(user_id, voice_range, results["note_by_note_results"], now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _update_user(self, user_id: str, voice_range: str, score: float, now: float) -> None:
+        row = self._conn.execute(
+            "SELECT * FROM user_progress WHERE user_id = ? AND voice_range = ?", (user_id, voice_range)
+        ).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO user_progress VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, voice_range, score, score, now, now, score, now, json.dumps([[now, score]]))
+            )
+            return
+        recent = (json.loads(row["recent"]) + [[now, score]])[-self.recent_window:]
+        improved = score > row["best_score"]
+        self._conn.execute(
+            "UPDATE user_progress SET attempts = attempts + 1, score_sum = score_sum + ?, best_score = ?, best_at = ?,"
+            " last_score = ?, last_at = ?, recent = ? WHERE user_id = ? AND voice_range = ?",
+            (
+                score, score if improved else row["best_score"], now if improved else row["best_at"],
+                score, now, json.dumps(recent), user_id, voice_range
+            )
+        )
+
+    def _update_notes(self, user_id: str, voice_range: str, note_results: List[Dict[str, Any]], now: float) -> None:
+        # An exercise can repeat a note; fold each note's occurrences together first
+        sung: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for note_result in note_results:
+            sung[note_result["expected_note"]].append(note_result)
+
+        for note, occurrences in sung.items():
+            voiced = [result for result in occurrences if result["detected_frequency"] > 0]
+            accurate = [bool(result["is_accurate"]) for result in occurrences]
+            abs_cents = sum(abs(result.get("cents_difference", 0.0)) for result in voiced)
+            row = self._conn.execute(
+                "SELECT recent FROM note_progress WHERE user_id = ? AND voice_range = ? AND note = ?",
+                (user_id, voice_range, note)
+            ).fetchone()
+            recent = ((json.loads(row["recent"]) if row is not None else []) + [int(flag) for flag in accurate])[-self.recent_window:]
+            self._conn.execute(
+                "INSERT INTO note_progress VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (user_id, voice_range, note) DO UPDATE SET"
+                " attempts = attempts + excluded.attempts, voiced = voiced + excluded.voiced,"
+                " accurate = accurate + excluded.accurate, abs_cents_sum = abs_cents_sum + excluded.abs_cents_sum,"
+                " last_at = excluded.last_at, recent = excluded.recent",
+                (user_id, voice_range, note, len(occurrences), len(voiced), sum(accurate), abs_cents, now, json.dumps(recent))
+            )
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """A user's progress overall and per voice range and note, or None if they have no assessments."""
+        with self._lock:
+            ranges = self._conn.execute(
+                "SELECT * FROM user_progress WHERE user_id = ? ORDER BY voice_range", (user_id,)
+            ).fetchall()
+            notes = self._conn.execute("SELECT * FROM note_progress WHERE user_id = ?", (user_id,)).fetchall()
+        if not ranges:
+            return None
+
+        notes_by_range: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for row in sorted(notes, key=lambda row: _note_order(row["note"])):
+            recent = json.loads(row["recent"])
+            notes_by_range[row["voice_range"]].append({
+                "note": row["note"],
+                "attempts": row["attempts"],
+                "accuracy": row["accurate"] / row["attempts"],
+                "recent_accuracy": _mean(recent),
+                "mean_abs_cents": row["abs_cents_sum"] / row["voiced"] if row["voiced"] else None,
+                "last_at": row["last_at"]
+            })
+
+        voice_ranges = []
+        for row in ranges:
+            recent = json.loads(row["recent"])
+            voice_ranges.append({
+                "voice_range": row["voice_range"],
+                "attempts": row["attempts"],
+                "mean_score": row["score_sum"] / row["attempts"],
+                "recent_mean_score": _mean([score for _, score in recent]),
+                "best_score": row["best_score"],
+                "best_at": row["best_at"],
+                "first_at": row["first_at"],
+                "last_score": row["last_score"],
+                "last_at": row["last_at"],
+                "recent_scores": [{"at": at, "score": score} for at, score in recent],
+                "notes": notes_by_range[row["voice_range"]]
+            })
+
+        attempts = sum(row["attempts"] for row in ranges)
+        latest = max(ranges, key=lambda row: row["last_at"])
+        return {
+            "user_id": user_id,
+            "attempts": attempts,
+            "mean_score": sum(row["score_sum"] for row in ranges) / attempts,
+            "best_score": max(row["best_score"] for row in ranges),
+            "first_at": min(row["first_at"] for row in ranges),
+            "last_score": latest["last_score"],
+            "last_at": latest["last_at"],
+            "voice_ranges": voice_ranges
+        }
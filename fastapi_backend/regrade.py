@@ -0,0 +1,225 @@
+"""
+Bulk re-grade stored results from their pitch contours, without the audio.
+
+    # Dry run: report what a 40 Hz tolerance would change
+    python regrade.py --tolerance-hz 40 --output changes.jsonl
+
+    # Apply DTW segmentation to every stored result
+    python regrade.py --segmentation dtw --write
+
+    # Offline, from an export of pitch_results rows (one JSON object per line)
+    python regrade.py --input pitch_results.jsonl --output regraded.jsonl
+
+Each ``pitch_results`` row with a ``pitch_contour`` (see ``contours.py``) is
+decoded and re-run through segmentation and scoring (``score_pitch_track``)
+with the given tolerance, segmentation mode and DTW band, against the
+exercise's current definition. Rows are graded in chunks across
+``--workers`` processes, with a bounded number of chunks in flight, so
+thousands of contours take seconds and memory stays flat.
+
+Rows come from Supabase (``SUPABASE_URL`` and ``SUPABASE_SERVICE_ROLE_KEY``,
+which must bypass row-level security) or ``--input``. Without ``--write``
+nothing is modified; ``--output`` gets one line per row with the old and new
+score. ``--write`` updates each row's ``score`` and ``results`` in bulk
+upserts; ``results.regrade`` records the parameters used. The per-user
+progress aggregates are not rebuilt.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+from analysis import ALIGNMENT_BAND_FRACTION, ANALYSIS_PARAMS, SEGMENTATION_MODE, SEGMENTATION_MODES, score_pitch_track
+from contours import decode_contour_text
+from exercises import get_exercise
+
+ROW_COLUMNS = "id,user_id,score,results,pitch_contour"
+
+
+def regrade_row(row: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Re-grade one stored row; returns ``{"id", "user_id", "old_score", "score", "results"}``.
+
+    Raises for rows without a contour, or whose exercise no longer exists.
+    """
+    if not row.get("pitch_contour"):
+        raise ValueError("Row has no stored pitch contour")
+    reference = row["results"]["reference_melody"]
+    exercise = get_exercise(reference.get("exercise_id"), reference["voice_range"])
+    times, pitches = decode_contour_text(row["pitch_contour"])
+    analysis = score_pitch_track(
+        times, pitches, exercise, tolerance_hz=params["tolerance_hz"],
+        mode=params["segmentation"], band_fraction=params["band_fraction"]
+    )
+    analysis["regrade"] = {**params, "previous_score": row["score"]}
+    return {"id": row["id"], "user_id": row["user_id"], "old_score": row["score"], "score": analysis["score"], "results": analysis}
+
+
+def regrade_chunk(rows: List[Dict[str, Any]], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """``regrade_row`` for each row; a failing row yields ``{"id", "error"}`` instead. Runs in a worker process."""
+    outcomes = []
+    for row in rows:
+        try:
+            outcomes.append(regrade_row(row, params))
+        except Exception as e:
+            outcomes.append({"id": row.get("id"), "error": f"{type(e).__name__}: {e}"})
+    return outcomes
+
+
+def supabase_client():
+    from supabase import create_client
+
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not key:
+        raise SystemExit("SUPABASE_SERVICE_ROLE_KEY must be set to read and update every user's pitch_results")
+    return create_client(os.getenv("SUPABASE_URL", "https://oopmlreysjzuxzylyheb.supabase.co"), key)
+
+
+def supabase_rows(client, page_size: int, since: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Every ``pitch_results`` row with a contour, oldest first, fetched a page at a time."""
+    offset = 0
+    while True:
+        query = client.table("pitch_results").select(ROW_COLUMNS).not_.is_("pitch_contour", "null")
+        if since:
+            query = query.gte("created_at", since)
+        page = query.order("created_at").order("id").range(offset, offset + page_size - 1).execute().data
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+
+def file_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows from a JSON-lines export; ``results`` may be a JSON string, as ``psql`` exports it."""
+    with open(path, encoding="utf-8") as rows:
+        for line in rows:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if isinstance(row.get("results"), str):
+                row["results"] = json.loads(row["results"])
+            yield row
+
+
+def chunked(rows: Iterable[Dict[str, Any]], size: int, limit: Optional[int]) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for count, row in enumerate(rows):
+        if limit is not None and count >= limit:
+            break
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def regrade_all(
+    chunks: Iterable[List[Dict[str, Any]]],
+    params: Dict[str, Any],
+    workers: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """Outcomes of every chunk, in order, with at most two chunks per worker in flight."""
+    if workers <= 0:
+        for chunk in chunks:
+            yield regrade_chunk(chunk, params)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(regrade_chunk, chunk, params))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_outcomes(client, outcomes: List[Dict[str, Any]]) -> None:
+    """Update ``score`` and ``results`` of the re-graded rows in one upsert; ``pitch_contour`` is left as it is."""
+    rows = [
+        {"id": outcome["id"], "user_id": outcome["user_id"], "score": outcome["score"], "results": outcome["results"]}
+        for outcome in outcomes if "error" not in outcome
+    ]
+    if rows:
+        client.table("pitch_results").upsert(rows).execute()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-grade stored pitch_results from their pitch contours.")
+    parser.add_argument("--tolerance-hz", type=float, default=ANALYSIS_PARAMS["tolerance_hz"], help="Hz tolerance for exercises graded in Hz")
+    parser.add_argument("--segmentation", choices=SEGMENTATION_MODES, default=SEGMENTATION_MODE, help="How contours are split into notes")
+    parser.add_argument("--band-fraction", type=float, default=ALIGNMENT_BAND_FRACTION, help="DTW band half-width as a fraction of the note count")
+    parser.add_argument("--input", help="JSON-lines export of pitch_results rows instead of Supabase")
+    parser.add_argument("--output", help="Write one JSON line per row: id, old and new score, or the error")
+    parser.add_argument("--write", action="store_true", help="Update the rows in Supabase (default is a dry run)")
+    parser.add_argument("--since", help="Only rows created at or after this ISO timestamp (Supabase only)")
+    parser.add_argument("--limit", type=int, help="Stop after this many rows")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Grading processes (0 grades in this process)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Rows per worker task and per upsert")
+    parser.add_argument("--page-size", type=int, default=1000, help="Rows fetched from Supabase per request")
+    args = parser.parse_args()
+
+    if args.write and args.input:
+        parser.error("--write updates Supabase rows and cannot be combined with --input")
+    params = {
+        "tolerance_hz": args.tolerance_hz,
+        "segmentation": args.segmentation,
+        "band_fraction": args.band_fraction,
+        "regraded_at": datetime.now(timezone.utc).isoformat()
+    }
+
+    client = supabase_client() if args.write or not args.input else None
+    rows = file_rows(args.input) if args.input else supabase_rows(client, args.page_size, args.since)
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+
+    started = time.perf_counter()
+    totals = {"rows": 0, "regraded": 0, "changed": 0, "errors": 0, "old_score_sum": 0, "score_sum": 0}
+    try:
+        for outcomes in regrade_all(chunked(rows, args.chunk_size, args.limit), params, args.workers):
+            if args.write:
+                write_outcomes(client, outcomes)
+            for outcome in outcomes:
+                totals["rows"] += 1
+                if "error" in outcome:
+                    totals["errors"] += 1
+                else:
+                    totals["regraded"] += 1
+                    totals["changed"] += outcome["score"] != outcome["old_score"]
+                    totals["old_score_sum"] += outcome["old_score"]
+                    totals["score_sum"] += outcome["score"]
+                if output is not None:
+                    line = {key: outcome[key] for key in ("id", "old_score", "score", "error") if key in outcome}
+                    output.write(json.dumps(line) + "\n")
+            print(f"{totals['rows']} rows, {totals['changed']} changed, {totals['errors']} errors", file=sys.stderr)
+    finally:
+        if output is not None:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    regraded = totals["regraded"]
+    summary = {
+        "params": params,
+        "rows": totals["rows"],
+        "regraded": regraded,
+        "changed": totals["changed"],
+        "errors": totals["errors"],
+        "mean_old_score": totals["old_score_sum"] / regraded if regraded else None,
+        "mean_score": totals["score_sum"] / regraded if regraded else None,
+        "written": args.write,
+        "seconds": elapsed,
+        "rows_per_second": totals["rows"] / elapsed if elapsed else None
+    }
+    print(json.dumps(summary, indent=2))
+    return 1 if totals["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Assessment response schema and lean JSON encoding.
+
+``AssessmentResponse`` documents the grading response. Building it means
+validating a ``PitchAnalysisResult`` model per note, and FastAPI then dumps
+and re-validates the whole response against ``response_model`` before
+encoding it. ``assessment_payload`` builds the same JSON structure directly
+from the plain dicts ``analyze_pitch_accuracy`` returns, and ``dumps`` encodes
+it with orjson (falling back to the standard library) understanding numpy
+scalars and arrays, so the lean path never constructs a model.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+from starlette.responses import JSONResponse
+
+from analysis import PitchAnalysisResult
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class AssessmentResponse(BaseModel):
+    score: int
+    overall_percentage: float
+    note_by_note_results: List[PitchAnalysisResult]
+    detected_pitches_hz: List[float]
+    reference_melody: Dict[str, Any]
+    user_id: str
+    timestamp: datetime
+    debug_info: Dict[str, Any] = Field(default_factory=dict)
+
+
+def _default(value: Any) -> Any:
+    """Encode the numpy and datetime values the standard json module rejects."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON; numpy scalars and arrays are encoded as plain numbers and lists."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class LeanJSONResponse(JSONResponse):
+    """``JSONResponse`` encoded with ``dumps``; the content is sent as-is, without validation."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def assessment_payload(analysis: Dict[str, Any], user_id: str, debug_info: Dict[str, Any], timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    The JSON form of ``AssessmentResponse`` built without the models.
+
+    Matches ``AssessmentResponse(...).model_dump(mode="json")`` field for field.
+    Note dicts are copied (to add the optional note times), so ``analysis``
+    itself is left as it is stored.
+    """
+    return {
+        "score": int(analysis["score"]),
+        "overall_percentage": float(analysis["overall_percentage"]),
+        "note_by_note_results": [
+            {**note, "start_time": note.get("start_time"), "end_time": note.get("end_time")}
+            for note in analysis["note_by_note_results"]
+        ],
+        "detected_pitches_hz": analysis["detected_pitches_hz"],
+        "reference_melody": analysis["reference_melody"],
+        "user_id": user_id,
+        "timestamp": (timestamp or datetime.now()).isoformat(),
+        "debug_info": debug_info
+    }
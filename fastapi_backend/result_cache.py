@@ -0,0 +1,137 @@
+"""
+Content-addressed cache of grading results.
+
+Results are keyed by a hash of the uploaded bytes, the voice range and the
+analysis parameters, so a resubmitted recording (double tap, network retry,
+frontend timeout retry) is served without decoding or pitch extraction. A
+bounded in-memory LRU with TTL sits in front of an optional on-disk tier that
+survives restarts.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def result_cache_key(audio_content: bytes, voice_range: str, params: Dict[str, Any]) -> str:
+    """Hash the recording together with everything that affects its grade."""
+    digest = hashlib.sha256()
+    digest.update(audio_content)
+    digest.update(b"\0")
+    digest.update(voice_range.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL cache of analysis results, with an optional disk tier."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600.0, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        # key -> (stored_at, serialized result)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, stored_at: float, payload: str) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at > self.ttl_seconds:
+                os.unlink(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return stored_at, f.read()
+        except OSError:
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached result, or None."""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, payload = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return json.loads(payload)
+                del self._entries[key]
+
+        if self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, *entry)
+                with self._lock:
+                    self.disk_hits += 1
+                return json.loads(entry[1])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Cache a result in memory and, when configured, on disk."""
+        if not self.enabled:
+            return
+
+        payload = json.dumps(result)
+        self._remember(key, time.time(), payload)
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Failed to write result cache entry to disk: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": bool(self.disk_dir),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
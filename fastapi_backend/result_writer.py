@@ -0,0 +1,220 @@
+"""
+Write-behind storage for pitch_results rows.
+
+Requests enqueue rows and return immediately. A background task flushes the
+queue as batched inserts when it reaches ``batch_size`` rows or every
+``flush_interval`` seconds, retrying with exponential backoff. Rows that still
+cannot be written (or arrive while the queue is full) are appended to a local
+JSONL journal, which is replayed once the store accepts writes again and on
+the next startup. Journal writes run in the default executor, never on the
+event loop. On shutdown the queue is drained before the task exits.
+
+``insert_rows`` is any synchronous callable that inserts a list of rows and
+raises on failure, so a local stand-in can replace Supabase in tests.
+``on_written``, if given, is called with every batch the store accepted,
+replayed journal rows included, so derived state (the progress aggregates)
+only counts rows that were actually stored. Both run in the default executor.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+class ResultWriteBehind:
+    """Bounded write-behind queue with batching, retries and a spill journal."""
+
+    def __init__(
+        self,
+        insert_rows: Callable[[List[Dict[str, Any]]], None],
+        journal_path: str,
+        max_queue: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_retries: int = 3,
+        retry_base_delay: float = 0.5,
+        on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ):
+        self.insert_rows = insert_rows
+        self.on_written = on_written
+        self.journal_path = journal_path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._journal_lock = threading.Lock()
+        self._spills: Set[asyncio.Future] = set()
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_journaled = 0
+        self.rows_replayed = 0
+        self.failed_attempts = 0
+        self.last_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Start the background flusher and replay any journal left by a previous run."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        await self.replay_journal()
+
+    async def stop(self) -> None:
+        """Drain the queue, then stop the background flusher and wait for pending journal writes."""
+        if self._task is not None:
+            await self._queue.put(None)  # Sentinel: flush what is left and exit
+            await self._task
+            self._task = None
+        if self._spills:
+            await asyncio.gather(*self._spills)
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Queue rows for storage without blocking.
+
+        Returns False if the queue was full or not running, in which case the
+        rows are handed to the executor to be journaled instead.
+        """
+        if not self.running:
+            self._spill(rows)
+            return False
+        for index, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self._spill(rows[index:])
+                return False
+        return True
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        """Journal rows from the executor; ``stop`` waits for every pending spill."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to keep responsive
+            self._append_journal(rows)
+            return
+        spill = loop.run_in_executor(None, self._append_journal, rows)
+        self._spills.add(spill)
+        spill.add_done_callback(self._spills.discard)
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            first = await self._queue.get()
+            if first is None:
+                stopping = True
+            else:
+                batch.append(first)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if row is None:
+                        stopping = True
+                        break
+                    batch.append(row)
+
+            if stopping:
+                # Drain everything still queued behind the sentinel
+                while not self._queue.empty():
+                    row = self._queue.get_nowait()
+                    if row is not None:
+                        batch.append(row)
+
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                if await self._flush(chunk) and os.path.exists(self.journal_path):
+                    # The store is reachable again; retry anything spilled earlier
+                    await self.replay_journal()
+
+    async def _flush(self, rows: List[Dict[str, Any]]) -> bool:
+        """Insert one batch, retrying with backoff; journal it if every attempt fails."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, self.insert_rows, rows)
+                self.last_flush_seconds = time.perf_counter() - started
+                self.rows_written += len(rows)
+                self.batches_written += 1
+                await self._written(rows)
+                return True
+            except Exception as e:
+                self.failed_attempts += 1
+                print(f"Error storing {len(rows)} results (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_base_delay * (2 ** attempt))
+
+        await loop.run_in_executor(None, self._append_journal, rows)
+        return False
+
+    def _append_journal(self, rows: List[Dict[str, Any]]) -> None:
+        with self._journal_lock:
+            with open(self.journal_path, "a", encoding="utf-8") as journal:
+                for row in rows:
+                    journal.write(json.dumps(row) + "\n")
+            self.rows_journaled += len(rows)
+        print(f"Journaled {len(rows)} results to {self.journal_path}")
+
+    def _take_journal(self) -> List[Dict[str, Any]]:
+        with self._journal_lock:
+            if not os.path.exists(self.journal_path):
+                return []
+            with open(self.journal_path, "r", encoding="utf-8") as journal:
+                rows = [json.loads(line) for line in journal if line.strip()]
+            os.unlink(self.journal_path)
+            return rows
+
+    async def replay_journal(self) -> None:
+        """Write journaled rows back to the store; rows that still fail are re-journaled."""
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(None, self._take_journal)
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            try:
+                await loop.run_in_executor(None, self.insert_rows, chunk)
+                self.rows_replayed += len(chunk)
+            except Exception as e:
+                print(f"Journal replay failed, keeping {len(rows) - start} results journaled: {e}")
+                await loop.run_in_executor(None, self._append_journal, rows[start:])
+                return
+            await self._written(chunk)
+
+    async def _written(self, rows: List[Dict[str, Any]]) -> None:
+        """Run ``on_written`` for stored rows; the rows are in the store, so a failure here is only logged."""
+        if self.on_written is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.on_written, rows)
+        except Exception as e:
+            print(f"Error handling {len(rows)} stored results: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending_spills": len(self._spills),
+            "max_queue": self.max_queue,
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "rows_journaled": self.rows_journaled,
+            "rows_replayed": self.rows_replayed,
+            "failed_attempts": self.failed_attempts,
+            "last_flush_seconds": self.last_flush_seconds
+        }
@@ -0,0 +1,294 @@
+"""
+Block-streaming analysis for long recordings.
+
+The whole-file pipeline holds the decoded recording plus piptrack's full
+(frequency bins x frames) ``pitches`` and ``magnitudes`` matrices, so its
+memory grows with the recording: a ten-minute rehearsal takes hundreds of MB.
+``run_streaming_grading_pipeline`` instead decodes, resamples and analyses
+``STREAM_BLOCK_SECONDS`` at a time and keeps only per-frame results, so peak
+memory stays at a few blocks however long the recording is.
+
+Blocks are framed exactly as the whole signal would be: each framer carries
+the samples of its last incomplete frame into the next block, and piptrack
+sees the same zero padding at the start and end as librosa's centred STFT.
+The contour therefore matches the whole-file piptrack contour frame for
+frame; only the analysis differs from the whole-file pipeline in that:
+
+- the contour covers the whole recording and frames outside the voice
+  activity regions are dropped afterwards (the whole-file path frames each
+  region separately, shifting frame times by up to half a hop)
+- only piptrack runs; the fallback engines need the whole signal
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from audio_core.audio_io import BlockResampler, probe_duration, stream_audio
+from audio_core.pitch_engines import PITCH_ENGINES, energy_active_seconds, strongest_pitch_per_frame, track_quality
+
+from analysis import (
+    ANALYSIS_SAMPLE_RATE,
+    RESAMPLE_QUALITY,
+    STREAM_BLOCK_SECONDS,
+    STREAMING_MAX_SECONDS,
+    STREAMING_MIN_SECONDS,
+    VAD_ENABLED,
+    grade_pitch_track,
+    pitch_engine_args
+)
+from exercises import get_exercise
+from metrics import StageTimer
+from vad import activity_mask, activity_regions, frame_features, vad_frame_params
+
+try:
+    import librosa
+    LIBROSA_AVAILABLE = True
+except ImportError:
+    LIBROSA_AVAILABLE = False
+
+
+class BlockFramer:
+    """
+    Carry samples between blocks so frames of ``frame_length`` every
+    ``hop_length`` samples line up as they would over the whole signal.
+    """
+
+    def __init__(self, frame_length: int, hop_length: int):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.frames_done = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def feed(self, samples: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        Add samples; returns the span holding every newly completed frame
+        (starting at the first one) and the number of those frames.
+        """
+        buffer = np.concatenate([self._pending, samples]) if len(self._pending) else np.asarray(samples, dtype=np.float32)
+        num_frames = 0 if len(buffer) < self.frame_length else 1 + (len(buffer) - self.frame_length) // self.hop_length
+        consumed = num_frames * self.hop_length
+        self._pending = buffer[consumed:].copy()
+        self.frames_done += num_frames
+        span = buffer[:consumed - self.hop_length + self.frame_length] if num_frames else buffer[:0]
+        return span, num_frames
+
+
+class StreamingPiptrack:
+    """
+    piptrack over a signal fed in blocks, frame for frame equal to
+    ``PiptrackEngine.track`` over the whole signal.
+
+    librosa's centred STFT pads the signal with ``frame_length // 2`` zeros
+    at each end; the same zeros are fed through the framer here, and the
+    uncentred STFT of each span gives the same frames.
+    """
+
+    def __init__(self, sr: int, fmin: float, fmax: float, frame_length: int, hop_length: int, threshold: float = 0.1):
+        self.sr = sr
+        self.fmin = fmin
+        self.fmax = fmax
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.threshold = threshold
+        self.samples = 0
+        self.transforms = 0
+        self._framer = BlockFramer(frame_length, hop_length)
+        self._framer.feed(np.zeros(frame_length // 2, dtype=np.float32))
+        # Uncentred frames for ``active_seconds``
+        self._energy_framer = BlockFramer(frame_length, hop_length)
+        self._energy: List[np.ndarray] = []
+
+    def _track(self, span: np.ndarray, num_frames: int, first_frame: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not num_frames:
+            return np.zeros(0), np.zeros(0, dtype=np.float32)
+        self.transforms += 1
+        pitches, magnitudes = librosa.piptrack(
+            y=span, sr=self.sr, n_fft=self.frame_length, hop_length=self.hop_length,
+            threshold=self.threshold, fmin=self.fmin, fmax=self.fmax, center=False
+        )
+        frame_pitches = strongest_pitch_per_frame(pitches[:, :num_frames], magnitudes[:, :num_frames])
+        return (first_frame + np.arange(num_frames)) * self.hop_length / self.sr, frame_pitches
+
+    def push(self, samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Add a block; returns ``(times, pitches)`` of the frames it completed (0 pitch when unvoiced)."""
+        self.samples += len(samples)
+        energy_span, energy_frames = self._energy_framer.feed(samples)
+        if energy_frames:
+            frames = np.lib.stride_tricks.sliding_window_view(energy_span, self.frame_length)[::self.hop_length][:energy_frames]
+            self._energy.append(np.einsum("ij,ij->i", frames, frames))
+        first_frame = self._framer.frames_done
+        span, num_frames = self._framer.feed(samples)
+        return self._track(span, num_frames, first_frame)
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Frames covering the end of the signal; the whole signal has ``1 + samples // hop`` frames."""
+        first_frame = self._framer.frames_done
+        span, num_frames = self._framer.feed(np.zeros(self.frame_length // 2, dtype=np.float32))
+        num_frames = min(num_frames, 1 + self.samples // self.hop_length - first_frame)
+        return self._track(span, max(num_frames, 0), first_frame)
+
+    def active_seconds(self) -> float:
+        """``pitch_engines.active_seconds`` of everything pushed."""
+        # ``frame_signal`` leaves out a frame ending exactly at the last sample
+        num_frames = len(range(0, self.samples - self.frame_length, self.hop_length))
+        energy = np.concatenate(self._energy)[:num_frames] if self._energy else np.zeros(0)
+        return energy_active_seconds(energy, self.sr, self.hop_length)
+
+
+class StreamingVAD:
+    """Activity frame features of a signal fed in blocks; regions are decided once it has all been seen."""
+
+    def __init__(self, sr: int):
+        self.sr = sr
+        self.samples = 0
+        self._framer = BlockFramer(*vad_frame_params(sr))
+        self._power: List[np.ndarray] = []
+        self._zcr: List[np.ndarray] = []
+
+    def push(self, samples: np.ndarray) -> None:
+        self.samples += len(samples)
+        span, num_frames = self._framer.feed(samples)
+        if num_frames:
+            power, zcr = frame_features(span, self.sr)
+            self._power.append(power)
+            self._zcr.append(zcr)
+
+    def regions(self) -> Tuple[List[Tuple[int, int]], Dict[str, Any]]:
+        """``voice_activity_regions`` of everything pushed."""
+        power = np.concatenate(self._power) if self._power else np.zeros(0)
+        zcr = np.concatenate(self._zcr) if self._zcr else np.zeros(0)
+        return activity_regions(activity_mask(power, zcr), self._framer.hop_length, self.sr, self.samples)
+
+
+def should_stream(audio_content: bytes, file_suffix: str) -> bool:
+    """
+    Whether a recording should get block-streaming analysis: its headers say it
+    is long enough, or they do not record a length at all.
+
+    Browser .webm uploads usually have no duration; on the whole-file path
+    they would be cut off at ``MAX_ANALYSIS_SECONDS`` however long they are.
+    """
+    if not STREAMING_MIN_SECONDS or not LIBROSA_AVAILABLE:
+        return False
+    duration = probe_duration(audio_content, file_suffix)
+    return duration is None or duration >= STREAMING_MIN_SECONDS
+
+
+def stream_analysis_blocks(
+    audio_content: bytes,
+    file_suffix: str,
+    timer: StageTimer,
+    block_seconds: float = STREAM_BLOCK_SECONDS
+) -> Tuple[Iterator[np.ndarray], Dict[str, Any]]:
+    """
+    Decoded blocks at the analysis sample rate, with decode/resample time on ``timer``.
+
+    ``info`` has the ``load_analysis_audio`` fields; ``duration_seconds`` and
+    ``truncated`` are filled in once the iterator is exhausted.
+    """
+    with timer.stage("decode"):
+        blocks, native_rate, decode_path = stream_audio(audio_content, file_suffix, block_seconds, STREAMING_MAX_SECONDS or None)
+    sample_rate = ANALYSIS_SAMPLE_RATE or native_rate
+    resampler = BlockResampler(native_rate, sample_rate, RESAMPLE_QUALITY) if sample_rate != native_rate else None
+    info = {"decode_path": decode_path, "native_sample_rate": native_rate, "sample_rate": sample_rate}
+
+    def analysis_blocks() -> Iterator[np.ndarray]:
+        native_samples = analysed_samples = 0
+        while True:
+            with timer.stage("decode"):
+                block = next(blocks, None)
+            last = block is None
+            if not last:
+                native_samples += len(block)
+            if resampler is not None:
+                # The final call flushes the resampler's delay line
+                with timer.stage("resample"):
+                    block = resampler.resample(np.zeros(0, dtype=np.float32) if last else block, last=last)
+            if block is not None and len(block):
+                analysed_samples += len(block)
+                yield block
+            if last:
+                break
+        info["duration_seconds"] = analysed_samples / sample_rate if sample_rate else 0.0
+        info["truncated"] = bool(STREAMING_MAX_SECONDS) and native_samples >= int(STREAMING_MAX_SECONDS * native_rate)
+
+    return analysis_blocks(), info
+
+
+def stream_pitch_frames(
+    blocks: Iterable[np.ndarray],
+    tracker: StreamingPiptrack,
+    vad: StreamingVAD,
+    timer: StageTimer
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Push each block through ``vad`` and ``tracker`` and yield the
+    ``(times, pitches)`` frames it completed, as soon as they are known.
+    """
+    for block in blocks:
+        with timer.stage("vad"):
+            vad.push(block)
+        with timer.stage("pitch"):
+            frames = tracker.push(block)
+        yield frames
+    with timer.stage("pitch"):
+        frames = tracker.finish()
+    yield frames
+
+
+def run_streaming_grading_pipeline(
+    audio_content: bytes,
+    file_suffix: str,
+    voice_range: str = "soprano",
+    exercise_id: Optional[str] = None,
+    block_seconds: float = STREAM_BLOCK_SECONDS
+) -> Dict[str, Any]:
+    """
+    ``run_grading_pipeline`` in blocks of ``block_seconds``, with memory independent of the recording's length.
+
+    ``debug_info`` has the whole-file fields plus ``streaming`` (block size and count).
+    """
+    exercise = get_exercise(exercise_id, voice_range)
+    timer = StageTimer()
+    blocks, info = stream_analysis_blocks(audio_content, file_suffix, timer, block_seconds)
+    sample_rate = info["sample_rate"]
+    tracker = StreamingPiptrack(*pitch_engine_args(sample_rate, exercise.voice_range), threshold=PITCH_ENGINES["piptrack"].threshold)
+    vad = StreamingVAD(sample_rate)
+
+    times_chunks, pitch_chunks = [], []
+    for times, pitches in stream_pitch_frames(blocks, tracker, vad, timer):
+        times_chunks.append(times)
+        pitch_chunks.append(pitches)
+    times, pitches = np.concatenate(times_chunks), np.concatenate(pitch_chunks)
+    info["streaming"] = {"block_seconds": block_seconds, "blocks": len(times_chunks) - 1}
+    info["spectral_transforms"] = {"stft": tracker.transforms}
+
+    if VAD_ENABLED:
+        # Keep only frames centred inside a voice-activity region, as if each region had been analysed
+        with timer.stage("vad"):
+            regions, info["vad"] = vad.regions()
+            if regions:
+                centres = np.round(times * sample_rate)
+                inside = np.zeros(len(times), dtype=bool)
+                for start, end in regions:
+                    inside |= (centres >= start) & (centres < end)
+                pitches = np.where(inside, pitches, 0.0).astype(np.float32)
+            else:
+                info["vad"].update(trimmed_duration_seconds=info["duration_seconds"], skipped_fraction=0.0)
+
+    with timer.stage("pitch"):
+        voiced = pitches > 0
+        quality = track_quality(times, pitches, tracker.active_seconds())
+        info["pitch_engine"] = "piptrack"
+        info["pitch_quality"] = quality
+        info["pitch_engines"] = [{
+            "engine": "piptrack",
+            "seconds": timer.timings.get("pitch", 0.0),
+            "quality": quality,
+            "voiced_frames": int(voiced.sum())
+        }]
+
+    return grade_pitch_track(
+        exercise, timer, info, times[voiced], np.ascontiguousarray(pitches[voiced], dtype=np.float32)
+    )
@@ -0,0 +1,105 @@
+"""
+Deterministic synthetic singing.
+
+Each recording sings an exercise's notes as harmonic tones with vibrato and a
+short attack/release, separated by silence gaps, with leading/trailing silence
+and low-level noise. The same seed always produces the same samples. Used to
+warm up the pipeline at startup and by the benchmarks.
+"""
+
+import io
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+# Formats recordings can be encoded into
+FORMATS = ["wav", "flac", "mp3", "webm", "m4a"]
+
+# Sample rates libopus accepts; .webm is skipped at any other rate
+OPUS_RATES = {8000, 12000, 16000, 24000, 48000}
+
+
+def synthesize_singing(
+    frequencies: np.ndarray,
+    duration_seconds: float,
+    sample_rate: int,
+    detune_cents: float = 0.0,
+    vibrato_cents: float = 20.0,
+    noise_level: float = 0.01,
+    gap_seconds: float = 0.1,
+    edge_silence_seconds: float = 0.5,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Sing ``frequencies`` once, in order, stretched to fill ``duration_seconds``.
+
+    Each note gets an equal share of the time left after the edge silences, so
+    the exercise is still gradable as a whole at every duration.
+    """
+    rng = np.random.default_rng(seed)
+    frequencies = np.asarray(frequencies, dtype=np.float64) * 2 ** (detune_cents / 1200)
+
+    sung_seconds = max(duration_seconds - 2 * edge_silence_seconds, 0.2)
+    note_seconds = max(sung_seconds / len(frequencies) - gap_seconds, 0.05)
+
+    note_samples = int(note_seconds * sample_rate)
+    gap = np.zeros(int(gap_seconds * sample_rate))
+    t = np.arange(note_samples) / sample_rate
+    envelope = np.minimum(1.0, np.minimum(t, t[::-1]) / 0.03)
+    vibrato = 2 ** (vibrato_cents / 1200 * np.sin(2 * np.pi * 5.5 * t))
+
+    pieces = [np.zeros(int(edge_silence_seconds * sample_rate))]
+    for frequency in frequencies:
+        phase = 2 * np.pi * np.cumsum(frequency * vibrato) / sample_rate
+        tone = 0.3 * np.sin(phase) + 0.15 * np.sin(2 * phase) + 0.07 * np.sin(3 * phase)
+        pieces.extend([tone * envelope, gap])
+    pieces.append(np.zeros(int(edge_silence_seconds * sample_rate)))
+
+    signal = np.concatenate(pieces)
+    signal = signal + noise_level * rng.standard_normal(len(signal))
+    return signal.astype(np.float32)
+
+
+def _encode_with_pyav(samples: np.ndarray, sample_rate: int, container_format: str, codec: str) -> bytes:
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format=container_format) as container:
+        stream = container.add_stream(codec, rate=sample_rate)
+        stream.layout = "mono"
+        frame_size = 960 if codec == "libopus" else 1024
+        for start in range(0, len(samples), frame_size):
+            chunk = samples[start:start + frame_size].reshape(1, -1)
+            frame = av.AudioFrame.from_ndarray(np.ascontiguousarray(chunk), format="flt", layout="mono")
+            frame.sample_rate = sample_rate
+            frame.pts = start
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def encode_audio(samples: np.ndarray, sample_rate: int, audio_format: str) -> Optional[bytes]:
+    """Encode mono float32 samples; returns None when the format's encoder is unavailable."""
+    try:
+        if audio_format in ("wav", "flac", "mp3"):
+            buffer = io.BytesIO()
+            sf.write(buffer, samples, sample_rate, format=audio_format.upper())
+            return buffer.getvalue()
+        if not PYAV_AVAILABLE:
+            return None
+        if audio_format == "webm":
+            if sample_rate not in OPUS_RATES:
+                return None
+            return _encode_with_pyav(samples, sample_rate, "webm", "libopus")
+        if audio_format == "m4a":
+            return _encode_with_pyav(samples, sample_rate, "ipod", "aac")
+    except Exception as e:
+        print(f"Could not encode {audio_format} at {sample_rate} Hz: {e}")
+    return None
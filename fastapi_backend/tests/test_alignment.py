@@ -0,0 +1,131 @@
+"""Banded DTW note alignment against a brute-force dynamic programme."""
+
+import numpy as np
+import pytest
+
+from alignment import MAX_FRAME_COST_CENTS, align_pitches_to_notes, dtw_note_boundaries
+
+
+def band_window(j, num_frames, num_notes, band_notes):
+    """Frames note ``j`` may cover, as ``dtw_note_boundaries`` defines the band."""
+    frames_per_note = num_frames / num_notes
+    lo = max(j, int(np.floor((j - band_notes) * frames_per_note)))
+    hi = min(num_frames - num_notes + j, int(np.ceil((j + band_notes + 1) * frames_per_note)) - 1)
+    return min(lo, hi), hi
+
+
+def brute_force(contour_cents, reference_cents, band_notes=None):
+    """
+    Try every start frame for every note end frame: O(frames^2 x notes).
+
+    ``band_notes=None`` allows any segmentation with one or more frames per
+    note. Ties go to the latest start, as in ``dtw_note_boundaries``. Returns
+    ``(total_cost, boundaries)``, or ``(inf, None)`` when no segmentation fits.
+    """
+    num_frames, num_notes = len(contour_cents), len(reference_cents)
+    if num_notes == 0 or num_frames < num_notes:
+        return np.inf, None
+    cost = np.minimum(np.abs(contour_cents[None, :] - reference_cents[:, None]), MAX_FRAME_COST_CENTS)
+
+    best = np.full((num_notes, num_frames), np.inf)
+    start_of = np.zeros((num_notes, num_frames), dtype=int)
+    for j in range(num_notes):
+        lo, hi = (0, num_frames - 1) if band_notes is None else band_window(j, num_frames, num_notes, band_notes)
+        for end in range(lo, hi + 1):
+            for start in range(lo if j else 0, end + 1):
+                before = 0.0 if j == 0 else (best[j - 1, start - 1] if start > 0 else np.inf)
+                if j == 0 and start != 0:
+                    continue
+                total = before + cost[j, start:end + 1].sum()
+                if total <= best[j, end]:
+                    best[j, end], start_of[j, end] = total, start
+
+    if not np.isfinite(best[-1, -1]):
+        return np.inf, None
+    boundaries = np.empty((num_notes, 2), dtype=int)
+    end = num_frames - 1
+    for j in range(num_notes - 1, -1, -1):
+        boundaries[j] = (start_of[j, end], end)
+        end = start_of[j, end] - 1
+    return best[-1, -1], boundaries
+
+
+def segmentation_cost(contour_cents, reference_cents, boundaries):
+    return sum(
+        np.minimum(np.abs(contour_cents[first:last + 1] - reference), MAX_FRAME_COST_CENTS).sum()
+        for reference, (first, last) in zip(reference_cents, boundaries)
+    )
+
+
+def assert_valid(boundaries, num_frames):
+    assert boundaries[0, 0] == 0 and boundaries[-1, 1] == num_frames - 1
+    assert np.all(boundaries[:, 1] >= boundaries[:, 0])
+    np.testing.assert_array_equal(boundaries[1:, 0], boundaries[:-1, 1] + 1)
+
+
+def random_case(rng, integer_cents):
+    """A sung line: notes held for random lengths, with jitter, octave slips and stray frames."""
+    num_notes = int(rng.integers(1, 9))
+    reference = 6000 + 100 * np.cumsum(rng.integers(-4, 5, num_notes)).astype(np.float64)
+    lengths = rng.integers(1, 12, num_notes)
+    contour = np.repeat(reference, lengths) + rng.normal(0, 30, lengths.sum())
+    slips = rng.random(len(contour)) < 0.05
+    contour[slips] += rng.choice([-1200, 1200, 700], slips.sum())
+    if integer_cents:
+        contour = np.round(contour)
+    band_notes = float(rng.choice([0.0, 0.5, 1.0, 2.0, 3.5, 100.0]))
+    return contour, reference, band_notes
+
+
+def test_matches_brute_force_exactly_on_integer_costs():
+    # Integer costs sum exactly, so ties break the same way and boundaries must agree
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        contour, reference, band_notes = random_case(rng, integer_cents=True)
+        expected_cost, expected = brute_force(contour, reference, band_notes)
+        boundaries = dtw_note_boundaries(contour, reference, band_notes)
+        if expected is None:
+            assert boundaries is None
+            continue
+        assert_valid(boundaries, len(contour))
+        np.testing.assert_array_equal(boundaries, expected)
+        assert segmentation_cost(contour, reference, boundaries) == expected_cost
+
+
+def test_reaches_the_brute_force_optimum():
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        contour, reference, band_notes = random_case(rng, integer_cents=False)
+        expected_cost, _ = brute_force(contour, reference, band_notes)
+        boundaries = dtw_note_boundaries(contour, reference, band_notes)
+        if not np.isfinite(expected_cost):
+            assert boundaries is None
+            continue
+        assert_valid(boundaries, len(contour))
+        assert segmentation_cost(contour, reference, boundaries) == pytest.approx(expected_cost, rel=1e-9)
+
+
+def test_wide_band_is_unconstrained():
+    # With the band wider than the exercise, every segmentation is allowed
+    rng = np.random.default_rng(2)
+    for _ in range(100):
+        contour, reference, _ = random_case(rng, integer_cents=True)
+        expected_cost, _ = brute_force(contour, reference, band_notes=None)
+        boundaries = dtw_note_boundaries(contour, reference, float(len(reference)))
+        assert segmentation_cost(contour, reference, boundaries) == expected_cost
+
+
+def test_fewer_frames_than_notes():
+    assert dtw_note_boundaries(np.array([6000.0]), np.array([6000.0, 6200.0]), 2.0) is None
+    assert dtw_note_boundaries(np.array([6000.0]), np.array([]), 2.0) is None
+    np.testing.assert_array_equal(dtw_note_boundaries(np.array([6000.0, 6200.0]), np.array([6000.0, 6200.0]), 0.0), [[0, 0], [1, 1]])
+
+
+def test_follows_uneven_note_lengths():
+    reference_hz = np.array([261.63, 293.66, 329.63])
+    pitches = np.repeat(reference_hz, [30, 5, 15]).astype(np.float32)
+    times = np.arange(len(pitches)) * 0.01
+    notes, segments = align_pitches_to_notes(times, pitches, reference_hz, 80.0, 800.0)
+    assert [segment["num_frames"] for segment in segments] == [30, 5, 15]
+    np.testing.assert_allclose(notes, reference_hz, rtol=1e-6)
+    assert segments[1]["start_time"] == pytest.approx(0.30)
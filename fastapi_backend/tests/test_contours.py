@@ -0,0 +1,157 @@
+"""Round trips of packed pitch contours, and re-grading from them."""
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from analysis import ALIGNMENT_BAND_FRACTION, ANALYSIS_PARAMS, SEGMENTATION_MODE, run_grading_pipeline
+from contours import (
+    CENTS_UNIT, TIME_UNIT_SECONDS, ContourFormatError, decode_contour, decode_contour_text, encode_contour,
+    encode_contour_text
+)
+from exercises import get_exercise
+from regrade import regrade_row
+from synthetic_audio import encode_audio, synthesize_singing
+
+HOP_SECONDS = 512 / 22050
+
+
+def ticks(times):
+    return np.round(np.asarray(times) / TIME_UNIT_SECONDS).astype(np.int64)
+
+
+def cents_error(expected, actual):
+    return np.abs(1200.0 * np.log2(np.asarray(actual, dtype=np.float64) / expected))
+
+
+def assert_round_trip(times, pitches):
+    decoded_times, decoded_pitches = decode_contour_text(encode_contour_text(times, pitches))
+    assert decoded_times.dtype == np.float64 and decoded_pitches.dtype == np.float32
+    np.testing.assert_array_equal(ticks(decoded_times), ticks(times))
+    assert np.all(np.abs(decoded_times - times) <= TIME_UNIT_SECONDS / 2 + 1e-9)
+    if len(pitches):
+        # Half a step, plus float32 rounding of the decoded pitches
+        widest = np.abs(1200.0 * np.log2(pitches / np.median(pitches))).max()
+        step = max(CENTS_UNIT, widest / np.iinfo(np.int16).max)
+        assert np.all(cents_error(pitches, decoded_pitches) <= step / 2 + 1e-3)
+    return decoded_times, decoded_pitches
+
+
+def random_contour(rng, frames):
+    """Voiced frames on the hop grid with unvoiced gaps, vibrato and octave jumps."""
+    frame_indices = np.sort(rng.choice(frames * 2, size=frames, replace=False))
+    times = frame_indices * HOP_SECONDS
+    pitches = 80.0 * 2 ** rng.uniform(0, np.log2(800 / 80), frames)
+    return times, pitches
+
+
+def test_random_contours_round_trip():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        times, pitches = random_contour(rng, int(rng.integers(1, 3000)))
+        _, decoded = assert_round_trip(times, pitches)
+        # Even across the engines' whole 80-800 Hz range a step is under 1/8 cent
+        assert np.all(cents_error(pitches, decoded) <= 0.0625 + 1e-3)
+
+
+def test_contours_within_two_octaves_use_the_finest_step():
+    rng = np.random.default_rng(11)
+    times = np.arange(2000) * HOP_SECONDS
+    pitches = 330.0 * 2 ** (rng.uniform(-1.5, 1.5, len(times)))
+    _, decoded = assert_round_trip(times, pitches)
+    assert np.all(cents_error(pitches, decoded) <= CENTS_UNIT / 2 + 1e-3)
+
+
+def test_empty_contour():
+    times, pitches = assert_round_trip(np.array([]), np.array([]))
+    assert times.size == 0 and pitches.size == 0
+
+
+def test_single_frame():
+    times, pitches = assert_round_trip(np.array([1.2345]), np.array([440.0]))
+    assert pitches[0] == pytest.approx(440.0, rel=1e-6)
+
+
+def test_unvoiced_gaps_keep_their_length():
+    voiced = np.r_[0:50, 400:450, 5000:5001]
+    times, _ = assert_round_trip(voiced * HOP_SECONDS, np.full(len(voiced), 220.0))
+    np.testing.assert_array_equal(np.diff(ticks(times)), np.diff(ticks(voiced * HOP_SECONDS)))
+
+
+def test_largest_frame_time_and_delta():
+    largest_delta = float(np.iinfo(np.uint32).max) * TIME_UNIT_SECONDS
+    assert_round_trip(np.array([0.0, largest_delta]), np.array([100.0, 200.0]))
+    # The last frame of the longest recording streaming analysis accepts
+    last_frame = np.arange(int(1800 / HOP_SECONDS) - 10, int(1800 / HOP_SECONDS)) * HOP_SECONDS
+    assert_round_trip(last_frame, np.linspace(300, 320, len(last_frame)))
+
+    with pytest.raises(ValueError):
+        encode_contour(np.array([0.0, largest_delta + 1.0]), np.array([100.0, 200.0]))
+
+
+def test_invalid_contours():
+    with pytest.raises(ValueError):
+        encode_contour(np.array([0.2, 0.1]), np.array([100.0, 200.0]))
+    with pytest.raises(ValueError):
+        encode_contour(np.array([0.1]), np.array([100.0, 200.0]))
+    with pytest.raises(ValueError):
+        encode_contour(np.array([0.1, 0.2]), np.array([100.0, 0.0]))
+
+    data = encode_contour(np.array([0.1, 0.2]), np.array([100.0, 200.0]))
+    with pytest.raises(ContourFormatError):
+        decode_contour(data[:10])
+    with pytest.raises(ContourFormatError):
+        decode_contour(b"XXXX" + data[4:])
+    with pytest.raises(ContourFormatError):
+        decode_contour(data[:-4])
+    with pytest.raises(ContourFormatError):
+        decode_contour_text("not base64!")
+    assert decode_contour_text(base64.b64encode(data).decode("ascii"))[0].size == 2
+    with pytest.raises(ContourFormatError):
+        decode_contour(data[:4] + bytes([9]) + data[5:])
+
+
+def test_decodes_version_1_contours():
+    # Version 1 stored float16 cents and had no cents unit in its header
+    deltas = np.array([100, 232, 232], dtype="<u4")
+    cents = np.array([-1200.0, 0.0, 701.955], dtype="<f2")
+    data = struct.pack("<4sBxxxIdd", b"PCTR", 1, 3, 220.0, TIME_UNIT_SECONDS) + zlib.compress(deltas.tobytes() + cents.tobytes())
+    times, pitches = decode_contour(data)
+    np.testing.assert_array_equal(ticks(times), [100, 332, 564])
+    np.testing.assert_allclose(pitches, [110.0, 220.0, 330.0], rtol=1e-3)
+
+
+# Built-in scales (graded in Hz) and cents-graded exercises, in tune and detuned
+# far enough that some notes miss
+@pytest.mark.parametrize("exercise_id,detune_cents", [
+    ("soprano", 0.0), ("tenor", -60.0), ("bass_arpeggio", 40.0), ("soprano_octave_scale", 40.0), ("alto_arpeggio", 70.0)
+])
+def test_regrade_reproduces_the_original_score(exercise_id, detune_cents):
+    exercise = get_exercise(exercise_id)
+    samples = synthesize_singing(exercise.frequencies, 6.0, 22050, detune_cents=detune_cents, vibrato_cents=40.0, seed=3)
+    analysis = run_grading_pipeline(encode_audio(samples, 22050, "wav"), ".wav", exercise.voice_range, exercise_id)
+    analysis.pop("debug_info")
+    contour = analysis.pop("pitch_contour")
+    row = {"id": "row-1", "user_id": "user-1", "score": analysis["score"], "results": analysis, "pitch_contour": contour}
+
+    params = {
+        "tolerance_hz": ANALYSIS_PARAMS["tolerance_hz"],
+        "segmentation": SEGMENTATION_MODE,
+        "band_fraction": ALIGNMENT_BAND_FRACTION
+    }
+    outcome = regrade_row(row, params)
+    assert outcome["score"] == analysis["score"]
+    assert outcome["old_score"] == analysis["score"]
+    regraded = outcome["results"]["note_by_note_results"]
+    original = analysis["note_by_note_results"]
+    assert [note["is_accurate"] for note in regraded] == [note["is_accurate"] for note in original]
+    for before, after in zip(original, regraded):
+        assert after.get("cents_difference", 0.0) == pytest.approx(before.get("cents_difference", 0.0), abs=0.05)
+
+
+def test_regrade_rejects_rows_without_a_contour():
+    with pytest.raises(ValueError):
+        regrade_row({"id": "row-1", "user_id": "user-1", "score": 0, "results": {}, "pitch_contour": None}, {})
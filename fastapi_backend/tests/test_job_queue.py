@@ -0,0 +1,94 @@
+"""JobQueue leases shared by several processes, simulated by several queues on one database."""
+
+import asyncio
+import time
+
+from job_queue import JobQueue, JobWorkers
+
+
+def open_queues(tmp_path, lease_seconds=60.0):
+    path = str(tmp_path / "jobs.sqlite3")
+    return JobQueue(path, lease_seconds=lease_seconds, owner="a"), JobQueue(path, lease_seconds=lease_seconds, owner="b")
+
+
+def submit(queue, name="take.wav"):
+    return queue.submit(b"audio", name, "user-1", "soprano")["id"]
+
+
+def test_restart_keeps_jobs_a_sibling_is_running(tmp_path):
+    first, restarted = open_queues(tmp_path)
+    job_id = submit(first)
+    job, content = first.claim()
+    assert job["id"] == job_id and job["owner"] == "a" and content == b"audio"
+
+    assert restarted.recover() == 0
+    assert restarted.get(job_id)["status"] == "running"
+    assert restarted.claim() is None
+    assert first.complete(job_id, {"score": 90})
+    assert restarted.get(job_id)["status"] == "succeeded"
+
+
+def test_expired_lease_is_recovered_once(tmp_path):
+    crashed, survivor = open_queues(tmp_path, lease_seconds=0.05)
+    job_id = submit(crashed)
+    crashed.claim()
+    time.sleep(0.1)
+
+    assert survivor.recover() == 1
+    assert survivor.recover() == 0
+    job, _ = survivor.claim()
+    assert job["id"] == job_id and job["owner"] == "b" and job["attempts"] == 2
+
+    # The original owner finishing late must not overwrite the new run
+    assert not crashed.complete(job_id, {"score": 10})
+    crashed.release(job_id)
+    assert survivor.get(job_id)["status"] == "running"
+    assert survivor.complete(job_id, {"score": 80})
+    assert survivor.get(job_id)["result"] == {"score": 80}
+
+
+def test_heartbeat_extends_the_lease(tmp_path):
+    owner, other = open_queues(tmp_path, lease_seconds=0.2)
+    job_id = submit(owner)
+    owner.claim()
+    for _ in range(4):
+        time.sleep(0.1)
+        assert owner.heartbeat([job_id]) == 1
+        assert other.recover() == 0
+    # Another queue cannot renew a lease it does not hold
+    assert other.heartbeat([job_id]) == 0
+
+
+def test_jobs_from_before_leases_are_recovered(tmp_path):
+    queue, _ = open_queues(tmp_path)
+    job_id = submit(queue)
+    queue.claim()
+    queue._conn.execute("UPDATE jobs SET lease_expires_at = NULL, owner = NULL")
+    assert queue.recover() == 1
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_workers_renew_leases_while_grading(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path, lease_seconds=0.15, owner="a")
+    sibling = JobQueue(path, lease_seconds=0.15, owner="b")
+    job_id = submit(queue)
+
+    async def slow_grading(job, content):
+        await asyncio.sleep(0.5)
+        return {"score": 70}
+
+    async def scenario():
+        workers = JobWorkers(queue, slow_grading, workers=1, poll_interval=0.01)
+        await workers.start()
+        for _ in range(10):
+            await asyncio.sleep(0.05)
+            # A sibling starting up meanwhile leaves the job alone
+            assert sibling.recover() == 0
+        while queue.get(job_id)["status"] != "succeeded":
+            await asyncio.sleep(0.02)
+        await workers.stop()
+
+    asyncio.run(scenario())
+    job = queue.get(job_id)
+    assert job["attempts"] == 1 and job["result"] == {"score": 70}
@@ -0,0 +1,104 @@
+"""ProgressStore aggregates on a temporary SQLite database."""
+
+import pytest
+
+from progress import ProgressStore
+
+USER = "123e4567-e89b-12d3-a456-426614174000"
+
+
+def note(expected, cents, accurate, detected=262.0):
+    return {"expected_note": expected, "detected_frequency": detected, "is_accurate": accurate, "cents_difference": cents}
+
+
+def results(score, notes, voice_range="soprano"):
+    return {"score": score, "reference_melody": {"voice_range": voice_range}, "note_by_note_results": notes}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProgressStore(str(tmp_path / "progress.sqlite3"), recent_window=3)
+    yield store
+    store.close()
+
+
+def test_unknown_user_has_no_progress(store):
+    assert store.get(USER) is None
+
+
+def test_mean_best_and_last_are_incremental(store):
+    for at, score in enumerate([60, 90, 75, 80], start=1):
+        store.record(USER, results(score, []), recorded_at=float(at))
+
+    progress = store.get(USER)
+    assert progress["attempts"] == 4
+    assert progress["mean_score"] == pytest.approx(76.25)
+    assert progress["best_score"] == 90
+    assert progress["last_score"] == 80
+    assert progress["first_at"] == 1.0
+    assert progress["last_at"] == 4.0
+
+    soprano = progress["voice_ranges"][0]
+    assert soprano["best_at"] == 2.0
+    # Only the last recent_window scores are kept for the trend
+    assert soprano["recent_scores"] == [{"at": 2.0, "score": 90}, {"at": 3.0, "score": 75}, {"at": 4.0, "score": 80}]
+    assert soprano["recent_mean_score"] == pytest.approx(245 / 3)
+
+
+def test_voice_ranges_are_kept_apart_and_combined_overall(store):
+    store.record(USER, results(50, []), recorded_at=1.0)
+    store.record(USER, results(100, [], voice_range="alto"), recorded_at=2.0)
+    store.record("someone-else", results(10, []), recorded_at=3.0)
+
+    progress = store.get(USER)
+    assert [entry["voice_range"] for entry in progress["voice_ranges"]] == ["alto", "soprano"]
+    assert [entry["attempts"] for entry in progress["voice_ranges"]] == [1, 1]
+    assert progress["attempts"] == 2
+    assert progress["mean_score"] == 75
+    assert progress["last_score"] == 100
+
+
+def test_per_note_aggregates(store):
+    store.record(USER, results(80, [note("E4", -20.0, True), note("C4", 10.0, True), note("C4", 0.0, False, detected=0.0)]), recorded_at=1.0)
+    store.record(USER, results(60, [note("C4", -30.0, False), note("E4", 40.0, False)]), recorded_at=2.0)
+    store.record(USER, results(70, [note("C4", 5.0, True)]), recorded_at=3.0)
+
+    notes = {entry["note"]: entry for entry in store.get(USER)["voice_ranges"][0]["notes"]}
+    # Notes come back in pitch order, not by name
+    assert list(notes) == ["C4", "E4"]
+
+    c4 = notes["C4"]
+    assert c4["attempts"] == 4
+    assert c4["accuracy"] == 0.5
+    # Unvoiced attempts count towards accuracy but not towards the cents error
+    assert c4["mean_abs_cents"] == pytest.approx((10 + 30 + 5) / 3)
+    # Window of 3 over [1, 0, 0, 1]
+    assert c4["recent_accuracy"] == pytest.approx(1 / 3)
+    assert c4["last_at"] == 3.0
+
+    e4 = notes["E4"]
+    assert e4["attempts"] == 2
+    assert e4["accuracy"] == 0.5
+    assert e4["mean_abs_cents"] == pytest.approx(30.0)
+    assert e4["last_at"] == 2.0
+
+
+def test_record_many_is_one_transaction(store):
+    with pytest.raises(KeyError):
+        store.record_many([(USER, results(90, [])), (USER, {"score": 10})], recorded_at=1.0)
+    assert store.get(USER) is None
+
+
+def test_aggregates_survive_reopening(tmp_path):
+    path = str(tmp_path / "progress.sqlite3")
+    first = ProgressStore(path)
+    first.record(USER, results(40, [note("D4", 12.0, True)]), recorded_at=1.0)
+    first.close()
+
+    reopened = ProgressStore(path)
+    reopened.record(USER, results(80, [note("D4", 4.0, True)]), recorded_at=2.0)
+    progress = reopened.get(USER)
+    reopened.close()
+    assert progress["attempts"] == 2
+    assert progress["mean_score"] == 60
+    assert progress["voice_ranges"][0]["notes"][0]["mean_abs_cents"] == pytest.approx(8.0)
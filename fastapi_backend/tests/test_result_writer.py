@@ -0,0 +1,220 @@
+"""ResultWriteBehind against an in-memory stand-in for Supabase."""
+
+import asyncio
+import json
+import time
+
+from result_writer import ResultWriteBehind
+
+
+class FakeStore:
+    """Records every insert; the first ``failures`` calls raise."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = []
+        self.call_times = []
+        self.rows = []
+
+    def __call__(self, rows):
+        self.calls.append(list(rows))
+        self.call_times.append(time.monotonic())
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("store unavailable")
+        self.rows.extend(rows)
+
+
+def make_rows(count, start=0):
+    return [{"user_id": f"user-{i}", "score": i} for i in range(start, start + count)]
+
+
+def read_journal(path):
+    with open(path, encoding="utf-8") as journal:
+        return [json.loads(line) for line in journal]
+
+
+def test_flushes_full_batches_without_waiting_for_the_interval(tmp_path):
+    store = FakeStore()
+    writer = ResultWriteBehind(store, str(tmp_path / "journal.jsonl"), batch_size=3, flush_interval=30.0)
+
+    async def scenario():
+        await writer.start()
+        assert writer.enqueue(make_rows(3))
+        for _ in range(100):
+            if store.calls:
+                break
+            await asyncio.sleep(0.01)
+        assert store.calls == [make_rows(3)]
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.batches_written == 1
+
+
+def test_flushes_partial_batch_after_the_interval(tmp_path):
+    store = FakeStore()
+    writer = ResultWriteBehind(store, str(tmp_path / "journal.jsonl"), batch_size=50, flush_interval=0.05)
+
+    async def scenario():
+        await writer.start()
+        writer.enqueue(make_rows(2))
+        await asyncio.sleep(0.01)
+        assert store.calls == []
+        await asyncio.sleep(0.3)
+        assert store.calls == [make_rows(2)]
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_retries_with_backoff_then_journals(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    store = FakeStore(failures=100)
+    writer = ResultWriteBehind(
+        store, str(journal), batch_size=10, flush_interval=0.01, max_retries=2, retry_base_delay=0.05
+    )
+
+    async def scenario():
+        await writer.start()
+        writer.enqueue(make_rows(4))
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert len(store.calls) == 3
+    gaps = [later - earlier for earlier, later in zip(store.call_times, store.call_times[1:])]
+    assert gaps[0] >= 0.05 and gaps[1] >= 0.1
+    assert read_journal(journal) == make_rows(4)
+    assert writer.failed_attempts == 3
+    assert writer.rows_journaled == 4
+    assert writer.rows_written == 0
+
+
+def test_replays_journal_on_start(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text("".join(json.dumps(row) + "\n" for row in make_rows(5)), encoding="utf-8")
+    store = FakeStore()
+    writer = ResultWriteBehind(store, str(journal), batch_size=2)
+
+    async def scenario():
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert store.calls == [make_rows(2), make_rows(2, 2), make_rows(1, 4)]
+    assert writer.rows_replayed == 5
+    assert not journal.exists()
+
+
+def test_failed_replay_keeps_the_remaining_rows_journaled(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text("".join(json.dumps(row) + "\n" for row in make_rows(4)), encoding="utf-8")
+    store = FakeStore()
+    writer = ResultWriteBehind(store, str(journal), batch_size=2)
+
+    def fail_second_batch(rows):
+        if store.calls:
+            raise RuntimeError("store unavailable")
+        store(rows)
+
+    writer.insert_rows = fail_second_batch
+
+    async def scenario():
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert store.rows == make_rows(2)
+    assert read_journal(journal) == make_rows(2, 2)
+
+
+def test_stop_drains_the_queue(tmp_path):
+    store = FakeStore()
+    writer = ResultWriteBehind(store, str(tmp_path / "journal.jsonl"), batch_size=4, flush_interval=30.0)
+
+    async def scenario():
+        await writer.start()
+        for row in make_rows(10):
+            assert writer.enqueue([row])
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert store.rows == make_rows(10)
+    assert all(len(call) <= 4 for call in store.calls)
+    assert not writer.running
+
+
+def test_overflow_is_journaled_off_the_event_loop(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    store = FakeStore()
+    writer = ResultWriteBehind(store, str(journal), max_queue=2, batch_size=50, flush_interval=30.0)
+
+    async def scenario():
+        await writer.start()
+        assert not writer.enqueue(make_rows(5))
+        # The spill is pending in the executor, not written by enqueue itself
+        assert writer.stats()["pending_spills"] == 1
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.rows_journaled == 3
+    assert writer.stats()["pending_spills"] == 0
+    # The queued rows were written, and their successful flush replayed the spilled ones
+    assert sorted(store.rows, key=lambda row: row["score"]) == make_rows(5)
+    assert not journal.exists()
+
+
+def test_rows_enqueued_while_stopped_are_journaled(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    writer = ResultWriteBehind(FakeStore(), str(journal))
+
+    async def scenario():
+        assert not writer.enqueue(make_rows(2))
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert read_journal(journal) == make_rows(2)
+
+
+def test_on_written_sees_only_stored_rows(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text("".join(json.dumps(row) + "\n" for row in make_rows(2)), encoding="utf-8")
+    written = []
+    # Replay succeeds, the first queued batch fails every attempt, the second is stored
+    store = FakeStore()
+
+    def insert(rows):
+        if rows == make_rows(1, 10):
+            raise RuntimeError("column does not exist")
+        store(rows)
+
+    writer = ResultWriteBehind(
+        insert, str(journal), batch_size=1, flush_interval=0.01, max_retries=1, retry_base_delay=0.01,
+        on_written=written.extend
+    )
+
+    async def scenario():
+        await writer.start()
+        writer.enqueue(make_rows(2, 10))
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert written == make_rows(2) + make_rows(1, 11)
+    assert read_journal(journal) == make_rows(1, 10)
+
+
+def test_on_written_failure_does_not_rewrite_rows(tmp_path):
+    store = FakeStore()
+
+    def fail(rows):
+        raise RuntimeError("progress database locked")
+
+    writer = ResultWriteBehind(store, str(tmp_path / "journal.jsonl"), flush_interval=0.01, on_written=fail)
+
+    async def scenario():
+        await writer.start()
+        writer.enqueue(make_rows(3))
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert store.calls == [make_rows(3)]
+    assert writer.rows_journaled == 0
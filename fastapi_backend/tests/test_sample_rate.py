@@ -0,0 +1,46 @@
+"""Grading at the 16 kHz analysis rate against the native-rate path."""
+
+import numpy as np
+import pytest
+
+import analysis
+from exercises import EXERCISES
+from synthetic_audio import encode_audio, synthesize_singing
+
+NATIVE_RATE = 48000
+DETUNES_CENTS = (0, 30, -80)
+
+# Largest per-note difference between the two paths; measured 6.6 cents /
+# 1.1 Hz (median 2.8 cents) over every exercise and detune here
+MAX_NOTE_DELTA_CENTS = 8.0
+MAX_NOTE_DELTA_HZ = 1.5
+
+
+def grade_at(monkeypatch, sample_rate, content, exercise_id, voice_range):
+    monkeypatch.setattr(analysis, "ANALYSIS_SAMPLE_RATE", sample_rate)
+    return analysis.run_grading_pipeline(content, ".wav", voice_range, exercise_id)
+
+
+@pytest.mark.parametrize("exercise_id", sorted(EXERCISES))
+def test_16k_analysis_matches_native_rate(monkeypatch, exercise_id):
+    exercise = EXERCISES[exercise_id]
+    seed = sorted(EXERCISES).index(exercise_id)
+    for detune in DETUNES_CENTS:
+        samples = synthesize_singing(exercise.frequencies, 1.0 + 0.6 * len(exercise), NATIVE_RATE, detune_cents=detune, seed=seed)
+        content = encode_audio(samples, NATIVE_RATE, "wav")
+        native = grade_at(monkeypatch, 0, content, exercise_id, exercise.voice_range)
+        resampled = grade_at(monkeypatch, 16000, content, exercise_id, exercise.voice_range)
+
+        assert native["debug_info"]["sample_rate"] == NATIVE_RATE
+        assert resampled["debug_info"]["sample_rate"] == 16000
+        assert resampled["score"] == native["score"]
+
+        native_hz = np.array(native["detected_pitches_hz"])
+        resampled_hz = np.array(resampled["detected_pitches_hz"])
+        assert (native_hz > 0).all() and (resampled_hz > 0).all()
+        np.testing.assert_allclose(resampled_hz, native_hz, rtol=0, atol=MAX_NOTE_DELTA_HZ)
+        delta_cents = [
+            abs(fast["cents_difference"] - slow["cents_difference"])
+            for fast, slow in zip(resampled["note_by_note_results"], native["note_by_note_results"])
+        ]
+        assert max(delta_cents) <= MAX_NOTE_DELTA_CENTS
@@ -0,0 +1,81 @@
+"""Block-streaming analysis against the whole-file pitch contour."""
+
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import streaming_analysis
+from analysis import ANALYSIS_SAMPLE_RATE, RESAMPLE_QUALITY, pitch_engine_args
+from audio_core.audio_io import decode_audio, resample_audio
+from audio_core.pitch_engines import PITCH_ENGINES
+from metrics import StageTimer
+from streaming_analysis import StreamingPiptrack, StreamingVAD, should_stream, stream_analysis_blocks, stream_pitch_frames
+
+NATIVE_RATE = 48000
+
+
+def synthetic_clip(seconds=6.0, sr=NATIVE_RATE):
+    """A sung-like C major scale with vibrato, breaths between notes and a little noise."""
+    rng = np.random.default_rng(7)
+    notes = 261.63 * 2 ** (np.array([0, 2, 4, 5, 7, 9, 11, 12]) / 12)
+    t = np.arange(int(seconds * sr)) / sr
+    note_index = np.minimum((t / seconds * len(notes)).astype(int), len(notes) - 1)
+    freq = notes[note_index] * 2 ** (0.3 * np.sin(2 * np.pi * 5.5 * t) / 12)
+    phase = 2 * np.pi * np.cumsum(freq) / sr
+    audio = 0.3 * np.sin(phase) + 0.1 * np.sin(2 * phase)
+    gap = (t * len(notes) / seconds) % 1 > 0.9
+    audio[gap] = 0.0
+    return (audio + 0.003 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def wav_bytes(audio, sr=NATIVE_RATE):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format="WAV", subtype="FLOAT")
+    return buffer.getvalue()
+
+
+def whole_file_contour(content, voice_range="soprano"):
+    audio, native_rate, _ = decode_audio(content, ".wav")
+    sr = ANALYSIS_SAMPLE_RATE or native_rate
+    if sr != native_rate:
+        audio = resample_audio(audio, native_rate, sr, RESAMPLE_QUALITY)
+    return PITCH_ENGINES["piptrack"].track(audio, *pitch_engine_args(sr, voice_range))
+
+
+def streamed_contour(content, block_seconds, voice_range="soprano"):
+    timer = StageTimer()
+    blocks, info = stream_analysis_blocks(content, ".wav", timer, block_seconds)
+    tracker = StreamingPiptrack(*pitch_engine_args(info["sample_rate"], voice_range), threshold=PITCH_ENGINES["piptrack"].threshold)
+    frames = list(stream_pitch_frames(blocks, tracker, StreamingVAD(info["sample_rate"]), timer))
+    return np.concatenate([times for times, _ in frames]), np.concatenate([pitches for _, pitches in frames])
+
+
+@pytest.mark.parametrize("block_seconds", [0.37, 1.0, 10.0])
+def test_streamed_contour_matches_whole_file(block_seconds):
+    content = wav_bytes(synthetic_clip())
+    whole_times, whole_pitches = whole_file_contour(content)
+    times, pitches = streamed_contour(content, block_seconds)
+
+    assert len(times) == len(whole_times)
+    np.testing.assert_allclose(times, whole_times)
+    # Same frames voiced, and the same pitch up to float32 rounding of the resampler
+    np.testing.assert_array_equal(pitches > 0, whole_pitches > 0)
+    voiced = whole_pitches > 0
+    assert voiced.mean() > 0.5
+    cents = 1200 * np.abs(np.log2(pitches[voiced] / whole_pitches[voiced]))
+    assert cents.max() < 0.01
+
+
+def test_streams_long_or_unknown_length(monkeypatch):
+    monkeypatch.setattr(streaming_analysis, "STREAMING_MIN_SECONDS", 5.0)
+    assert not should_stream(wav_bytes(synthetic_clip(seconds=2.0)), ".wav")
+    assert should_stream(wav_bytes(synthetic_clip(seconds=6.0)), ".wav")
+
+    # Browser .webm uploads often have no duration in their headers
+    monkeypatch.setattr(streaming_analysis, "probe_duration", lambda content, suffix: None)
+    assert should_stream(b"", ".webm")
+
+    monkeypatch.setattr(streaming_analysis, "STREAMING_MIN_SECONDS", 0.0)
+    assert not should_stream(b"", ".webm")
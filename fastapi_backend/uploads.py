@@ -0,0 +1,135 @@
+"""
+Upload size and duration limits.
+
+Oversized uploads are refused as early as possible, before they cost memory
+or a worker:
+
+- ``UploadLimitMiddleware`` caps the request body of the grading endpoints.
+  A ``Content-Length`` over the cap is refused before any of the body is read,
+  and a body that grows past the cap while streaming is cut off at that point.
+  Both answer HTTP 413.
+- ``read_upload`` copies one multipart file into memory in chunks, enforcing a
+  per-file cap on the way.
+- ``check_recording_duration`` reads the recording length from the
+  container/stream headers and refuses over-long recordings before decode.
+"""
+
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+from starlette.responses import JSONResponse
+
+from audio_core.audio_io import probe_duration
+
+
+# Size of each read from a spooled upload
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+class UploadTooLargeError(ValueError):
+    """An upload or the recording in it exceeds a configured limit."""
+
+
+def format_bytes(num_bytes: int) -> str:
+    return f"{num_bytes / (1 << 20):g} MiB" if num_bytes >= 1 << 20 else f"{num_bytes} bytes"
+
+
+async def read_upload(file: UploadFile, max_bytes: int, chunk_size: int = UPLOAD_CHUNK_SIZE) -> bytes:
+    """
+    Read an uploaded file in chunks, raising ``UploadTooLargeError`` past ``max_bytes``.
+
+    The spooled size is checked first when the server knows it, so an
+    oversized file is refused without reading any of it. ``max_bytes`` of 0
+    means no limit.
+    """
+    if max_bytes and file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"{file.filename} is larger than the {format_bytes(max_bytes)} upload limit")
+
+    chunks = []
+    received = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+        if max_bytes and received > max_bytes:
+            raise UploadTooLargeError(f"{file.filename} is larger than the {format_bytes(max_bytes)} upload limit")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def check_recording_duration(audio_content: bytes, file_suffix: str, max_seconds: float) -> Optional[float]:
+    """
+    Refuse a recording whose headers say it is longer than ``max_seconds``.
+
+    Returns the probed duration in seconds, or None when the headers do not
+    record one (e.g. streamed browser .webm), in which case decoding is left to
+    the analysis duration cap. ``max_seconds`` of 0 means no limit.
+    """
+    duration = probe_duration(audio_content, file_suffix)
+    if max_seconds and duration is not None and duration > max_seconds:
+        raise UploadTooLargeError(f"Recording is {duration:.0f} seconds long; the maximum is {max_seconds:g} seconds")
+    return duration
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware capping the request body size per path.
+
+    ``limits`` maps a path to its maximum body size in bytes; other paths are
+    not limited. The app's own response to a truncated body (FastAPI reports
+    a form parsing error) is replaced by the 413.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = {path: limit for path, limit in limits.items() if limit}
+
+    async def __call__(self, scope, receive, send) -> None:
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if not limit:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await self.reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise UploadTooLargeError(f"Request body is larger than {format_bytes(limit)}")
+            return message
+
+        async def guarded_send(message: Dict[str, Any]) -> None:
+            nonlocal response_started
+            if exceeded and not response_started:
+                return
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            if not exceeded or response_started:
+                raise
+        if exceeded and not response_started:
+            await self.reject(scope, receive, send, limit)
+
+    async def reject(self, scope, receive, send, limit: int) -> None:
+        response = JSONResponse(
+            {"detail": f"Request body is larger than the {format_bytes(limit)} limit"},
+            status_code=413,
+            headers={"Connection": "close"}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,136 @@
+"""
+Energy / zero-crossing voice activity detection.
+
+Short frames are marked active when they are loud enough (relative to the
+loudest frame and in absolute terms) and have a zero-crossing rate low enough
+for a pitched voice rather than noise or breath. Frame energies and
+zero-crossing counts come from cumulative sums over the whole signal, so the
+cost is a few vectorized passes with no per-frame loop.
+
+The active mask is turned into regions: short gaps are bridged, short bursts
+dropped and every region padded slightly so pitch frames at note onsets keep
+their context. The pitch engines then only run inside these regions.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_core.analysis_frames import cumulative_power
+
+# Analysis frame and hop for the activity decision
+VAD_FRAME_SECONDS = 0.02
+VAD_HOP_SECONDS = 0.01
+
+# A frame is active when it is within RELATIVE_FLOOR_DB of the loudest frame,
+# above ABSOLUTE_FLOOR_DB (dBFS RMS), and crosses zero in at most MAX_ZCR of its samples
+RELATIVE_FLOOR_DB = -40.0
+ABSOLUTE_FLOOR_DB = -60.0
+MAX_ZCR = 0.35
+
+# Gaps shorter than this are bridged, regions shorter than this are dropped,
+# and regions are padded by this much on each side
+MIN_GAP_SECONDS = 0.3
+MIN_REGION_SECONDS = 0.1
+REGION_PADDING_SECONDS = 0.05
+
+
+def vad_frame_params(sr: int) -> Tuple[int, int]:
+    """Activity frame length and hop in samples."""
+    return max(1, int(VAD_FRAME_SECONDS * sr)), max(1, int(VAD_HOP_SECONDS * sr))
+
+
+def frame_features(audio_data: np.ndarray, sr: int, power_sum: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean power and zero-crossing rate of every activity frame.
+
+    Frames start every hop from the first sample, so features of a long
+    signal can be computed block by block (see ``streaming_analysis``).
+    ``power_sum`` is the signal's ``cumulative_power`` when already computed
+    (``AnalysisFrames.power_sum``).
+    """
+    frame_length, hop_length = vad_frame_params(sr)
+    if len(audio_data) < frame_length:
+        return np.zeros(0), np.zeros(0)
+
+    starts = np.arange(0, len(audio_data) - frame_length + 1, hop_length)
+    samples = np.asarray(audio_data, dtype=np.float64)
+
+    # Mean power per frame from a cumulative sum of squares
+    if power_sum is None:
+        power_sum = cumulative_power(samples)
+    power = (power_sum[starts + frame_length] - power_sum[starts]) / frame_length
+
+    # Zero crossings per frame from a cumulative count of sign changes
+    crossings = np.concatenate(([0], np.cumsum(np.signbit(samples[1:]) != np.signbit(samples[:-1]))))
+    zcr = (crossings[starts + frame_length - 1] - crossings[starts]) / (frame_length - 1 or 1)
+    return power, zcr
+
+
+def activity_mask(power: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+    """Frames loud enough, relative to the loudest, and with a low enough zero-crossing rate."""
+    peak = power.max() if len(power) else 0.0
+    if peak <= 0:
+        return np.zeros(len(power), dtype=bool)
+    loud = (power >= peak * 10 ** (RELATIVE_FLOOR_DB / 10)) & (power >= 10 ** (ABSOLUTE_FLOOR_DB / 10))
+    return loud & (zcr <= MAX_ZCR)
+
+
+def frame_activity(audio_data: np.ndarray, sr: int, power_sum: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+    """Per-frame activity mask and the hop (in samples) between frames."""
+    return activity_mask(*frame_features(audio_data, sr, power_sum)), vad_frame_params(sr)[1]
+
+
+def voice_activity_regions(audio_data: np.ndarray, sr: int, power_sum: Optional[np.ndarray] = None) -> Tuple[List[Tuple[int, int]], Dict[str, Any]]:
+    """
+    Find the voiced regions of a recording.
+
+    Returns ``([(start_sample, end_sample), ...], info)`` where ``info``
+    reports the analysed (``trimmed_duration_seconds``) and skipped
+    (``skipped_fraction``) audio, the leading/trailing silence and the number
+    of regions. A recording with no active frames yields no regions.
+    ``power_sum`` is as for ``frame_features``.
+    """
+    active, hop_length = frame_activity(audio_data, sr, power_sum)
+    return activity_regions(active, hop_length, sr, len(audio_data))
+
+
+def activity_regions(active: np.ndarray, hop_length: int, sr: int, total: int) -> Tuple[List[Tuple[int, int]], Dict[str, Any]]:
+    """``voice_activity_regions`` from an activity mask over a ``total``-sample recording."""
+    # Run boundaries of the active mask, in frames
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    regions: List[Tuple[int, int]] = []
+    min_gap = MIN_GAP_SECONDS / VAD_HOP_SECONDS
+    for start, end in zip(run_starts, run_ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    padding = int(REGION_PADDING_SECONDS * sr)
+    frame_length = vad_frame_params(sr)[0]
+    min_region = MIN_REGION_SECONDS / VAD_HOP_SECONDS
+    sample_regions: List[Tuple[int, int]] = []
+    for start, end in regions:
+        if end - start < min_region:
+            continue
+        first = max(0, start * hop_length - padding)
+        last = min(total, (end - 1) * hop_length + frame_length + padding)
+        if sample_regions and first <= sample_regions[-1][1]:
+            sample_regions[-1] = (sample_regions[-1][0], last)
+        else:
+            sample_regions.append((first, last))
+
+    analysed = sum(end - start for start, end in sample_regions)
+    leading = sample_regions[0][0] if sample_regions else total
+    trailing = total - sample_regions[-1][1] if sample_regions else 0
+    return sample_regions, {
+        "regions": len(sample_regions),
+        "trimmed_duration_seconds": float(analysed / sr),
+        "skipped_fraction": float(1.0 - analysed / total) if total else 0.0,
+        "leading_silence_seconds": float(leading / sr),
+        "trailing_silence_seconds": float(trailing / sr)
+    }
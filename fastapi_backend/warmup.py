@@ -0,0 +1,85 @@
+"""
+Pipeline warm-up.
+
+librosa's numba kernels compile on first use and the decoders initialise on
+demand, so the first recording graded by a fresh process would otherwise pay
+several seconds of one-off cost. ``warm_up_pipeline`` grades a short synthetic
+clip for every voice range and upload format, then runs every engine in the
+pitch engine chain once, so every code path is compiled before real traffic
+arrives.
+
+Analysis workers run it as their pool initializer (``warm_up_worker``). Set
+``NUMBA_CACHE_DIR`` to persist compiled kernels between deploys; numba reads it
+at import, and spawned workers inherit it from the environment.
+"""
+
+import os
+import time
+from typing import Any, Dict
+
+from analysis import (
+    PITCH_ENGINE_CHAIN,
+    NoPitchDetectedError,
+    analysis_frame_params,
+    run_grading_pipeline,
+)
+from exercises import VOICE_RANGES
+from synthetic_audio import encode_audio, synthesize_singing
+
+# Upload formats exercised by the warm-up (one per decode path the API accepts)
+WARMUP_FORMATS = ("wav", "mp3", "webm", "m4a")
+
+# Length and rate of the synthetic warm-up clip
+WARMUP_CLIP_SECONDS = 1.0
+WARMUP_SAMPLE_RATE = 48000
+
+# Warm-up stats for this process, set by ``warm_up_worker``
+WORKER_WARMUP: Dict[str, Any] = {}
+
+
+def warm_up_pipeline() -> Dict[str, Any]:
+    """Grade a tiny clip per voice range and format; returns timing and any failures."""
+    started = time.perf_counter()
+    clips = 0
+    failures = []
+
+    for voice_range, range_data in VOICE_RANGES.items():
+        audio = synthesize_singing(range_data["sequence"], WARMUP_CLIP_SECONDS, WARMUP_SAMPLE_RATE, edge_silence_seconds=0.1)
+        for audio_format in WARMUP_FORMATS:
+            encoded = encode_audio(audio, WARMUP_SAMPLE_RATE, audio_format)
+            if encoded is None:
+                failures.append(f"{voice_range}/{audio_format}: encoder unavailable")
+                continue
+            try:
+                run_grading_pipeline(encoded, f".{audio_format}", voice_range)
+                clips += 1
+            except NoPitchDetectedError:
+                clips += 1
+            except Exception as e:
+                failures.append(f"{voice_range}/{audio_format}: {e}")
+
+        # Later engines in the chain only run when earlier ones come up short, so compile them explicitly
+        frame_length, hop_length = analysis_frame_params(WARMUP_SAMPLE_RATE)
+        for engine in PITCH_ENGINE_CHAIN:
+            try:
+                engine.track(audio, WARMUP_SAMPLE_RATE, range_data["min_freq"], range_data["max_freq"], frame_length, hop_length)
+            except Exception as e:
+                failures.append(f"{voice_range}/{engine.name}: {e}")
+
+    return {
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - started,
+        "clips": clips,
+        "failures": failures
+    }
+
+
+def warm_up_worker() -> None:
+    """Process pool initializer: warm up before the worker takes any job."""
+    WORKER_WARMUP.update(warm_up_pipeline())
+    print(f"Analysis worker {WORKER_WARMUP['pid']} warmed up in {WORKER_WARMUP['seconds']:.2f}s")
+
+
+def worker_warmup_status() -> Dict[str, Any]:
+    """Warm-up stats of whichever worker runs this; used to confirm every worker is ready."""
+    return {"pid": os.getpid(), **WORKER_WARMUP}
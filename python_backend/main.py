@@ -1,21 +1,32 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import tempfile
 import os
 import numpy as np
 import json
 from typing import List, Dict, Any
 import io
 
-# For pitch detection, we'll use a simple approach with numpy/scipy
-# In production, you'd want to use a proper pitch detection library
-try:
-    import librosa
-    LIBROSA_AVAILABLE = True
-except ImportError:
-    LIBROSA_AVAILABLE = False
+# The in-memory decode layer and pitch engines are shared with the main
+# assessment service through the audio_core package (see requirements.txt)
+from audio_core.audio_io import decode_audio
+from audio_core.pitch_engines import LIBROSA_AVAILABLE, PITCH_ENGINES, pitch_engine_chain, run_pitch_engines
+
+if not LIBROSA_AVAILABLE:
     print("Librosa not available, using basic pitch detection")
 
+# Pitch engines tried in order until one tracks PITCH_MIN_QUALITY of the
+# non-silent audio; engines that need librosa are skipped when it is missing
+PITCH_ENGINE_CHAIN = pitch_engine_chain(os.getenv("PITCH_ENGINE_CHAIN", "piptrack,autocorr"))
+PITCH_MIN_QUALITY = float(os.getenv("PITCH_MIN_QUALITY", "0.0"))
+
+# Detection range for every engine, covering the reference melody with margin
+PITCH_FMIN = 80
+PITCH_FMAX = 800
+
+# librosa's default STFT frame and hop
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
 app = FastAPI(title="Singing Assessment API", version="1.0.0")
 
 # Add CORS middleware
@@ -54,75 +65,38 @@ def hz_to_note_name(frequency: float, tolerance: float = 50.0) -> str:
     
     return closest_note
 
-def extract_pitch_contour_basic(audio_data: np.ndarray, sr: int) -> List[float]:
+def extract_pitch_contour_with(engine_name: str, audio_data: np.ndarray, sr: int) -> np.ndarray:
+    """Voiced pitches from one shared pitch engine."""
+    _, pitches = PITCH_ENGINES[engine_name].track(audio_data, sr, PITCH_FMIN, PITCH_FMAX, FRAME_LENGTH, HOP_LENGTH)
+    return pitches[pitches > 0]
+
+def extract_pitch_contour_basic(audio_data: np.ndarray, sr: int) -> np.ndarray:
     """Basic pitch detection using autocorrelation."""
-    # Simple frame-based pitch detection
-    frame_length = int(0.1 * sr)  # 100ms frames
-    hop_length = frame_length // 2
-    
-    pitches = []
-    
-    for i in range(0, len(audio_data) - frame_length, hop_length):
-        frame = audio_data[i:i + frame_length]
-        
-        # Simple autocorrelation-based pitch detection
-        autocorr = np.correlate(frame, frame, mode='full')
-        autocorr = autocorr[len(autocorr)//2:]
-        
-        # Find peaks in autocorrelation
-        # Look for fundamental frequency between 80Hz and 800Hz
-        min_period = int(sr / 800)  # Max 800Hz
-        max_period = int(sr / 80)   # Min 80Hz
-        
-        if max_period < len(autocorr):
-            search_range = autocorr[min_period:max_period]
-            if len(search_range) > 0:
-                peak_idx = np.argmax(search_range) + min_period
-                frequency = sr / peak_idx if peak_idx > 0 else 0
-                
-                # Only keep reasonable vocal frequencies
-                if 80 <= frequency <= 800:
-                    pitches.append(frequency)
-    
-    return pitches
+    return extract_pitch_contour_with("autocorr", audio_data, sr)
 
-def extract_pitch_contour_librosa(audio_data: np.ndarray, sr: int) -> List[float]:
-    """Extract pitch contour using librosa."""
-    # Use librosa's piptrack for pitch detection
-    pitches, magnitudes = librosa.piptrack(y=audio_data, sr=sr, threshold=0.1)
-    
-    # Extract the strongest pitch at each time frame
-    pitch_contour = []
-    for t in range(pitches.shape[1]):
-        index = magnitudes[:, t].argmax()
-        pitch = pitches[index, t]
-        if pitch > 0:
-            pitch_contour.append(pitch)
-    
-    return pitch_contour
+def extract_pitch_contour_librosa(audio_data: np.ndarray, sr: int) -> np.ndarray:
+    """Extract pitch contour using librosa's piptrack."""
+    return extract_pitch_contour_with("piptrack", audio_data, sr)
 
-def segment_pitches_to_notes(pitches: List[float], num_expected_notes: int = 5) -> List[float]:
+def segment_pitches_to_notes(pitches: np.ndarray, num_expected_notes: int = 5) -> List[float]:
     """Segment continuous pitch contour into discrete notes."""
-    if not pitches:
+    pitches = np.asarray(pitches, dtype=np.float32)
+    if pitches.size == 0:
         return []
     
     # Simple segmentation: divide into equal time segments
     segment_size = len(pitches) // num_expected_notes
     if segment_size == 0:
-        return pitches[:num_expected_notes]
+        return pitches[:num_expected_notes].tolist()
     
-    segmented_notes = []
-    for i in range(num_expected_notes):
-        start_idx = i * segment_size
-        end_idx = start_idx + segment_size if i < num_expected_notes - 1 else len(pitches)
-        
-        segment = pitches[start_idx:end_idx]
-        if segment:
-            # Use median pitch of segment as the note
-            median_pitch = np.median(segment)
-            segmented_notes.append(median_pitch)
+    # Use median pitch of segment as the note. All segments are segment_size
+    # long except the last, which takes the remainder.
+    head = (num_expected_notes - 1) * segment_size
+    segmented_notes = np.empty(num_expected_notes)
+    segmented_notes[:-1] = np.median(pitches[:head].reshape(num_expected_notes - 1, segment_size), axis=1)
+    segmented_notes[-1] = np.median(pitches[head:])
     
-    return segmented_notes
+    return segmented_notes.tolist()
 
 def compare_pitches(detected: List[float], reference: List[float], tolerance: float = 50.0) -> Dict[str, Any]:
     """Compare detected pitches to reference melody."""
@@ -171,48 +145,39 @@ async def grade_singing(file: UploadFile = File(...)):
     """
     Grade singing performance against reference melody C4-D4-E4-F4-G4.
     
-    Accepts .wav or .mp3 audio files and returns pitch accuracy assessment.
+    Accepts .wav, .flac, .mp3, .m4a or .webm audio files and returns pitch accuracy assessment.
     """
     
     # Validate file type
-    if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a')):
+    if not file.filename.lower().endswith(('.wav', '.flac', '.mp3', '.m4a', '.webm')):
         raise HTTPException(
             status_code=400, 
-            detail="Only .wav, .mp3, and .m4a files are supported"
+            detail="Only .wav, .flac, .mp3, .m4a, and .webm files are supported"
         )
     
     try:
         # Read audio file
         audio_content = await file.read()
         
-        # Save to temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            temp_file.write(audio_content)
-            temp_file_path = temp_file.name
+        # Decode straight from memory
+        audio_data, sample_rate, decode_path = decode_audio(audio_content, os.path.splitext(file.filename)[1])
         
-        try:
-            if LIBROSA_AVAILABLE:
-                # Load audio using librosa
-                audio_data, sample_rate = librosa.load(temp_file_path, sr=None, mono=True)
-                pitch_contour = extract_pitch_contour_librosa(audio_data, sample_rate)
-            else:
-                # Fallback to basic processing (requires manual audio loading)
-                raise HTTPException(
-                    status_code=500,
-                    detail="Advanced audio processing not available. Please install librosa."
-                )
-            
-            # Segment pitches into discrete notes
-            detected_notes = segment_pitches_to_notes(pitch_contour, num_expected_notes=5)
-            
-            # Compare to reference melody
-            assessment = compare_pitches(detected_notes, REFERENCE_SEQUENCE, tolerance=50.0)
-            
-            return assessment
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+        # Cheapest adequate engine from the configured chain
+        track = run_pitch_engines(
+            audio_data, sample_rate, PITCH_FMIN, PITCH_FMAX, FRAME_LENGTH, HOP_LENGTH,
+            chain=PITCH_ENGINE_CHAIN, min_quality=PITCH_MIN_QUALITY
+        )
+        
+        # Segment pitches into discrete notes
+        detected_notes = segment_pitches_to_notes(track.pitches, num_expected_notes=5)
+        
+        # Compare to reference melody
+        assessment = compare_pitches(detected_notes, REFERENCE_SEQUENCE, tolerance=50.0)
+        assessment["decode_path"] = decode_path
+        assessment["pitch_engine"] = track.engine
+        assessment["pitch_engines"] = track.report
+        
+        return assessment
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
@@ -222,6 +187,7 @@ async def health_check():
     return {
         "status": "healthy",
         "librosa_available": LIBROSA_AVAILABLE,
+        "pitch_engine_chain": [engine.name for engine in PITCH_ENGINE_CHAIN],
         "reference_melody": REFERENCE_MELODY
     }
 
@@ -0,0 +1,12 @@
+-- Compact pitch contour of each graded recording, so scores can be recomputed
+-- by fastapi_backend/regrade.py without the original audio. The value is base64
+-- of the zlib-packed contour written by fastapi_backend/contours.py: a header
+-- with a version byte (currently 2), then frame-time deltas and pitches as
+-- int16 cents in 1/16-cent steps around the median. Version 1 rows (float16
+-- cents) still decode.
+ALTER TABLE public.pitch_results ADD COLUMN IF NOT EXISTS pitch_contour TEXT;
+
+-- Re-grade runs page through results that have a contour, oldest first
+CREATE INDEX IF NOT EXISTS idx_pitch_results_created_at_with_contour
+  ON public.pitch_results (created_at, id)
+  WHERE pitch_contour IS NOT NULL;